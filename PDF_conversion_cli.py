@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Author: Joana Cardoso
+
+import argparse
+import json
+import logging
+import sys
+import _functions.pipeline as pl
+
+"""
+Command line version of PDF_conversion_tool.py for unattended runs without a graphical user interface.
+Prints one json line per converted file on stdout and the progress on stderr.
+
+    python PDF_conversion_cli.py C:/Archive/Export.zip --remove-duplicates > results.jsonl
+"""
+
+
+class ProgressPrinter:
+    """
+    Prints the progress of the conversion on stderr, only when the percentage changes
+    """
+
+    def __init__(self):
+        self.percentage = None
+
+    def __call__(self, stage, done, total):
+        """
+        Parameters
+        ----------
+        stage: str
+            The stage of the conversion a file just finished
+        done: int
+            The number of finished files
+        total: int
+            The number of files to convert
+        """
+        percentage = 100 * done // total if total > 0 else 100
+        if percentage != self.percentage:
+            self.percentage = percentage
+            sys.stderr.write(f'\r{percentage:3d} % ({done}/{total} files)')
+            if done == total:
+                sys.stderr.write('\n')
+            sys.stderr.flush()
+
+
+def main(argv=None):
+    """
+    Reads the command line arguments and converts the selected folder or zip file
+
+    Parameters
+    ----------
+    argv: list
+        The command line arguments, default is sys.argv
+
+    Returns
+    -------
+    exit_code: int
+        0 when the conversion is ready
+    """
+    parser = argparse.ArgumentParser(
+        description='Converts the files in a folder or zipped folder to pdf.')
+    parser.add_argument('source', help='the folder or zip file to convert')
+    parser.add_argument('--remove-duplicates', action='store_true',
+                        help='move duplicates to a separate folder instead of only flagging them')
+    parser.add_argument('--out-dir', help='the output directory, default is PDF_<name> next to the source')
+    parser.add_argument('--report-dir', help='the directory of the excel results file')
+    parser.add_argument('--json-log', default='Log_results.json', help='the path to the json log table')
+    parser.add_argument('--report-format', choices=['xlsx', 'csv'], default='xlsx',
+                        help='the format of the results file, csv for runs that are too large for excel')
+    parser.add_argument('--log-file', default='Logging_PDF_conversion_tool.log', help='the path to the logging file')
+    parser.add_argument('--no-persistent-office', action='store_true',
+                        help='start LibreOffice for every file instead of keeping it running')
+    parser.add_argument('--workers', type=int,
+                        help='the number of files printed to pdf at the same time, default is the number of processors')
+    parser.add_argument('--batch-size', type=int, default=20,
+                        help='the maximum number of files of one folder printed with one start of soffice')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='print every file again instead of taking pdfs of files converted before from the cache')
+    parser.add_argument('--cache-dir', help='the directory of the conversion cache')
+    parser.add_argument('--cache-size', type=int, default=2048, help='the maximum size of the conversion cache in MB')
+    parser.add_argument('--no-history', action='store_true',
+                        help='do not save the delivered files in the history of earlier batches')
+    parser.add_argument('--history-path', help='the path to the history of earlier batches')
+    parser.add_argument('--previous-batches', choices=['flag', 'skip'],
+                        help='flag or skip files with the same content as a file delivered in an earlier batch')
+    parser.add_argument('--batch',
+                        help='the id of this batch in the history, default is the folder and the time it started')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='convert all files again instead of skipping the files finished in a previous run')
+    parser.add_argument('--optimize', action='store_true',
+                        help='make the printed and combined pdfs smaller (compression, fonts and images saved once)')
+    parser.add_argument('--target-dpi', type=int, default=None,
+                        help='with --optimize, downsample images with a higher resolution to this resolution')
+    parser.add_argument('--msg-backend', choices=('outlook', 'python'), default=None,
+                        help='read MSG files with Outlook or without Outlook (python), default is Outlook when it '
+                             'can be used')
+    parser.add_argument('--link', action='store_true',
+                        help='hardlink the pdf, excel and html files into the output directory instead of copying them '
+                             '(when it is on the same disk)')
+    parser.add_argument('--quiet', action='store_true', help='do not print the progress')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG,
+                        format='%(asctime)s %(levelname)s %(funcName)s %(message)s',
+                        filename=args.log_file
+                        )
+    logging.info('Starting Tool')
+
+    options = pl.ConvertOptions(remove_duplicates=args.remove_duplicates, out_dir=args.out_dir,
+                                report_dir=args.report_dir, json_log=args.json_log,
+                                report_format=args.report_format,
+                                persistent_office=not args.no_persistent_office, workers=args.workers,
+                                batch_size=args.batch_size, cache=not args.no_cache,
+                                cache_dir=args.cache_dir, cache_size=args.cache_size * 1024 ** 2,
+                                history=not args.no_history, history_path=args.history_path,
+                                previous_batches=args.previous_batches, batch=args.batch,
+                                resume=not args.no_resume,
+                                optimize=args.optimize, target_dpi=args.target_dpi,
+                                msg_backend=args.msg_backend, link=args.link)
+    conversion = pl.convert(args.source, options=options,
+                            on_progress=None if args.quiet else ProgressPrinter())
+    for record in conversion:
+        sys.stdout.write(json.dumps(record) + '\n')
+
+    if not args.quiet:
+        sys.stderr.write(f'Total converted files: {conversion.total_pdf}\n')
+        sys.stderr.write(f'Not converted files: {len(conversion.not_converted)}\n')
+        sys.stderr.write(f'Converted files are in folder: {conversion.out_dir}\n')
+        sys.stderr.write(f'Results are in file: {conversion.log_table_path}\n')
+    logging.info('Ready with tool')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,19 +2,11 @@
 # coding: utf-8
 # Author: Joana Cardoso
 
-import json
 import logging
 import os
 import tkinter as tk
-from openpyxl import Workbook
-from pathlib import Path
 from tkinter import messagebox, filedialog, ttk
-import _functions.unzip_files as uz
-import _functions.check_length as cl
-import _functions.get_files as gf
-import _functions.duplicates as dup
-import _functions.print as prt
-import _functions.combine as comb
+import _functions.pipeline as pl
 
 logging.basicConfig(level=logging.DEBUG,
                     format='%(asctime)s %(levelname)s %(funcName)s %(message)s',
@@ -40,7 +32,7 @@ class Application(tk.Frame):
     folder_type()
         Sets up a screen to select the location of the pdf documents for unlocking
     select_zip()
-        Calls _functions.unzip_file.unzip_files and gets the path to the selected file
+        Gets the path to the selected file and opens it with _functions.pipeline.open_source
     select_folder()
         Gets the path to the selected folder and calls _functions.check_length.check_length
     find_files()
@@ -51,6 +43,8 @@ class Application(tk.Frame):
         Opens the links in the last screen of the tool
     convert_files(remove_duplicates: bool)
         Processes the selected files and calls several other functions
+    update_progress(stage: str, done: int, total: int)
+        Updates the progress bar while the conversion is running
     cancel()
         Destroys the tool if the tool is halfway stopped
     ready()
@@ -65,6 +59,7 @@ class Application(tk.Frame):
         root.withdraw()
         self.progress = None
         self.style = None
+        self.batch = None
         tk.Frame.__init__(self, master=parent)
         info = 'This application converts files to PDF.\n\nSelect a folder to start converting.\n\nThis application is developed by the Data Wharehouse team of the Province of Zuid-Holland, The Netherlands.'
         self.parent = parent
@@ -102,8 +97,8 @@ class Application(tk.Frame):
 
     def select_zip(self):
         """
-        If the option zip file is selected in the folder_type screen, this method calls the file _functions.unzip_file.unzip_files and 
-            gets the path to the selected file
+        If the option zip file is selected in the folder_type screen, this method gets the path to the selected file and
+            calls the function open_source in file _functions.pipeline to read it
         """
         self.parent.destroy()
         zip_dir = filedialog.askopenfilename(initialdir="/Users", title="Zipped folder selection",
@@ -114,18 +109,14 @@ class Application(tk.Frame):
 
         else:
             self.zip_dir = os.path.abspath(zip_dir)
-            logging.info(f'Zip_dir: {zip_dir}')
-            self.process_dir = os.path.abspath(os.path.splitext(zip_dir)[0])
-            logging.info(f'Process_dir: {self.process_dir}')
-            logging.info(f'Started unzipping folder: {zip_dir}')
-            uz.unzip_files(self.zip_dir, self.process_dir)
+            self.source = pl.open_source(self.zip_dir)
+            self.process_dir = self.source.process_dir
             self.find_files()
 
     def select_folder(self):
         """
         If the option folder is selected in the folder_type screen, this method gets the path to the selected folder
-        It calls the function check_length in file _functions.check_length
-        If necessary calls the function unzip_files in file _functions.unzip_file
+        It calls the function open_source in file _functions.pipeline, which shortens too long names and unzips zip files
         """
         self.parent.destroy()
         self.process_dir = filedialog.askdirectory(
@@ -136,68 +127,17 @@ class Application(tk.Frame):
             self.folder_type()
 
         else:
-            self.process_dir = os.path.abspath(self.process_dir)
-            logging.info(f'Process directory: {self.process_dir}')
-            for root, dirs, files in os.walk(self.process_dir):
-                for file in files:
-                    des_dir = os.path.join(root, os.path.dirname(file))
-                    file_path = os.path.join(root, file)
-                    logging.info(f'File: {file}')
-                    logging.info(f'Destination directory: {des_dir}')
-                    file_name, long_name = cl.check_length(
-                        des_dir=des_dir, file=file)
-
-                    if long_name == True:
-                        logging.info(f'Long name')
-                        try:
-                            os.rename(file_path, file_name)
-                            logging.debug(
-                                f'Changing name: {file} into {file_name}')
-                        except:
-                            logging.error(
-                                f'Failed to change name: {file} into {file_name}')
-                    name_lower = file.lower()
-                    if name_lower.endswith('.zip'):
-                        zip_dir = os.path.join(root, file)
-                        proc_zip = os.path.abspath(
-                            os.path.splitext(zip_dir)[0])
-                        logging.info(f'Zip_dir: {zip_dir}')
-                        logging.info(f'Proc dir: {proc_zip}')
-                        uz.unzip_files(zip_dir, proc_zip)
-                        try:
-                            os.remove(zip_dir)
-                            logging.debug(f'Removed zip: {zip_dir}')
-                        except:
-                            logging.error(f'Failed to remove zip: {zip_dir}')
+            self.source = pl.open_source(self.process_dir)
+            self.process_dir = self.source.process_dir
             self.find_files()
 
     def find_files(self):
         """
         Gets the amount of files found in the selected folder or zip file and presents the results on a screen
         """
-        logging.info('Find files')
-
         # count files (emails + other files)
-        email_files = []
-        other_files = 0
-        self.pdf_files = 0
-        self.all_files = []
-        self.empty_dir = []
-
-        for root, dirs, files in os.walk(self.process_dir):
-            if not len(dirs) and not len(files):
-                # Adding the empty directory to list
-                self.empty_dir.append(root)
-            for name in files:
-                name_lower = name.lower()
-                if not name_lower.endswith(".zip"):
-                    if name_lower.endswith((".msg", ".eml")):
-                        email_files.append(os.path.join(root, name))
-                    elif name_lower.endswith(".pdf"):
-                        self.pdf_files += 1
-                    else:
-                        other_files += 1
-                    self.all_files.append(os.path.join(root, name))
+        self.all_files, email_files, self.pdf_files, other_files, self.empty_dir = pl.find_files(
+            self.source)
 
         # print messages
         total_found = 'Total number of files: ' + str(len(self.all_files))
@@ -252,16 +192,21 @@ class Application(tk.Frame):
         self.parent.title('Remove duplicates')
         text = 'Would you like to remove duplicates?'
         self.parent.resizable(width="false", height="false")
-        self.parent.minsize(width=275, height=75)
-        self.parent.maxsize(width=275, height=75)
+        self.parent.minsize(width=275, height=110)
+        self.parent.maxsize(width=275, height=110)
         self.label = tk.Label(self.parent, text=text).place(
-            relx=.1, rely=.2, anchor="w")
+            relx=.1, rely=.15, anchor="w")
+        # the id of the batch in the history of earlier batches, empty for the folder and the time it started
+        self.label = tk.Label(self.parent, text='Batch (optional):').place(
+            relx=.1, rely=.45, anchor="w")
+        self.batch_entry = tk.Entry(self.parent, width=18)
+        self.batch_entry.place(relx=.45, rely=.45, anchor="w")
         self.remov_yes = tk.Button(self.parent, text='Yes', command=lambda: self.convert_files(
-            True)).place(relx=.58, rely=.7, anchor="c")
+            True)).place(relx=.58, rely=.8, anchor="c")
         self.remov_no = tk.Button(self.parent, text='No', command=lambda: self.convert_files(
-            False)).place(relx=.69, rely=.7, anchor="c")
+            False)).place(relx=.69, rely=.8, anchor="c")
         self.quit = tk.Button(self.parent, text='Stop', command=self.cancel).place(
-            relx=.81, rely=.7, anchor="c")
+            relx=.81, rely=.8, anchor="c")
         self.parent.protocol("WM_DELETE_WINDOW", self.cancel)
 
     def open_folder(self, path):
@@ -284,6 +229,7 @@ class Application(tk.Frame):
         remove_duplicates: bool
             Remove_duplicates is set to True or False, depending whether duplicates are to be removed or not
         """
+        self.batch = self.batch_entry.get().strip() or None
         self.parent.destroy()
 
         # create progress bar
@@ -323,10 +269,12 @@ class Application(tk.Frame):
         self.button.grid(row=3, column=2, pady=5, padx=5, sticky='e')
         self.parent.protocol("WM_DELETE_WINDOW", self.cancel)
 
-        # set output directory
-        out_dir = os.path.join(os.path.dirname(
-            self.process_dir), "PDF_" + os.path.basename(self.process_dir))
-        logging.info(f'Output directory: {out_dir}')
+        # the label shown for every stage of the conversion
+        self.stage_labels = {
+            'extract': 'Getting files and extracting emails',
+            'print': 'Printing files to pdf',
+            'combine': "Combining pdf's",
+        }
 
         # set start value Bestanden ophalen en emails extraheren
         logging.info(f'Set start value Bestanden ophalen en emails extraheren')
@@ -334,156 +282,17 @@ class Application(tk.Frame):
         self.style.configure('text.Horizontal.TProgressbar',
                              text='{:g} %'.format(self.progress['value']))
 
-        # print email body to pdf, extract attachments and copy other files to output folder
-        logging.info(
-            'Started converting files to PDF and extract email attachments')
-        msg_list, file_log = gf.get_all_files(
-            files=self.all_files, process_dir=self.process_dir, out_dir=out_dir, progress=self.progress, style=self.style)
-        logging.info(
-            'Finished converting files to PDF and extract email attachments')
-
-        # update status pb Bestanden ophalen en emails extraheren
-        logging.info(
-            f'Update status pb Bestanden ophalen en emails extraheren')
-        self.progress.update()
-        self.progress.update_idletasks()
-
-        logging.info(f'Remove duplicates is set to {remove_duplicates}')
-        if remove_duplicates == True:
-            # set start value Dubbelingen verwijderen
-            self.progress['value'] = 1
-            self.label.configure(text="Removing duplicates")
-            self.style.configure('text.Horizontal.TProgressbar',
-                                 text='{:g} %'.format(self.progress['value']))
-
-            # remove duplicates
-            logging.info('Started removing duplicate files')
-            out_duplicates, duplicates = dup.remove_duplicates(
-                process_dir=self.process_dir, out_dir=out_dir, progress=self.progress, style=self.style, file_log=file_log, remove_duplicates=remove_duplicates)
-            logging.info('Finished removing duplicate files')
-
-            # update status pb Dubbelingen verwijderen
-            self.progress.update()
-            self.progress.update_idletasks()
-
-        else:
-            # look for duplicates but do not move
-            logging.info('Started looking for duplicate files')
-            out_duplicates, duplicates = dup.remove_duplicates(
-                process_dir=self.process_dir, out_dir=out_dir, progress=self.progress, style=self.style, file_log=file_log, remove_duplicates=remove_duplicates)
-            logging.info('Finished looking for duplicate files')
-
-        # set start value Bestanden printen naar PDF
-        self.progress['value'] = 1
-        self.label.configure(text="Printing files to pdf")
-        self.style.configure('text.Horizontal.TProgressbar',
-                             text='{:g} %'.format(self.progress['value']))
-
-        # print separate files and attachments
-        logging.info('Started printing files to PDF')
-        prt.print_to_pdf(out_dir=out_dir, file_log=file_log,
-                         progress=self.progress, style=self.style)
-        logging.info('Finished printing files to PDF')
-
-        # update status pb Bestanden printen naar PDF
-        self.progress.update()
-        self.progress.update_idletasks()
-
-        # set start value PDF's combineren
-        self.progress['value'] = 1
-        self.label.configure(text="Combining pdf's")
-        self.style.configure('text.Horizontal.TProgressbar',
-                             text='{:g} %'.format(self.progress['value']))
-
-        # combine pdf's
-        logging.info('Started combining PDF files')
-        comb.combine_pdf(process_dir=self.process_dir, out_dir=out_dir,
-                         msg_list=msg_list, progress=self.progress, style=self.style)
-        logging.info('Finished combining PDF files')
-
-        # update status pb PDF's combineren
-        self.progress.update()
-        self.progress.update_idletasks()
-
-        # make empty directories if they exist in the original directory
-        if len(self.empty_dir) > 0:
-            logging.info('Started creating empty directories')
-            for emp_dir in self.empty_dir:
-                create_emp_dir = emp_dir.replace(self.process_dir, out_dir)
-                try:
-                    # Create empty directory in output dir
-                    Path(create_emp_dir).mkdir(parents=True, exist_ok=True)
-                    logging.debug(
-                        f'Creating empty directory: {create_emp_dir}')
-                except:
-                    logging.error(
-                        f'Failed to create empty directory: {create_emp_dir}')
-            logging.info('Finished creating empty directories')
-
-        # count converted emails
-        total_pdf = 0
-        not_converted = []
-        excel_html = []
-        ext = ['.xlsx', '.xls', '.pdf', '.PDF', '.htm', '.html', '.XLS', '.XLXS']
-        for root, dirs, files in os.walk(out_dir):
-            for name in files:
-                name_lower = name.lower()
-                file_path = os.path.join(root, name_lower)
-                if name_lower.endswith('.pdf'):
-                    total_pdf += 1
-                if name_lower.endswith(".xlsx") or name_lower.endswith(".xls") or name_lower.endswith(".htm") or name_lower.endswith(".html"):
-                    excel_html.append(name_lower)
-                if not name_lower.endswith(tuple(ext)):
-                    not_converted.append(name_lower)
-                    logging.info(f'Not converted file: {file_path}')
-                    try:
-                        d = next(
-                            item for item in file_log if item['File name'] == file_path)
-                        d['Check'] = True
-                        d['Combined'] = False
-                        logging.debug(
-                            f'Updating log table for not converted file: {file_path}')
-                    except:
-                        logging.debug(
-                            f'Failed to update log table for not converted file: {file_path}')
-
-        # Make log table json (for debugging)
-        try:
-            with open('Log_results.json', 'w') as f:
-                json.dump(file_log, f)
-                logging.debug(f'Making json table Log_results')
-        except:
-            logging.debug(f'Failed to make json table Log_results')
-
-        # Make log table excel (for end-user)
-        Log_table_name = 'Results_PDF_' + \
-            str(os.path.basename(self.process_dir)) + '.xlsx'
-        Log_table_path = os.path.join(
-            os.path.dirname(self.process_dir), Log_table_name)
-        # delete 2 columns
-        logging.info('Deleting columns and replacing values')
-        for d in file_log:
-            try:
-                del (d['File name'])
-                del (d['File'])
-                d.update((k, "Y") for k, v in d.items() if v == True)
-                d.update((k, "N") for k, v in d.items() if v == False)
-            except:
-                logging.error('Failed to delete columns and replace values')
-
-        try:
-            wb = Workbook()
-            wb.save(Log_table_path)
-            wb = Workbook(write_only=True)
-            sheet = wb.create_sheet('Results')
-            fieldnames = list(file_log[0])
-            sheet.append(fieldnames)
-
-            for x in file_log:
-                sheet.append(list(x.values()))
-            wb.save(Log_table_path)
-        except:
-            logging.error(f'Failed to make log table: {Log_table_path}')
+        # extract emails, remove duplicates, print files to pdf and combine pdf's, each file as soon as it is ready
+        conversion = pl.Conversion(self.source, pl.ConvertOptions(
+            remove_duplicates=remove_duplicates, batch=self.batch), on_progress=self.update_progress)
+        for record in conversion:
+            pass
+        out_dir = conversion.out_dir
+        out_duplicates = conversion.out_duplicates
+        duplicates = conversion.duplicates
+        Log_table_path = conversion.log_table_path
+        total_pdf = conversion.total_pdf
+        not_converted = conversion.not_converted
 
         # print messages
         ready = 'Ready with conversion to pdf'
@@ -630,6 +439,26 @@ class Application(tk.Frame):
                 relx=.88, rely=.9, anchor="c")
             self.parent.protocol("WM_DELETE_WINDOW", self.ready)
 
+    def update_progress(self, stage, done, total):
+        """
+        Updates the progress bar while the conversion is running
+
+        Parameters
+        ----------
+        stage: str
+            The stage of the conversion a file just finished
+        done: int
+            The number of finished files
+        total: int
+            The number of files to convert
+        """
+        self.label.configure(text=self.stage_labels[stage])
+        self.progress['value'] = 1 + 99 * done / total if total > 0 else 100
+        self.style.configure('text.Horizontal.TProgressbar',
+                             text='{:.0f} %'.format(self.progress['value']))
+        self.progress.update()
+        self.progress.update_idletasks()
+
     def cancel(self):
         """
         Destroys the tool and inserts info in the log file if the tool is half-way stopped.
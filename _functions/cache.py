@@ -0,0 +1,216 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import _functions.libreoffice as lo
+
+"""
+This file is a python file that keeps the pdfs made by LibreOffice, so files that come back (letterheads, standard
+contracts, signature images) are not printed again in later emails or runs. This file is called from the file
+_functions.pipeline.
+
+A pdf is found by a hash of the content of the file and the settings of the converter. The cache is a directory of
+pdfs, when it grows above its maximum size the pdfs that were used longest ago are removed.
+
+Author: Joana Cardoso
+"""
+
+CHUNK = 1024 * 1024
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'),
+                                 'PDF_conversion_tool', 'cache')
+
+
+def file_key(file, settings):
+    """
+    Returns the key of a file in the cache
+
+    Parameters
+    ----------
+    file: str
+        The path to the file
+    settings: str
+        The settings of the converter
+    """
+    sha = hashlib.sha256(settings.encode('utf-8') + b'\0')
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class CachedConverter:
+    """
+    Converts files to pdf with another converter, but takes the pdf from the cache when the same file was converted
+    before. Has the same methods as the converters of _functions.libreoffice.
+    """
+
+    def __init__(self, converter, cache_dir=None, max_size=2 * 1024 ** 3, link=True):
+        """
+        Parameters
+        ----------
+        converter: SofficeConverter or LibreOfficePool
+            Converts the files that are not in the cache, see _functions.libreoffice
+        cache_dir: str
+            The directory of the cache, default is DEFAULT_CACHE_DIR
+        max_size: int
+            The maximum size of the cache in bytes. Default is 2 GiB
+        link: bool
+            Make a hard link to the pdf in the cache instead of a copy where possible. The pdfs in the output
+            directory should then only be replaced, never changed in place. Default is True
+        """
+        self.converter = converter
+        self.settings = getattr(converter, 'settings', type(converter).__name__)
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_size = max_size
+        self.link = link
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # pdf name: [size, last used]
+        self.entries = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                self.entries[entry.name] = [stat.st_size, stat.st_mtime]
+        self.size = sum(size for size, used in self.entries.values())
+        logging.info(f'Conversion cache {self.cache_dir} has {len(self.entries)} pdfs')
+
+    def _get(self, file, key):
+        """
+        Puts the pdf of file from the cache next to file, returns False if it is not in the cache
+        """
+        name = key + '.pdf'
+        cached = os.path.join(self.cache_dir, name)
+        with self.lock:
+            if name not in self.entries:
+                return False
+        target = lo.out_pdf(file)
+        try:
+            if os.path.exists(target):
+                os.remove(target)
+            if self.link:
+                try:
+                    os.link(cached, target)
+                except OSError:
+                    shutil.copyfile(cached, target)
+            else:
+                shutil.copyfile(cached, target)
+            os.utime(cached)
+        except:
+            logging.error(f'Failed to take pdf from the cache for file: {file}')
+            return False
+        with self.lock:
+            if name in self.entries:
+                self.entries[name][1] = os.path.getmtime(cached)
+        logging.debug(f'Taking pdf from the cache for file: {file}')
+        return True
+
+    def _put(self, file, key):
+        """
+        Saves the pdf made of file in the cache and removes the pdfs used longest ago when the cache is too large
+        """
+        name = key + '.pdf'
+        try:
+            handle, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            os.close(handle)
+            shutil.copyfile(lo.out_pdf(file), temp_path)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, os.path.join(self.cache_dir, name))
+        except:
+            logging.error(f'Failed to save pdf in the cache for file: {file}')
+            return
+        with self.lock:
+            old = self.entries.get(name)
+            size = os.path.getsize(os.path.join(self.cache_dir, name))
+            self.size += size - (old[0] if old else 0)
+            self.entries[name] = [size, os.path.getmtime(os.path.join(self.cache_dir, name))]
+            if self.size <= self.max_size:
+                return
+            for old_name in sorted(self.entries, key=lambda n: self.entries[n][1]):
+                if self.size <= self.max_size:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, old_name))
+                except OSError:
+                    logging.error(f'Failed to remove pdf from the cache: {old_name}')
+                    continue
+                self.size -= self.entries.pop(old_name)[0]
+
+    def _key(self, file):
+        try:
+            return file_key(file, self.settings)
+        except:
+            logging.error(f'Failed to read file for the cache: {file}')
+            return None
+
+    def convert(self, file):
+        """
+        Converts a file to a pdf in the same directory
+
+        Parameters
+        ----------
+        file: str
+            The path to the file
+
+        Returns
+        -------
+        converted: bool
+            True if the pdf was made
+        """
+        key = self._key(file)
+        if key is not None and self._get(file, key):
+            with self.lock:
+                self.hits += 1
+            return True
+        with self.lock:
+            self.misses += 1
+        converted = self.converter.convert(file)
+        if converted and key is not None:
+            self._put(file, key)
+        return converted
+
+    def convert_batch(self, files):
+        """
+        Converts several files of one directory to pdf, only the files that are not in the cache are given to the
+        converter
+
+        Parameters
+        ----------
+        files: list
+            The paths to the files, all in the same directory and with different names
+
+        Returns
+        -------
+        converted: dict
+            For every file True if the pdf was made
+        """
+        converted = {}
+        keys = {}
+        for file in files:
+            keys[file] = self._key(file)
+            if keys[file] is not None and self._get(file, keys[file]):
+                converted[file] = True
+        missing = [file for file in files if file not in converted]
+        # the cache is used from several print threads at the same time
+        with self.lock:
+            self.hits += len(converted)
+            self.misses += len(missing)
+        if len(missing) > 1:
+            converted.update(self.converter.convert_batch(missing))
+        elif missing:
+            converted[missing[0]] = self.converter.convert(missing[0])
+        for file in missing:
+            if converted[file] and keys[file] is not None:
+                self._put(file, keys[file])
+        return converted
+
+    def close(self):
+        """
+        Closes the converter
+        """
+        with self.lock:
+            logging.info(f'Conversion cache: {self.hits} hits, {self.misses} misses')
+        self.converter.close()
@@ -2,75 +2,124 @@ import logging
 import os
 import pikepdf
 import shutil
+import tempfile
 
 """
-This file is a python file that combines pdf files. This file is called from the main file PDF_conversion_tool.py, def convert_files.
+This file is a python file that combines pdf files. This file is called from the file _functions.pipeline.
 
 Author: Joana Cardoso
 """
 
-def combine_pdf(process_dir, out_dir, msg_list, progress, style):
+def part_order(part, directory):
     """
-    Combines emails and attachements into 1 pdf
+    Returns the sort key of a part of an email: the numbers extract_msg gives the body and attachments, for every
+    directory in the path (nested emails and zip files get a directory). Names that are not numbers come after the
+    numbers, sorted by name.
 
     Parameters
     ----------
-    process_dir: str
-        The path to the initial directory to convert
-    out_dir: str
-        The output directory where converted files will be placed
-    msg_list: list
-        List with all the emails and respective attachments
-    progress: Progressbar
-        The progress bar that is updated while running this file
-    style: Style
-        The progress bar style
+    part: str
+        The path to the part
+    directory: str
+        The directory with the email body and attachments
+    """
+    key = []
+    for name in os.path.relpath(part, directory).replace('\\', '/').split('/'):
+        stem = os.path.splitext(name)[0]
+        key.append((0, int(stem), '') if stem.isdigit() else (1, 0, name.lower()))
+    return tuple(key)
+
+
+def combine_pdf(directory, inventory=None, index=None):
+    """
+    Combines an email and its attachements into 1 pdf, as soon as the parts of the email are printed to pdf. The
+    parts are added in the order of their numbers (see part_order) and the combined pdf is saved once. The pages are
+    read from the parts while saving, so large attachments are not held in memory.
+
+    Parameters
+    ----------
+    directory: str
+        The directory with the email body and attachments, the combined pdf gets the same name
+    inventory: Inventory
+        The files in the output directory, updated with the combined pdf and removed parts, see
+        _functions.inventory. Default is None to walk the directory
+    index: DuplicateIndex
+        The files checked for duplicates, the hash of a file is made before it is removed, see
+        _functions.duplicates. Default is None
     """
     # combine into 1 pdf and delete individual pdf's
-    msg_dir = []
-    for msg in msg_list:
-        msg_dir.append(os.path.splitext(msg.replace(process_dir, out_dir))[0])
-    logging.info(f'Number of head emails to combine: {len(msg_dir)}')
-    for directory in msg_dir:
-        logging.info(f'Combined PDF directory: {directory}')
-        pdf = pikepdf.Pdf.new()
-        for root, dirs, files in os.walk(directory):
-            for name in files:
-                name_lower = name.lower()
-                if name_lower.endswith('.pdf'):
-                    try:
-                        file = os.path.join(root, name_lower)
-                        src = pikepdf.Pdf.open(file)
-                        pdf.pages.extend(src.pages)
-                        logging.debug(f'Adding file to combined PDF: {file}')
-                    except:
-                        logging.error(
-                            f'Failed to add file to combined pdf: {file}')
-                    try:
-                        pdf_combined = str(directory) + '.pdf'
-                        src.close()
-                        pdf.save(pdf_combined)
-                        logging.debug(f'Saving PDF combined: {pdf_combined}')
-                        try:
-                            os.remove(file)
-                            logging.debug(
-                                f'Removing original PDF file: {file}')
-                        except:
-                            logging.error(
-                                f'Failed to remove original PDF file: {file}')
-                    except:
-                        logging.error(
-                            f'Failed to save PDF combined: {pdf_combined}')
+    logging.info(f'Combined PDF directory: {directory}')
+    if inventory is not None:
+        parts = inventory.files_under(directory)
+    else:
+        parts = [os.path.join(root, name) for root, dirs, files in os.walk(directory) for name in files]
+    parts = sorted((part for part in parts if part.lower().endswith('.pdf')),
+                   key=lambda part: part_order(part, directory))
+    pdf_combined = str(directory) + '.pdf'
+    pdf = pikepdf.Pdf.new()
+    sources = []
+    added = []
+    temp_file = None
+    try:
+        for part in parts:
+            try:
+                src = pikepdf.Pdf.open(part)
+                sources.append(src)
+                pdf.pages.extend(src.pages)
+                added.append(part)
+                logging.debug(f'Adding file to combined PDF: {part}')
+            except:
+                logging.error(
+                    f'Failed to add file to combined pdf: {part}')
+        if not added:
+            return
+        try:
+            # saved next to the directory and then renamed, a failed save leaves no half written pdf
+            handle, temp_file = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(pdf_combined))
+            os.close(handle)
+            pdf.save(temp_file)
+        except:
+            logging.error(
+                f'Failed to save PDF combined: {pdf_combined}')
+            if temp_file is not None and os.path.exists(temp_file):
+                os.remove(temp_file)
+            return
+    finally:
+        for src in sources:
+            src.close()
+        pdf.close()
+    os.replace(temp_file, pdf_combined)
+    logging.debug(f'Saving PDF combined: {pdf_combined}')
+    if inventory is not None:
+        inventory.add(pdf_combined)
+    for part in added:
+        try:
+            if index is not None:
+                index.seal(part)
+            os.remove(part)
+            if inventory is not None:
+                inventory.remove(part)
+            logging.debug(
+                f'Removing original PDF file: {part}')
+        except:
+            logging.error(
+                f'Failed to remove original PDF file: {part}')
 
-        # set progress bar max value
-        progress['value'] += 99 / len(msg_dir) if len(msg_dir) > 0 else 99
-        progress.update()
-        progress.update_idletasks()
-        style.configure(
-            'text.Horizontal.TProgressbar',
-            text='{:.0f} %'.format(progress['value'])
-        )
 
+def remove_empty_dirs(out_dir, inventory=None):
+    """
+    Deletes the empty folders left in the output directory after combining
+
+    Parameters
+    ----------
+    out_dir: str
+        The output directory where converted files will be placed
+    inventory: Inventory
+        The files in the output directory, see _functions.inventory. Default is None to walk the output directory
+    """
+    if inventory is not None:
+        inventory.remove_empty_dirs()
+        return
     # delete empty folders
     removed = set()
     for dirpath, dirnames, filenames in os.walk(out_dir, topdown=False):
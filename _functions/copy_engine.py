@@ -0,0 +1,248 @@
+import logging
+import os
+import shutil
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+This file is a python file that copies files in the python process instead of starting a shell with copy for every
+file. This file is called from the files _functions.pipeline, _functions.get_files and _functions.print.
+
+A file is copied with the fastest way the operating system offers: a reflink (the copy shares the blocks of the
+original until one of them changes), copy_file_range or sendfile, which copy in the kernel, CopyFile2 on Windows and
+otherwise in chunks.
+Files that are not converted (pdf, excel and html files) can be linked instead: a hardlink to the original when the
+output directory is on the same disk. A linked file must never be written to, since the original would change too:
+it is replaced by a new file instead, see unshare.
+
+Author: Joana Cardoso
+"""
+
+CHUNK = 1024 * 1024
+# ioctl to make a reflink on Linux (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+def _reflink(source, target):
+    import fcntl
+    fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+
+def _copy_file_range(source, target, size):
+    copied = 0
+    while copied < size:
+        done = os.copy_file_range(source.fileno(), target.fileno(), min(size - copied, 1024 ** 3))
+        if done == 0:
+            break
+        copied += done
+    return copied
+
+
+def _sendfile(source, target, size):
+    copied = 0
+    while copied < size:
+        done = os.sendfile(target.fileno(), source.fileno(), copied, min(size - copied, 1024 ** 3))
+        if done == 0:
+            break
+        copied += done
+    return copied
+
+
+def _copy_file_windows(src, dst):
+    import _winapi
+    if not hasattr(_winapi, 'CopyFile2'):
+        # before python 3.12, copyfile copies in large chunks without the python file objects
+        shutil.copyfile(src, dst)
+        return
+    _winapi.CopyFile2(src, dst, 0)
+    # CopyFile2 also copies the attributes, a read-only copy could not be replaced or removed later
+    if not os.access(dst, os.W_OK):
+        os.chmod(dst, stat.S_IREAD | stat.S_IWRITE)
+
+
+def copy_file(src, dst):
+    """
+    Copies a file, the fastest way that works is used
+
+    Parameters
+    ----------
+    src: str
+        The path to the file
+    dst: str
+        The path to the copy
+
+    Returns
+    -------
+    size: int
+        The number of bytes copied
+    """
+    size = os.path.getsize(src)
+    # dst may be a link to src (of a run with link), writing to it would empty src
+    unshare(dst)
+    if os.name == 'nt':
+        _copy_file_windows(src, dst)
+        return size
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        if sys.platform.startswith('linux'):
+            try:
+                _reflink(source, target)
+                return size
+            except OSError:
+                pass
+            for fast_copy in ((_copy_file_range,) if hasattr(os, 'copy_file_range') else ()) + (_sendfile,):
+                try:
+                    if fast_copy(source, target, size) == size:
+                        return size
+                except OSError:
+                    pass
+                source.seek(0)
+                target.seek(0)
+                target.truncate()
+        shutil.copyfileobj(source, target, CHUNK)
+    return size
+
+
+def link_file(src, dst):
+    """
+    Links a file with a hardlink, copies it when that is not possible (e.g. on another disk)
+
+    Parameters
+    ----------
+    src: str
+        The path to the file
+    dst: str
+        The path to the link
+
+    Returns
+    -------
+    size: int
+        The number of bytes copied, 0 for a hardlink
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return 0
+    except OSError:
+        return copy_file(src, dst)
+
+
+def unshare(file):
+    """
+    Removes a file that is a hardlink of another file, so that writing to its path makes a new file and leaves the
+    other file as it is
+    """
+    try:
+        if os.stat(file).st_nlink > 1:
+            os.remove(file)
+            logging.debug(f'Removing link before writing: {file}')
+    except FileNotFoundError:
+        pass
+
+
+class CopyEngine:
+    """
+    Copies files on a pool of threads, remembers the directories it made and counts the copied bytes
+    """
+
+    def __init__(self, workers=None, link_extensions=()):
+        """
+        Parameters
+        ----------
+        workers: int
+            The number of files copied at the same time, default is the number of processors
+        link_extensions: tuple
+            Files with these extensions (lowercase) are linked instead of copied, see link_file. Default is () to
+            copy all files
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.link_extensions = tuple(link_extensions)
+        self.linked = 0
+        self.executor = None
+        self.lock = threading.Lock()
+        self.dirs = set()
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def makedirs(self, directory):
+        """
+        Makes a directory and its parents, only the first time it is asked for
+        """
+        if directory in self.dirs:
+            return
+        os.makedirs(directory, exist_ok=True)
+        logging.debug(f'Creating output directory: {directory}')
+        with self.lock:
+            self.dirs.add(directory)
+
+    def copy(self, src, dst, copy=copy_file):
+        """
+        Copies a file, the directory of the copy is made when needed
+
+        Parameters
+        ----------
+        src: str
+            The path to the file
+        dst: str
+            The path to the copy
+        copy: function
+            Copies src to dst and returns the number of bytes, e.g. ZipSource.extract. Default is copy_file
+        """
+        self.makedirs(os.path.dirname(dst))
+        start = time.perf_counter()
+        if copy is copy_file and self.link_extensions and dst.lower().endswith(self.link_extensions):
+            size = link_file(src, dst)
+            with self.lock:
+                self.linked += size == 0
+        else:
+            size = copy(src, dst)
+        with self.lock:
+            self.bytes += size
+            self.seconds += time.perf_counter() - start
+
+    def copy_many(self, pairs, copy=copy_file):
+        """
+        Copies several files at the same time
+
+        Parameters
+        ----------
+        pairs: list
+            (src, dst) per file
+        copy: function
+            Copies src to dst and returns the number of bytes. Default is copy_file
+
+        Returns
+        -------
+        copied: dict
+            For every src True if it was copied
+        """
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='copy')
+        futures = {src: self.executor.submit(self.copy, src, dst, copy) for src, dst in pairs}
+        copied = {}
+        for src, future in futures.items():
+            try:
+                future.result()
+                copied[src] = True
+            except Exception as e:
+                logging.error(f'Failed to copy file to output directory: {src}: {e}')
+                copied[src] = False
+        return copied
+
+    def rate(self):
+        """
+        Returns the copied bytes per second (per thread)
+        """
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def close(self):
+        """
+        Stops the threads and logs the copy speed
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        logging.info(f'Copied {self.bytes} bytes at {self.rate() / 1024 ** 2:.1f} MB/s, linked {self.linked} files')
@@ -1,137 +1,322 @@
 import hashlib
 import logging
 import os, re
+import threading
 from pathlib import Path
 
 """
-This file is a python file that processes duplicate files. This file is called from the main file PDF_conversion_tool.py, def convert_files.
+This file is a python file that processes duplicate files. This file is called from the file _functions.pipeline.
+
+Files are checked as soon as they are copied or extracted to the output directory. The first file with a certain content
+is kept, every later file with the same content is a duplicate. Files are only read when another file has the same
+size, see DuplicateIndex.
 
 Author: Joana Cardoso
 """
 
+CHUNK = 64 * 1024
+
 
-def remove_duplicates(process_dir, out_dir, progress, style, file_log, remove_duplicates):
+def duplicates_dir(process_dir):
     """
-    Identifies duplicates and if set_remove_duplicates is set to True it moves duplicates to another folder.
+    Returns the path to the directory where duplicates are moved to
 
     Parameters
     ----------
-    process_dir: str 
+    process_dir: str
         The path to the initial directory to convert
-    out_dir: str 
+    """
+    return os.path.join(os.path.dirname(
+        process_dir), "Dubbelingen_" + os.path.basename(process_dir))
+
+
+class Entry:
+    """
+    A file seen by the DuplicateIndex, the hashes are only made when another file has the same size
+    """
+
+    def __init__(self, file, size, partial=None, full=None):
+        self.file = file
+        self.size = size
+        self.partial = partial
+        self.full = full
+        # registered and not checked yet, see DuplicateIndex.register
+        self.registered = False
+
+    def partial_hash(self):
+        if self.partial is None:
+            self.partial = partial_hash(self.file, self.size)
+        return self.partial
+
+    def full_hash(self):
+        if self.full is None:
+            self.full = full_hash(self.file)
+        return self.full
+
+    def key(self):
+        return f'{self.size}:{self.partial or ""}:{self.full or ""}'
+
+
+def same_content(entry, other):
+    """
+    Returns True if both files have the same content, the hashes that are still needed are made here
+
+    Parameters
+    ----------
+    entry: Entry
+        The file to check
+    other: Entry
+        A file seen before with the same size
+    """
+    try:
+        if other.full is None and entry.partial_hash() != other.partial_hash():
+            return False
+        return entry.full_hash() == other.full_hash()
+    except:
+        logging.error(f'Failed to read file for duplicates: {other.file}')
+        return False
+
+
+def partial_hash(file, size):
+    """
+    Returns the md5 of the first and the last CHUNK bytes of a file
+
+    Parameters
+    ----------
+    file: str
+        The path to the file
+    size: int
+        The size of the file
+    """
+    md5 = hashlib.md5()
+    with open(file, 'rb') as f:
+        md5.update(f.read(CHUNK))
+        if size > 2 * CHUNK:
+            f.seek(-CHUNK, os.SEEK_END)
+        md5.update(f.read(CHUNK))
+    return md5.hexdigest()
+
+
+def full_hash(file):
+    """
+    Returns the md5 of a file, read in chunks of CHUNK bytes so large files do not have to fit in memory
+
+    Parameters
+    ----------
+    file: str
+        The path to the file
+    """
+    md5 = hashlib.md5()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class DuplicateIndex:
+    """
+    Remembers the files seen so far by size, files can be checked from several threads at the same time.
+
+    A file is only read when an earlier file has the same size: first the first and last CHUNK bytes are compared and
+    only when these are the same the whole files. A file that is removed or written again after checking (e.g. because
+    it is printed to pdf) has to be sealed first, then its hash is made while it is still there, see seal.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # size: entries in the order they were seen
+        self.sizes = {}
+        self.entries = {}
+
+    def add(self, key, file):
+        """
+        Adds a file checked in a previous run
+
+        Parameters
+        ----------
+        key: str
+            The key of the file, see key()
+        file: str
+            The path to the file
+        """
+        size, partial, full = key.split(':')
+        entry = Entry(file, int(size), partial or None, full or None)
+        with self.lock:
+            if file not in self.entries:
+                self.entries[file] = entry
+                self.sizes.setdefault(entry.size, []).append(entry)
+
+    def key(self, file):
+        """
+        Returns the size and the hashes made so far of a file that is not a duplicate, to save it for a next run. None
+        if the file is not in the index.
+
+        Parameters
+        ----------
+        file: str
+            The path to the file
+        """
+        entry = self.entries.get(file)
+        return entry.key() if entry is not None else None
+
+    def seal(self, file):
+        """
+        Makes the hash of a file in the index before it is removed or written again, so later files with the same size
+        can still be compared with it. Files that are not in the index are left alone
+
+        Parameters
+        ----------
+        file: str
+            The path to the file
+        """
+        entry = self.entries.get(file)
+        if entry is None or entry.full is not None:
+            return
+        try:
+            entry.full_hash()
+        except:
+            logging.error(f'Failed to read file for duplicates: {file}')
+
+    def register(self, file, size=None):
+        """
+        Adds a file that will be checked, a file is only compared with the files registered before it. Files are
+        registered in a fixed order (e.g. the order of the selected folder), so the same file is the original in every
+        run, also when the files are checked on several threads
+
+        Parameters
+        ----------
+        file: str
+            The path to the file
+        size: int
+            The size of the file if it is known, default is None to get it from disk
+
+        Returns
+        -------
+        entry: Entry
+            The registered file, None if the file is empty or cannot be read
+        """
+        try:
+            if size is None:
+                size = os.path.getsize(file)
+            if size == 0:
+                logging.error(f'Document is empty: {file}')
+                return None
+            entry = Entry(file, size)
+        except:
+            logging.error(f'Failed to read file for duplicates: {file}')
+            return None
+        entry.registered = True
+        with self.lock:
+            previous = self.entries.get(file)
+            if previous is not None:
+                # the file is checked again, e.g. made again after the output of a previous run was removed
+                self.sizes[previous.size].remove(previous)
+            self.sizes.setdefault(size, []).append(entry)
+            self.entries[file] = entry
+        return entry
+
+    def check(self, file, size=None):
+        """
+        Checks whether a file with the same content was registered before, a file that is not registered yet is
+        registered first
+
+        Parameters
+        ----------
+        file: str
+            The path to the file
+        size: int
+            The size of the file if it is known, default is None to get it from disk
+
+        Returns
+        -------
+        original: str
+            The path to the file registered before with the same content, None if the file is not a duplicate
+        """
+        with self.lock:
+            entry = self.entries.get(file)
+        if entry is None or not entry.registered:
+            entry = self.register(file, size)
+            if entry is None:
+                return None
+        entry.registered = False
+        with self.lock:
+            same_size = self.sizes[entry.size]
+            others = same_size[:same_size.index(entry)]
+        # the first file with the same content is the original, a duplicate found in between has it as original too
+        for other in others:
+            if same_content(entry, other):
+                with self.lock:
+                    # a duplicate is not compared with later files, the original is
+                    self.sizes[entry.size].remove(entry)
+                    del self.entries[file]
+                return other.file
+        return None
+
+
+def handle_duplicate(rmfile, out_dir, out_duplicates, file_log, remove_duplicates, inventory=None):
+    """
+    Updates the log table for a duplicate and if remove_duplicates is set to True it moves the duplicate to another folder.
+
+    Parameters
+    ----------
+    rmfile: str
+        The path to the duplicate file
+    out_dir: str
         The output directory where converted files will be placed
-    progress: Progressbar 
-        The progress bar that is updated while running this file
-    style: Style
-        The progress bar style
-    file_log: list 
+    out_duplicates: str
+        The path to the duplicates directory
+    file_log: LogTable
         The logging table
     remove_duplicates: bool
         Remove_duplicates is set to True or False, depending whether duplicates are to be removed or not
-
-    Returns
-    -------
-    out_duplicates: str
-        The path to the duplicates directory
-    duplicates: set 
-        The duplicate files
+    inventory: Inventory
+        The files in the output directory, a moved duplicate is removed from it, see _functions.inventory. Default is
+        None
     """
+    src = rmfile
+    target = rmfile.replace(out_dir, out_duplicates)
+    base_dir = os.path.dirname(target)
+
+    if remove_duplicates == True:
+        logging.info(f'Duplicates directory: {out_duplicates}')
 
-    md5_files = []
-
-    for root, dirs, files in os.walk(out_dir):
-        for name in files:
-            if os.path.getsize(os.path.join(root, name)) > 0:
-                # print(f'size:{os.path.getsize(os.path.join(root, name))}')
-                md5_files.append(os.path.join(root, name))
-            else:
-                    logging.error(f'Document is empty: {os.path.join(root, name)}')
-                    # print(f'Document is empty: {os.path.join(root, name)}')
-
-    # List duplicates
-    md5_dict = {}
-    for f in md5_files:
-        md5_dict[f] = hashlib.md5(Path(f).read_bytes()).hexdigest()
-
-    result = {}
-    for key, value in md5_dict.items():
-        if value not in result.values():
-            result[key] = value
-    keys_a = set(md5_dict.keys())
-    keys_b = set(result.keys())
-    duplicates = keys_a ^ keys_b
-
-    # Remove duplicates
-    out_duplicates = os.path.join(os.path.dirname(
-                        process_dir), "Dubbelingen_" + os.path.basename(process_dir))
-
-    if len(duplicates) > 0:
-        for rmfile in duplicates:
-            src = rmfile
-            target = rmfile.replace(out_dir, out_duplicates)
-            base_dir = os.path.dirname(target)
-
-            if remove_duplicates == True:
-                logging.info(f'Duplicates directory: {out_duplicates}')
-                logging.info(f'Duplicate files to remove: {len(duplicates)}')
-                
-                try:
-                    Path(base_dir).mkdir(parents=True, exist_ok=True)
-                    logging.debug(f'Creating duplicates directory: {base_dir}')
-                except:
-                    logging.error(
-                        f'Failed to create duplicates directory: {base_dir}')
-                try:
-                    os.rename(src, target)
-                    logging.debug(
-                        f'Moving duplicate file to duplicates directory: {rmfile}')
-                except:
-                    logging.error(
-                        f'Failed to move duplicate file to duplicates directory: {rmfile}')
-
-                # set progress bar max value
-                progress['value'] += 99 / \
-                    len(duplicates) if len(duplicates) > 0 else 99
-                progress.update()
-                progress.update_idletasks()
-                style.configure(
-                    'text.Horizontal.TProgressbar',
-                    text='{:.0f} %'.format(progress['value'])
-                )
-
-            # update log table
-            if re.search('\d+.txt$', rmfile):
-                file_msg= os.path.dirname(rmfile) + '.msg'            
-                try:
-                    d = next(item for item in file_log if
-                            os.path.join(os.path.dirname(item['File']), item['File name']) == file_msg)
-                    d['Duplicate'] = True
-                    d['Combined'] = False
-                    logging.debug(
-                        f'Updating log table for duplicate: {file_msg}')
-                except:
-                    logging.error(
-                        f'Failed to update log table for duplicate: {file_msg}')
-            else:           
-                try:
-                    d = next(item for item in file_log if
-                            os.path.join(os.path.dirname(item['File']), item['File name']) == rmfile)
-                    d['Duplicate'] = True
-                    d['Combined'] = False
-                    logging.debug(
-                        f'Updating log table for duplicate: {rmfile}')
-                    
-                except:
-                        logging.error(
-                            f'Failed to update log table for duplicate: {rmfile}')
+        try:
+            Path(base_dir).mkdir(parents=True, exist_ok=True)
+            logging.debug(f'Creating duplicates directory: {base_dir}')
+        except:
+            logging.error(
+                f'Failed to create duplicates directory: {base_dir}')
+        try:
+            os.rename(src, target)
+            if inventory is not None:
+                inventory.remove(src)
+            logging.debug(
+                f'Moving duplicate file to duplicates directory: {rmfile}')
+        except:
+            logging.error(
+                f'Failed to move duplicate file to duplicates directory: {rmfile}')
 
+    # update log table
+    # the body of an email has no record of its own, see _functions.extract_msg
+    if file_log.get(rmfile) is None and re.search(r'\d+\.(txt|pdf)$', rmfile):
+        file_msg= file_log.email_file(os.path.dirname(rmfile))
+        try:
+            d = file_log[file_msg]
+            d['Duplicate'] = True
+            d['Combined'] = False
+            logging.debug(
+                f'Updating log table for duplicate: {file_msg}')
+        except:
+            logging.error(
+                f'Failed to update log table for duplicate: {file_msg}')
     else:
-        progress['value'] += 99
-        progress.update()
-        progress.update_idletasks()
-        style.configure(
-            'text.Horizontal.TProgressbar',
-            text='{:.0f} %'.format(progress['value'])
-        )
-
-    return out_duplicates, duplicates
+        try:
+            d = file_log[rmfile]
+            d['Duplicate'] = True
+            d['Combined'] = False
+            logging.debug(
+                f'Updating log table for duplicate: {rmfile}')
+
+        except:
+                logging.error(
+                    f'Failed to update log table for duplicate: {rmfile}')
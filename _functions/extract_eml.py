@@ -0,0 +1,377 @@
+import binascii
+import email.parser
+import email.policy
+import email.utils
+import logging
+import mimetypes
+import os
+import re
+from pathlib import Path
+import _functions.extract_msg as msg
+import _functions.msg_file as mfile
+
+"""
+This file is a python file that processes EML emails. This file is called from the file _functions.get_files.
+
+An EML file is read line by line: the body is written to a pdf like the body of an outlook email (see
+_functions.extract_msg.write_body) and attachments are decoded and written to disk while they are read, so a large
+attachment is never in memory. Attached emails (message/rfc822) get a directory of their own with the same numbering
+as attached outlook emails.
+
+Author: Joana Cardoso
+"""
+
+# the number of base64 characters decoded at once
+BASE64_CHUNK = 64 * 1024
+
+
+class _Lines:
+    """
+    The lines of a binary file, a line can be put back to be read again
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.pushed = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pushed:
+            return self.pushed.pop()
+        line = self.f.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def push(self, line):
+        self.pushed.append(line)
+
+
+class _Decoder:
+    """
+    Decodes the content-transfer-encoding of a part line by line
+    """
+
+    def __init__(self, encoding):
+        self.encoding = (encoding or '7bit').lower()
+        self.buffer = b''
+
+    def feed(self, line):
+        if self.encoding == 'base64':
+            self.buffer += re.sub(rb'[^A-Za-z0-9+/=]', b'', line)
+            if len(self.buffer) < BASE64_CHUNK:
+                return b''
+            cut = len(self.buffer) - len(self.buffer) % 4
+            data, self.buffer = self.buffer[:cut], self.buffer[cut:]
+            return binascii.a2b_base64(data)
+        if self.encoding == 'quoted-printable':
+            return binascii.a2b_qp(line)
+        return line
+
+    def flush(self):
+        if self.encoding != 'base64' or not self.buffer:
+            return b''
+        data = self.buffer + b'=' * (-len(self.buffer) % 4)
+        self.buffer = b''
+        try:
+            return binascii.a2b_base64(data)
+        except binascii.Error:
+            return b''
+
+
+def _boundary(line, boundaries):
+    """
+    Returns (boundary, closing) when line is a boundary of one of the multiparts the line is in, otherwise None
+    """
+    if not line.startswith(b'--'):
+        return None
+    stripped = line.rstrip()
+    for boundary in reversed(boundaries):
+        if stripped == b'--' + boundary:
+            return boundary, False
+        if stripped == b'--' + boundary + b'--':
+            return boundary, True
+    return None
+
+
+def _skip(lines, boundaries):
+    for line in lines:
+        end = _boundary(line, boundaries)
+        if end is not None:
+            return end
+    return None
+
+
+def _copy_body(lines, boundaries, decoder, write):
+    """
+    Decodes the lines up to the next boundary and passes them to write, the line break before a boundary belongs to
+    the boundary
+    """
+    previous = None
+    end = None
+    for line in lines:
+        end = _boundary(line, boundaries)
+        if end is not None:
+            break
+        if previous is not None:
+            write(decoder.feed(previous))
+        previous = line
+    if previous is not None:
+        if end is not None:
+            previous = previous[:-2] if previous.endswith(b'\r\n') else previous.rstrip(b'\n')
+        write(decoder.feed(previous))
+    write(decoder.flush())
+    return end
+
+
+def _read_headers(lines, boundaries):
+    data = []
+    for line in lines:
+        if _boundary(line, boundaries) is not None:
+            lines.push(line)
+            break
+        if line in (b'\r\n', b'\n'):
+            break
+        data.append(line)
+    # headers should be ascii, but some mail programs write utf-8 (or windows-1252) without encoded words
+    data = b''.join(data)
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        text = data.decode('cp1252', 'replace')
+    return email.parser.Parser(policy=email.policy.default).parsestr(text, headersonly=True)
+
+
+def _header(headers, name):
+    try:
+        value = headers[name]
+    except:
+        return ''
+    return '' if value is None else str(value)
+
+
+def _names(headers, name):
+    """
+    Returns the display names (or addresses) of an address header, separated by ; like in Outlook
+    """
+    try:
+        addresses = headers[name].addresses
+        return '; '.join(address.display_name or address.addr_spec for address in addresses)
+    except:
+        return _header(headers, name)
+
+
+class _Email:
+    """
+    The parts of one (attached) email that is being read, with the attributes of write_body
+    """
+
+    def __init__(self, file_out, new_dir, file_log, main_email, index):
+        self.file_out = file_out
+        self.new_dir = new_dir
+        self.file_log = file_log
+        self.main_email = main_email
+        # the body gets the first number, the attachments the next ones
+        self.body_index = index
+        self.index = index + 1
+        self.attachment = None
+        self.text = None
+        self.html = None
+        self.SenderName = self.To = self.CC = self.Subject = self.Body = ''
+        self.SentOn = ''
+
+    def set_headers(self, headers):
+        self.SenderName = _names(headers, 'From')
+        self.To = _names(headers, 'To')
+        self.CC = _names(headers, 'CC')
+        self.Subject = _header(headers, 'Subject')
+        try:
+            self.SentOn = email.utils.parsedate_to_datetime(_header(headers, 'Date'))
+        except:
+            self.SentOn = _header(headers, 'Date')
+
+    def add_attachment(self, name):
+        """
+        Returns the path of a new attachment and adds it to the log table
+        """
+        name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', '_', name) or 'attachment'
+        att_out = os.path.join(os.path.abspath(self.new_dir), str(self.index) + os.path.splitext(name)[1])
+        logging.info(f'Output directory attachment: {att_out}')
+        self.index += 1
+        if self.attachment is None:
+            try:
+                d = self.file_log[self.file_out]
+                d['Combined'] = True
+                logging.debug(f'Updating log table for eml: {self.file_out}')
+            except:
+                logging.error(f'Failed to update log table for eml: {self.file_out}')
+        self.attachment = name
+        if not name.lower().endswith('.zip'):
+            try:
+                self.file_log.add(
+                    filename=att_out,
+                    file=att_out,
+                    sourcefile=self.main_email,
+                    attachment=True,
+                    attachment_name=name,
+                    review=False,
+                    pdf_parsed=False,
+                    combined=True,
+                    # Set combined here since file extension will change later (e.g. from .png to .pdf)
+                    duplicated=False
+                )
+                logging.debug(f'Updating log table for attachment: {att_out}')
+            except:
+                logging.error(f'Failed to update log table for attachment: {att_out}')
+        return att_out
+
+    def finish(self, file):
+        """
+        Writes the body to a pdf (or a TXT file, see _functions.extract_msg.write_body), the plain text body or else
+        the text of the html body
+        """
+        if self.text is not None:
+            self.Body = self.text
+        elif self.html is not None:
+            self.Body = mfile.html_to_text(self.html)
+        out_pdf = os.path.join(self.new_dir, str(self.body_index) + '.pdf')
+        logging.info(f'PDF: {out_pdf}')
+        try:
+            if not msg.write_body(out_pdf, self):
+                # the TXT file is printed by LibreOffice, the log table is updated then, see _functions.print
+                return
+            logging.debug(f'Converting file to PDF: {file}')
+        except:
+            logging.error(f'Failed to convert file to PDF: {file}')
+            try:
+                self.file_log[self.file_out]['Check'] = True
+            except:
+                logging.error(f'Failed to update log table for eml: {self.file_out}')
+            return
+        try:
+            d = self.file_log[self.file_out]
+            d['To PDF'] = True
+            d['Combined'] = True
+            logging.debug(f'Updating log table for eml: {self.file_out}')
+        except:
+            logging.error(f'Failed to update log table for eml: {self.file_out}')
+
+
+def _text(headers, data):
+    charset = headers.get_content_charset() or 'utf-8'
+    try:
+        return data.decode(charset, 'replace')
+    except LookupError:
+        return data.decode('utf-8', 'replace')
+
+
+def _read_message(lines, boundaries, current, file, headers=None):
+    """
+    Reads an (attached) email: its headers (when they are not read yet) and its content
+    """
+    if headers is None:
+        headers = _read_headers(lines, boundaries)
+    current.set_headers(headers)
+    end = _read_content(lines, boundaries, headers, current, file)
+    current.finish(file)
+    return end
+
+
+def _read_content(lines, boundaries, headers, current, file):
+    """
+    Reads the content of a part up to the next boundary of the multiparts it is in, returns that boundary (None at the
+    end of the file)
+    """
+    content_type = headers.get_content_type()
+    encoding = _header(headers, 'Content-Transfer-Encoding').strip().lower()
+    if headers.get_content_maintype() == 'multipart' and headers.get_boundary():
+        inner = boundaries + [headers.get_boundary().encode('ascii', 'replace')]
+        end = _skip(lines, inner)
+        while end is not None and end[0] == inner[-1] and not end[1]:
+            end = _read_content(lines, inner, _read_headers(lines, inner), current, file)
+        if end is not None and end[0] == inner[-1]:
+            end = _skip(lines, boundaries)
+        return end
+
+    filename = headers.get_filename()
+    disposition = (headers.get_content_disposition() or '').lower()
+    if content_type == 'message/rfc822' and encoding not in ('base64', 'quoted-printable'):
+        # an attached email: written to a directory of its own, numbered from the number after its own number
+        message_headers = _read_headers(lines, boundaries)
+        name = (filename or _header(message_headers, 'Subject') or 'email').rstrip('.')
+        att_out = current.add_attachment(name if name.lower().endswith('.eml') else name + '.eml')
+        nested_dir = os.path.splitext(att_out)[0]
+        logging.info(f'Attached message: {name}')
+        Path(nested_dir).mkdir(parents=True, exist_ok=True)
+        nested = _Email(att_out, nested_dir, current.file_log, current.main_email, current.index + 1)
+        return _read_message(lines, boundaries, nested, att_out, message_headers)
+
+    if disposition != 'attachment' and not filename and content_type in ('text/plain', 'text/html'):
+        body = []
+        end = _copy_body(lines, boundaries, _Decoder(encoding), body.append)
+        if content_type == 'text/plain' and current.text is None:
+            current.text = _text(headers, b''.join(body))
+            return end
+        if content_type == 'text/html' and current.html is None:
+            current.html = _text(headers, b''.join(body))
+            return end
+        # a second body (e.g. of a forwarded part) is kept as attachment
+        att_out = current.add_attachment('body' + ('.txt' if content_type == 'text/plain' else '.html'))
+        with open(att_out, 'wb') as f:
+            f.write(b''.join(body))
+        return end
+
+    name = filename or (_header(headers, 'Content-Description') or 'attachment') + \
+        (mimetypes.guess_extension(content_type) or '')
+    att_out = current.add_attachment(name)
+    with open(att_out, 'wb') as f:
+        end = _copy_body(lines, boundaries, _Decoder(encoding), f.write)
+    logging.debug(f'Saving attachment to out dir: {name}')
+    if att_out.lower().endswith('.eml'):
+        # an email attached as a file
+        nested_dir = os.path.splitext(att_out)[0]
+        Path(nested_dir).mkdir(parents=True, exist_ok=True)
+        with open(att_out, 'rb') as f:
+            _read_message(_Lines(f), [], _Email(att_out, nested_dir, current.file_log, current.main_email,
+                                                 current.index + 1), att_out)
+    return end
+
+
+def extract_eml(file, root_dir, main_email, file_log, out_dir, process_dir):
+    """
+    Writes the body of an EML email to a pdf and extracts its attachments, like _functions.extract_msg
+
+    Parameters
+    ----------
+    file: str
+        The path to the EML file to process
+    root_dir: str
+        Directory to write the output of the EML file
+    main_email: str
+        The path to the main email
+    file_log: LogTable
+        The log table to append to
+    out_dir: str
+        The output directory where converted files will be placed
+    process_dir: str
+        The path to the initial directory to convert
+
+    Returns
+    -------
+    attachment: str
+        The name of the last attachment, None if there are no attachments
+    """
+    new_dir = os.path.join(root_dir, os.path.basename(file).rsplit('.', 1)[0])
+    logging.info(f'New_dir: {new_dir}')
+    try:
+        Path(new_dir).mkdir(parents=True, exist_ok=True)
+        logging.debug(f'Creating new directory: {new_dir}')
+    except:
+        logging.error(f'Failed to create new directory: {new_dir}')
+
+    current = _Email(main_email.replace(process_dir, out_dir), new_dir, file_log, main_email, 0)
+    with open(file, 'rb') as f:
+        _read_message(_Lines(f), [], current, file)
+    return current.attachment
@@ -1,19 +1,79 @@
 import logging
 import os
 # import subprocess
-import win32com.client
 from pathlib import Path
-import _functions.log_table as log
 import csv
+import _functions.msg_file as mfile
+import _functions.text_pdf as tp
+try:
+    import pythoncom
+    import win32com.client
+except ImportError:
+    # no Outlook (e.g. on Linux), MSG files are read with _functions.msg_file
+    pythoncom = None
 
 """
-This file is a python file that processes emails. This file is called from the main file PDF_conversion_tool.py, def convert_files.
+This file is a python file that processes emails. This file is called from the file _functions.get_files.
 
 Author: Joana Cardoso
 """
 
+# 'outlook' opens MSG files in Outlook, 'python' reads them with _functions.msg_file (faster and on any system)
+BACKENDS = ('outlook', 'python')
+DEFAULT_BACKEND = 'outlook' if pythoncom is not None else 'python'
 
-def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nested=False, index=0):
+
+def write_txt(out_txt, msg):
+    """
+    Writes the sender, date, receivers, subject and body of an email to a TXT file, which is printed to pdf later
+
+    Parameters
+    ----------
+    out_txt: str
+        The path to the TXT file
+    msg: object
+        The email, with the attributes SenderName, SentOn, To, CC, Subject and Body like in Outlook
+    """
+    with open(out_txt, mode='w', newline='', encoding="utf-8") as csvfile:
+        fieldnames = ['text']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow({'text': 'From:          ' + msg.SenderName})
+        writer.writerow({'text': 'Date:    ' + str(msg.SentOn)})
+        writer.writerow({'text': 'To:          ' + msg.To})
+        writer.writerow({'text': 'CC:           ' + msg.CC})
+        writer.writerow({'text': 'Subject:    ' + msg.Subject})
+        writer.writerow({'text': '\n' + msg.Body})
+
+
+def write_body(out_pdf, msg):
+    """
+    Writes the sender, date, receivers, subject and body of an email to a pdf, see _functions.text_pdf. An email with
+    characters that are not in windows-1252 is written to a TXT file with the same name instead, which LibreOffice
+    prints to pdf later, see write_txt
+
+    Parameters
+    ----------
+    out_pdf: str
+        The path to the pdf
+    msg: object
+        The email, with the attributes SenderName, SentOn, To, CC, Subject and Body like in Outlook
+
+    Returns
+    -------
+    written: bool
+        True if the pdf was written, False if the TXT file was written
+    """
+    try:
+        tp.write_pdf(tp.email_lines(msg), out_pdf)
+        return True
+    except UnicodeEncodeError:
+        logging.info(f'Email has characters that are not in Courier, printed by LibreOffice: {out_pdf}')
+        write_txt(os.path.splitext(out_pdf)[0] + '.txt', msg)
+        return False
+
+
+def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nested=False, index=0,
+                backend=DEFAULT_BACKEND, message=None):
     """
     Converts email bodies to pdf and extracts attachments for (nested) outlook MSG files.
 
@@ -25,7 +85,7 @@ def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nest
         Directory to write the output of the specific MSG file
     main_email: str 
         The path to the main email
-    file_log: list 
+    file_log: LogTable
         The log table to append to
     out_dir: str 
         The output directory where converted files will be placed
@@ -35,6 +95,11 @@ def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nest
         Checks whether the MSG file is the root email or a nested MSG file as attachment. Default is False
     index: int 
         The number given to each attachment so that they are combined as 1 pdf in a specific order. Default is 0
+    backend: str
+        How MSG files are read, see BACKENDS. Default is Outlook when it can be used
+    message: Message
+        The email when it is already read, an attached email read from memory by _functions.msg_file. Default is
+        None to open file
 
     Returns
     -------
@@ -91,40 +156,38 @@ def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nest
     # except:
     #     logging.error(f'Failed to update log table for msg: {file_out}')
 
-    outlook = win32com.client.Dispatch(
-        "Outlook.Application").GetNamespace("MAPI")
-    msg = outlook.OpenSharedItem(os.path.abspath(file))
+    if message is not None:
+        msg = message
+    elif backend == 'python':
+        msg = mfile.open_message(file)
+    else:
+        # emails are extracted on a worker thread, which has to initialise COM itself
+        if not nested:
+            pythoncom.CoInitialize()
+        outlook = win32com.client.Dispatch(
+            "Outlook.Application").GetNamespace("MAPI")
+        msg = outlook.OpenSharedItem(os.path.abspath(file))
     count_attachments = msg.Attachments.Count
+    attachment = None
 
-    fileName, fileExtension = os.path.splitext(file)
     logging.info(f'File: {file}')
-    new_name = fileName.replace(fileName, str(index)) + fileExtension
-    out_txt = os.path.join(new_dir, new_name).replace(".msg", ".txt")
-    logging.info(f'TXT: {out_txt}')
+    out_pdf = os.path.join(new_dir, str(index) + '.pdf')
+    logging.info(f'PDF: {out_pdf}')
 
     try:
-        with open(out_txt, mode='w', newline='', encoding="utf-8") as csvfile:
-            fieldnames = ['text']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_MINIMAL)
-            # writer.writeheader()
-            msg_sender = msg.SenderName
-            msg_date = msg.SentOn
-            msg_receiver = msg.To
-            msg_cc = msg.CC
-            msg_subj = msg.Subject
-            msg_message = msg.Body
-
-            writer.writerow({'text': 'From:          ' + msg_sender})
-            writer.writerow({'text': 'Date:    ' + str(msg_date)})
-            writer.writerow({'text': 'To:          ' + msg_receiver})
-            writer.writerow({'text': 'CC:           ' + msg_cc})
-            writer.writerow({'text': 'Subject:    ' + msg_subj})
-            writer.writerow({'text': '\n' + msg_message})
-            logging.debug(f'Converting file to TXT: {file}')
+        # the log table is updated when the TXT file is printed if the pdf is not written here, see _functions.print
+        if write_body(out_pdf, msg):
+            logging.debug(f'Converting file to PDF: {file}')
+            try:
+                d = file_log[file_out]
+                d['To PDF'] = True
+                d['Combined'] = True
+                logging.debug(f'Updating log table for msg: {file_out}')
+            except:
+                logging.error(f'Failed to update log table for msg: {file_out}')
     except:
-            logging.error(f'Failed to convert file to TXT: {file}')
-            d = next(
-            item for item in file_log if item['File name'] == file_out)
+            logging.error(f'Failed to convert file to PDF: {file}')
+            d = file_log[file_out]
             d['Check'] = True
     # except Exception as e:
     #         logging.error(f'e: {e}')
@@ -139,8 +202,7 @@ def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nest
     # If there are attachments, extract those
     if count_attachments > 0:
         try:
-            d = next(
-                item for item in file_log if item['File name'] == file_out)
+            d = file_log[file_out]
             d['Combined'] = True
             logging.debug(f'Updating log table for msg: {file_out}')
         except:
@@ -150,9 +212,9 @@ def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nest
         for item in range(1, count_attachments + 1):
             try:
                 att = msg.Attachments.Item(item)
-                attachment = att.filename
-                logging.info(f'Attachment: {att.filename}')
-                fileName, fileExtension = os.path.splitext(att.filename)
+                attachment = att.FileName
+                logging.info(f'Attachment: {att.FileName}')
+                fileName, fileExtension = os.path.splitext(att.FileName)
                 att_name = fileName.replace(
                     fileName, str(index)) + fileExtension
                 att_out = os.path.join(os.path.abspath(new_dir), att_name)
@@ -161,22 +223,23 @@ def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nest
                 logging.error(f'{e}')
                 continue
             try:
-                att.SaveAsFile(att_out)
+                # an attached email read by _functions.msg_file is not written, it is read from memory
+                if getattr(att, 'message', None) is None:
+                    att.SaveAsFile(att_out)
                 index += 1
-                logging.debug(f'Saving attachment to out dir: {att.filename}')
+                logging.debug(f'Saving attachment to out dir: {att.FileName}')
             except:
-                logging.error(f'Failed to save attachment: {att.filename}')
+                logging.error(f'Failed to save attachment: {att.FileName}')
 
             # update log table
-            if not att.filename.endswith('.zip'):
+            if not att.FileName.lower().endswith('.zip'):
                 try:
-                    file_log = log.log_to_table(
-                        log_table=file_log,
+                    file_log.add(
                         filename=att_out,
                         file=att_out,
                         sourcefile=main_email,
                         attachment=True,
-                        attachment_name=att.Filename,
+                        attachment_name=att.FileName,
                         review=False,
                         pdf_parsed=False,
                         combined=True,
@@ -189,8 +252,8 @@ def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nest
                     logging.error(
                         f'Failed to update log table for attachment: {att_out}')
 
-            if att.Filename.endswith(".msg"):
-                logging.info(f'Attached message: {att.filename}')
+            if att.FileName.lower().endswith(".msg"):
+                logging.info(f'Attached message: {att.FileName}')
                 nested_dir = os.path.join(
                     new_dir, (os.path.basename(att_out).rsplit('.', 1)[0]))
                 logging.info(f'Nested directory: {nested_dir}')
@@ -204,7 +267,9 @@ def extract_msg(file, root_dir, main_email, file_log, out_dir, process_dir, nest
                 extract_msg(
                     file=att_out, root_dir=nested_dir, out_dir=out_dir,
                     main_email=main_email, file_log=file_log, process_dir=process_dir,
-                    nested=True, index=index + 1
+                    nested=True, index=index + 1, backend=backend, message=getattr(att, 'message', None)
                 )
 
-        return attachment
+    if message is None and backend == 'python':
+        msg.Close()
+    return attachment
@@ -2,157 +2,221 @@ import logging
 import os
 import subprocess
 from pathlib import Path
+import _functions.copy_engine as ce
+import _functions.extract_eml as eml
 import _functions.extract_msg as msg
-import _functions.log_table as log
+import _functions.inventory as inv
 import _functions.unzip_files as uz
 
 """
-This file is a python file that copies individual files to the output map and extracts emails and attachments. This file is called from the main file PDF_conversion_tool.py, def convert_files.
+This file is a python file that copies individual files to the output map and extracts emails and attachments. This file is called from the file _functions.pipeline.
 
 Author: Joana Cardoso
 """
 
 
-def get_all_files(files, process_dir, out_dir, progress, style):
+def copy_files(files, process_dir, out_dir, file_log, source=None, inventory=None, copier=None):
     """
-    Copies individual files to the output map and if the file is an email it calls the method extract_msg.
+    Copies individual files to the output map, files of a zip file are written straight from the zip file
 
     Parameters
     ----------
-    files: str
-        The files found in the origin(process) directory
+    files: list
+        The files to copy, found in the origin(process) directory
     process_dir: str
         The directory of the selected folder
     out_dir: str 
         The output directory where converted files will be placed
-    progress: Progressbar
-        The progress bar for this method
-    style: Style
-        The style of the progress bar
-    
+    file_log: LogTable
+        The logging table to append to
+    source: FolderSource or ZipSource
+        The files of the selected folder, see _functions.sources. Default is None for a folder on disk
+    inventory: Inventory
+        The files in the output directory, the copies are added to it, see _functions.inventory. Default is None
+    copier: CopyEngine
+        Copies the files on its threads, see _functions.copy_engine. Default is None to copy the files one at a time
+
     Returns
     -------
-    msg_list: list
-        List with all the emails and respective attachments
-    file_log: list 
-        The logging table
+    copied: list
+        The paths of the copies in the output directory
     """
-    msg_list = []
-    file_list_msg = []
-    file_log = []
-    len_files = len(files)
-
+    if copier is None:
+        copier = ce.CopyEngine(workers=1)
+    pairs = []
     for file in files:
         file_out = file.replace(process_dir, out_dir)
         logging.info(f'file_out: {file_out}')
-        root_dir = os.path.dirname(file_out)
-        try:
-            Path(root_dir).mkdir(parents=True,
-                                 exist_ok=True)  # Create output dir
-            logging.debug(f'Creating output directory: {root_dir}')
-        except:
-            logging.error(f'Failed to create output directory: {root_dir}')
-
         # add file to log
-        try:
-            file_log = log.log_to_table(
-                log_table=file_log,
-                filename=file_out,
-                file=file_out,
-                sourcefile=file,
-                attachment=False,  # may be updated in later step to True
-                attachment_name="N/A",  # may be updated in later step to True
-                review=False,  # may be updated in later step to True
-                pdf_parsed=False,  # may be updated in later step to True
-                combined=False,  # may be updated in later step to True
-                duplicated=False,  # may be updated in later step to True
-            )
-            logging.debug(f'Updating log table for file: {file}')
-        except:
-            logging.error(f'Failed to update log table for file: {file}')
+        add_to_log(file_log, file, file_out)
+        pairs.append((file, file_out))
+
+    done = copier.copy_many(pairs, source.extract if source is not None and source.virtual else ce.copy_file)
+    copied = []
+    for file, file_out in pairs:
+        if not done[file]:
+            continue
+        logging.debug(f'Copying file to output directory: {file}')
+        if inventory is not None:
+            inventory.add(file_out, source.size(file) if source is not None else None)
+        copied.append(file_out)
+    return copied
+
+
+def get_email(file, process_dir, out_dir, file_log, source=None, inventory=None, backend=msg.DEFAULT_BACKEND):
+    """
+    Extracts an email and its attachments to a directory in the output map, extracted zip attachments are unzipped
 
-        # in case of emails extract email and attachments
-        if file.endswith(".msg"):
-            msg_list.append(file)
-            main_email = file
-            out_email = os.path.splitext(file_out)[0]
+    Parameters
+    ----------
+    file: str
+        The path to the email in the origin(process) directory
+    process_dir: str
+        The directory of the selected folder
+    out_dir: str 
+        The output directory where converted files will be placed
+    file_log: LogTable
+        The logging table to append to
+    source: FolderSource or ZipSource
+        The files of the selected folder, see _functions.sources. An email in a zip file is written to the output
+        map for Outlook and removed after extracting. Default is None for a folder on disk
+    inventory: Inventory
+        The files in the output directory, the parts are added to it, see _functions.inventory. Default is None
+    backend: str
+        How MSG files are read, see _functions.extract_msg.BACKENDS. Default is Outlook when it can be used
 
-            # Extract attachment using win32com
-            attachment = msg.extract_msg(file=file, root_dir=root_dir, main_email=main_email,
+    Returns
+    -------
+    out_email: str
+        The directory with the email body and attachments
+    parts: list
+        The files in out_email
+    """
+    file_out = file.replace(process_dir, out_dir)
+    logging.info(f'file_out: {file_out}')
+    root_dir = os.path.dirname(file_out)
+    try:
+        Path(root_dir).mkdir(parents=True,
+                             exist_ok=True)  # Create output dir
+        logging.debug(f'Creating output directory: {root_dir}')
+    except:
+        logging.error(f'Failed to create output directory: {root_dir}')
+
+    # add file to log
+    add_to_log(file_log, file, file_out)
+
+    main_email = file
+    out_email = os.path.splitext(file_out)[0]
+
+    msg_file = file
+    if source is not None and source.virtual:
+        msg_file = file_out
+        source.extract(file, msg_file)
+
+    # Extract attachments, with Outlook or _functions.msg_file for MSG files
+    try:
+        if file.lower().endswith('.eml'):
+            attachment = eml.extract_eml(file=msg_file, root_dir=root_dir, main_email=main_email,
                                          file_log=file_log, process_dir=process_dir, out_dir=out_dir)
-            file_list_msg.append(attachment)
-            # unzip extracted zip attachments
-            for root, dirs, files in os.walk(out_email):
-                for name in files:
-                    name_lower = name.lower()
-                    if name_lower.endswith('.zip'):
-                        logging.info('zip attachment')
-                        zip_dir = os.path.join(root, name)
-                        attch_process_dir = os.path.abspath(
-                            os.path.splitext(zip_dir)[0])
-                        uz.unzip_files(zip_dir=zip_dir,
-                                       proc_dir=attch_process_dir)
-
-                        try:
-                            os.remove(zip_dir)
-                            logging.debug(f'Removed zip: {zip_dir}')
-                        except:
-                            logging.debug(f'Failed to remove zip: {zip_dir}')
-
-                        for root, dirs, files in os.walk(attch_process_dir):
-                            for name in files:
-                                attachment_name = attachment + '/' + name
-                                filename = os.path.join(root, name)
-                                try:
-                                    file_log = log.log_to_table(
-                                        log_table=file_log,
-                                        filename=filename,
-                                        file=filename,
-                                        sourcefile=main_email,
-                                        attachment=True,
-                                        attachment_name=attachment_name,
-                                        review=True,
-                                        pdf_parsed=False,  # may be updated in later step to True
-                                        combined=True,
-                                        duplicated=False,  # may be updated in later step to True
-                                    )
-                                    logging.debug(
-                                        f'Updating log table for file: {file}')
-                                except:
-                                    logging.error(
-                                        f'Failed to update log table for file: {file}')
-
         else:
+            attachment = msg.extract_msg(file=msg_file, root_dir=root_dir, main_email=main_email,
+                                         file_log=file_log, process_dir=process_dir, out_dir=out_dir, backend=backend)
+    finally:
+        if msg_file != file:
             try:
-                cmd = 'copy "%s" "%s"' % (file, root_dir)
-                subprocess.call(cmd, shell=True, stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-                logging.debug(f'Copying file to output directory: {file}')
+                os.remove(msg_file)
+                logging.debug(f'Removing email from zip file: {msg_file}')
+            except:
+                logging.error(f'Failed to remove email from zip file: {msg_file}')
+    # unzip extracted zip attachments
+    if inventory is None:
+        inventory = inv.Inventory(out_email, scan=False)
+    found = inventory.scan(out_email)
+    for zip_dir in [path for path in found if path.lower().endswith('.zip')]:
+        logging.info('zip attachment')
+        attch_process_dir = os.path.abspath(
+            os.path.splitext(zip_dir)[0])
+        uz.unzip_files(zip_dir=zip_dir,
+                       proc_dir=attch_process_dir)
+
+        try:
+            os.remove(zip_dir)
+            inventory.remove(zip_dir)
+            logging.debug(f'Removed zip: {zip_dir}')
+        except:
+            logging.debug(f'Failed to remove zip: {zip_dir}')
+
+        for filename in inventory.scan(attch_process_dir):
+            attachment_name = attachment + '/' + os.path.basename(filename)
+            found.append(filename)
+            try:
+                file_log.add(
+                    filename=filename,
+                    file=filename,
+                    sourcefile=main_email,
+                    attachment=True,
+                    attachment_name=attachment_name,
+                    review=True,
+                    pdf_parsed=False,  # may be updated in later step to True
+                    combined=True,
+                    duplicated=False,  # may be updated in later step to True
+                )
+                logging.debug(
+                    f'Updating log table for file: {file}')
             except:
                 logging.error(
-                    f'Failed to copy file to output directory: {file}')
-
-        # set progress bar max value
-        progress['value'] += 99 / len_files if len_files > 0 else 99
-        progress.update()
-        progress.update_idletasks()
-        style.configure(
-            'text.Horizontal.TProgressbar',
-            text='{:.0f} %'.format(progress['value'])
+                    f'Failed to update log table for file: {file}')
+
+    # clean up extracted msg files (delete original) and list the parts of the email
+    parts = []
+    for path in found:
+        if not inventory.exists(path):
+            continue
+        if path.lower().endswith(('.msg', '.eml')):
+            try:
+                os.remove(path)
+                inventory.remove(path)
+                logging.debug(f'Removing original email: {path}')
+            except:
+                logging.error(f'Failed to remove original email: {path}')
+        else:
+            parts.append(path)
+    return out_email, parts
+
+
+def add_to_log(file_log, file, file_out):
+    """
+    Adds a file of the origin(process) directory to the log table
+
+    Parameters
+    ----------
+    file_log: LogTable
+        The logging table to append to
+    file: str
+        The path to the file in the origin(process) directory
+    file_out: str
+        The path to the file in the output directory
+    """
+    try:
+        file_log.add(
+            filename=file_out,
+            file=file_out,
+            sourcefile=file,
+            attachment=False,  # may be updated in later step to True
+            attachment_name="N/A",  # may be updated in later step to True
+            review=False,  # may be updated in later step to True
+            pdf_parsed=False,  # may be updated in later step to True
+            combined=False,  # may be updated in later step to True
+            duplicated=False,  # may be updated in later step to True
         )
+        logging.debug(f'Updating log table for file: {file}')
+    except:
+        logging.error(f'Failed to update log table for file: {file}')
 
+
+def close_outlook():
+    """
+    Closes Outlook after the emails are extracted
+    """
     subprocess.call(["taskkill", "/f", "/im", "outlook.exe"], stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE, stdin=subprocess.PIPE, shell=True)
-
-    # clean up extracted msg files (delete original)
-    outlook_toremove = []
-    for path in Path(out_dir).rglob('*.msg'):
-        outlook_toremove.append(path)
-    for msg_remove in outlook_toremove:
-        try:
-            os.remove(msg_remove)
-            logging.debug(f'Removing original email: {msg_remove}')
-        except:
-            logging.error(f'Failed to remove original email: {msg_remove}')
-
-    return msg_list, file_log
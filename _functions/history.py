@@ -0,0 +1,153 @@
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import _functions.duplicates as dup
+
+"""
+This file is a python file that remembers every file delivered in earlier runs, so content that was already delivered
+in an earlier batch (e.g. an overlapping export of last week) can be flagged or skipped. This file is called from the
+file _functions.pipeline.
+
+The history is a sqlite database with the size, the hashes and the batch and path of every delivered file. Like in
+_functions.duplicates a file is only read when a file of an earlier batch has the same size, so the history stays fast
+with millions of files.
+
+Every run is a batch with an id of its own, given by the user or made of the selected folder and the time the batch
+started. A run on a folder whose last batch was stopped before the end continues that batch, so the files it delivered
+are not seen as delivered in an earlier batch. The same folder exported again later is a new batch.
+
+Author: Joana Cardoso
+"""
+
+DEFAULT_HISTORY = os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'),
+                               'PDF_conversion_tool', 'history.sqlite')
+
+
+class History:
+    """
+    The files delivered in earlier batches, saved on disk. Can be used from several threads at the same time.
+    """
+
+    def __init__(self, path=None, batch=None, source=None, resume=True):
+        """
+        Parameters
+        ----------
+        path: str
+            The path to the history database, default is DEFAULT_HISTORY
+        batch: str
+            The id of the current batch, files of this batch are not seen as delivered before. Default is None to
+            continue the unfinished batch of source or else start a new batch, see new_batch
+        source: str
+            The path to the selected folder, used for the id of a new batch. Default is None
+        resume: bool
+            Keep the files of the current batch saved in a previous run, if False they are removed. Default is True
+        """
+        self.path = path or DEFAULT_HISTORY
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS delivered (size INTEGER, partial TEXT, full TEXT, batch TEXT, path TEXT)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS delivered_size ON delivered (size)')
+        self.connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS delivered_path ON delivered (batch, path)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS batches (batch TEXT PRIMARY KEY, source TEXT, started TEXT, finished INTEGER)')
+        if batch is None:
+            row = self.connection.execute(
+                'SELECT batch FROM batches WHERE source = ? AND NOT finished ORDER BY started DESC LIMIT 1',
+                (source,)).fetchone()
+            batch = row[0] if row else self.new_batch(source)
+        self.batch = batch
+        logging.info(f'History batch: {batch}')
+        self.connection.execute('INSERT OR IGNORE INTO batches VALUES (?, ?, ?, 0)',
+                                (batch, source, datetime.datetime.now().isoformat(' ', 'seconds')))
+        if not resume:
+            self.connection.execute('DELETE FROM delivered WHERE batch = ?', (batch,))
+        self.connection.commit()
+
+    def new_batch(self, source):
+        """
+        Returns the id of a new batch: the path to the selected folder and the time it started
+        """
+        batch = started = f'{source} {datetime.datetime.now().isoformat(" ", "seconds")}'
+        number = 1
+        while self.connection.execute('SELECT 1 FROM batches WHERE batch = ?', (batch,)).fetchone():
+            number += 1
+            batch = f'{started} ({number})'
+        return batch
+
+    def delivered(self, entry):
+        """
+        Checks whether a file with the same content was delivered in an earlier batch
+
+        Parameters
+        ----------
+        entry: Entry
+            The file, see _functions.duplicates
+
+        Returns
+        -------
+        delivered: tuple
+            (batch, path) of the file delivered before, None if the content was not delivered before
+        """
+        with self.lock:
+            seen = self.connection.execute('SELECT 1 FROM delivered WHERE size = ? AND batch != ? LIMIT 1',
+                                           (entry.size, self.batch)).fetchone()
+        if seen is None:
+            return None
+        try:
+            partial, full = entry.partial_hash(), entry.full_hash()
+        except:
+            logging.error(f'Failed to read file for history: {entry.file}')
+            return None
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT full, batch, path FROM delivered WHERE size = ? AND batch != ? AND '
+                '(full = ? OR (full IS NULL AND partial = ?))', (entry.size, self.batch, full, partial)).fetchall()
+        for other_full, batch, path in rows:
+            if other_full == full:
+                return batch, path
+        for other_full, batch, path in rows:
+            # only the first and last part of the delivered file are known, compare with the file if it is still there
+            try:
+                if dup.full_hash(path) == full:
+                    return batch, path
+            except:
+                logging.info(f'Same size and partial hash as {path} of batch {batch}, but not checked: {entry.file}')
+        return None
+
+    def add(self, entries):
+        """
+        Saves delivered files in the history
+
+        Parameters
+        ----------
+        entries: list
+            The delivered files, see _functions.duplicates
+        """
+        rows = []
+        for entry in entries:
+            try:
+                if entry.full is None:
+                    entry.partial_hash()
+            except:
+                logging.error(f'Failed to read file for history: {entry.file}')
+                continue
+            rows.append((entry.size, entry.partial, entry.full, self.batch, entry.file))
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO delivered VALUES (?, ?, ?, ?, ?)', rows)
+
+    def finish(self):
+        """
+        Marks the current batch as finished, a next run on the same folder starts a new batch
+        """
+        with self.lock, self.connection:
+            self.connection.execute('UPDATE batches SET finished = 1 WHERE batch = ?', (self.batch,))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
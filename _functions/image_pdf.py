@@ -0,0 +1,162 @@
+import logging
+import os
+import zlib
+import pikepdf
+from PIL import Image, ImageSequence
+
+"""
+This file is a python file that writes images to pdf without LibreOffice. This file is called from the file
+_functions.print.
+
+Every image gets an A4 page of its own (landscape for wide images), at the size its resolution gives it and smaller
+when it does not fit. JPEG images are put in the pdf as they are, without decoding them, other images are put in the
+pdf pixel by pixel (compressed, so without loss). Every page of a TIFF file becomes a page of the pdf, a GIF file gets
+its first frame like in LibreOffice. Images that cannot be put in the pdf this way (e.g. 16 bit or mirrored photos) are
+printed by LibreOffice.
+
+Author: Joana Cardoso
+"""
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.tiff', '.jfif')
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 28
+# the resolution of images that do not have one, a lower resolution (e.g. 1 for a TIFF file without unit) is ignored
+DEFAULT_DPI = 96
+MIN_DPI = 10
+COLOR_SPACES = {'1': pikepdf.Name.DeviceGray, 'L': pikepdf.Name.DeviceGray, 'RGB': pikepdf.Name.DeviceRGB,
+                'CMYK': pikepdf.Name.DeviceCMYK}
+# the page rotation for the EXIF orientation of a photo
+ROTATIONS = {1: 0, 3: 180, 6: 90, 8: 270}
+
+
+def _dpi(image):
+    try:
+        x, y = (float(value) for value in image.info['dpi'])
+        if x >= MIN_DPI and y >= MIN_DPI:
+            return x, y
+    except:
+        pass
+    return DEFAULT_DPI, DEFAULT_DPI
+
+
+def _image_stream(pdf, image, data=None):
+    """
+    Returns the image as pdf stream, data is the JPEG file when it is put in the pdf as it is
+    """
+    if data is not None:
+        stream = pdf.make_stream(data)
+        stream.Filter = pikepdf.Name.DCTDecode
+        if image.mode == 'CMYK' and 'adobe' in image.info:
+            # Adobe CMYK JPEG images are stored inverted
+            stream.Decode = [1, 0] * 4
+    else:
+        stream = pdf.make_stream(zlib.compress(image.tobytes()))
+        stream.Filter = pikepdf.Name.FlateDecode
+    stream.Type = pikepdf.Name.XObject
+    stream.Subtype = pikepdf.Name.Image
+    stream.Width = image.width
+    stream.Height = image.height
+    stream.ColorSpace = COLOR_SPACES[image.mode]
+    stream.BitsPerComponent = 1 if image.mode == '1' else 8
+    return stream
+
+
+def _lossless(image):
+    """
+    Returns the image in a mode that can be put in a pdf and its transparency (None if it has none), without changing
+    any pixel. Raises ValueError for other modes
+    """
+    if image.mode == 'P':
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    elif image.mode == 'PA':
+        image = image.convert('RGBA')
+    if image.mode in ('LA', 'RGBA'):
+        return image.convert(image.mode[:-1]), image.getchannel('A')
+    if image.mode not in COLOR_SPACES:
+        raise ValueError(f'Image mode {image.mode} is not supported')
+    return image, None
+
+
+def _add_page(pdf, stream, size, dpi, rotation=0):
+    """
+    Adds a page with an image of size pixels, drawn at its resolution and centered on the page
+    """
+    width, height = size[0] * 72 / dpi[0], size[1] * 72 / dpi[1]
+    if rotation in (90, 270):
+        width, height = height, width
+    page_width, page_height = (PAGE_HEIGHT, PAGE_WIDTH) if width > height else (PAGE_WIDTH, PAGE_HEIGHT)
+    scale = min(1, (page_width - 2 * MARGIN) / width, (page_height - 2 * MARGIN) / height)
+    width, height = width * scale, height * scale
+    # the page is rotated after the image is drawn, so the image is drawn in the unrotated page
+    if rotation in (90, 270):
+        width, height, page_width, page_height = height, width, page_height, page_width
+    x, y = (page_width - width) / 2, (page_height - height) / 2
+    content = b'q %.2f 0 0 %.2f %.2f %.2f cm /Im0 Do Q' % (width, height, x, y)
+    page = pikepdf.Dictionary(
+        Type=pikepdf.Name.Page,
+        MediaBox=[0, 0, page_width, page_height],
+        Resources=pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=stream)),
+        Contents=pdf.make_stream(content),
+    )
+    if rotation:
+        page.Rotate = rotation
+    pdf.pages.append(pikepdf.Page(page))
+
+
+def write_image(pdf, image, file):
+    """
+    Adds a page for every frame of an image (the first frame of an animated GIF) to a pdf
+
+    Parameters
+    ----------
+    pdf: Pdf
+        The pdf opened with pikepdf
+    image: Image
+        The image opened with Pillow
+    file: str
+        The path to the image
+    """
+    if image.format == 'JPEG':
+        rotation = ROTATIONS[image.getexif().get(0x0112, 1)]
+        if image.mode not in COLOR_SPACES:
+            raise ValueError(f'Image mode {image.mode} is not supported')
+        with open(file, 'rb') as f:
+            data = f.read()
+        _add_page(pdf, _image_stream(pdf, image, data), image.size, _dpi(image), rotation)
+        return
+    frames = ImageSequence.Iterator(image) if image.format == 'TIFF' else [image]
+    for frame in frames:
+        dpi = _dpi(frame)
+        pixels, alpha = _lossless(frame)
+        stream = _image_stream(pdf, pixels)
+        if alpha is not None:
+            stream.SMask = _image_stream(pdf, alpha)
+        _add_page(pdf, stream, pixels.size, dpi)
+
+
+def image_to_pdf(file):
+    """
+    Writes an image to a pdf with the same name
+
+    Parameters
+    ----------
+    file: str
+        The path to the image
+
+    Returns
+    -------
+    converted: bool
+        Whether the pdf was written
+    """
+    out_pdf = os.path.splitext(file)[0] + '.pdf'
+    try:
+        with Image.open(file) as image:
+            pdf = pikepdf.new()
+            write_image(pdf, image, file)
+        pdf.save(out_pdf, deterministic_id=True)
+        logging.debug(f'Writing image to PDF: {file}')
+        return True
+    except:
+        logging.info(f'Image is printed by LibreOffice: {file}')
+        return False
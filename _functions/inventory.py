@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+
+"""
+This file is a python file that keeps a list of the files in the output directory, so the steps of the pipeline do not
+have to walk the disk again and again. This file is called from the files _functions.pipeline, _functions.get_files,
+_functions.print, _functions.duplicates and _functions.combine.
+
+The inventory is filled with os.scandir (which gets the size of a file with the directory listing on Windows) and every
+step that adds, moves or removes a file updates it.
+
+Author: Joana Cardoso
+"""
+
+
+def walk(directory, sizes=None):
+    """
+    Yields (root, dirs, files) for every directory like os.walk, with one os.scandir per directory. Directories and
+    files are sorted by name, so every run goes through a folder in the same order (os.scandir has no fixed order)
+
+    Parameters
+    ----------
+    directory: str
+        The directory to walk through
+    sizes: dict
+        If given, the size of every file is saved in it by path. Default is None
+    """
+    stack = [directory]
+    while stack:
+        root = stack.pop()
+        dirs = []
+        files = []
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+                        if sizes is not None:
+                            sizes[entry.path] = entry.stat().st_size
+        except OSError:
+            logging.error(f'Failed to read directory: {root}')
+            continue
+        dirs.sort()
+        files.sort()
+        yield root, dirs, files
+        stack.extend(os.path.join(root, name) for name in reversed(dirs))
+
+
+class Inventory:
+    """
+    The files and directories in the output directory with their sizes. Can be used from several threads at the same
+    time. Paths are normalised, so paths with / and \\ find the same file.
+    """
+
+    def __init__(self, root, scan=True):
+        """
+        Parameters
+        ----------
+        root: str
+            The output directory
+        scan: bool
+            Add the files already in the output directory (e.g. of a previous run). Default is True
+        """
+        self.root = os.path.normpath(root)
+        self.lock = threading.Lock()
+        # directory: files in it, directory: directories in it
+        self.files = {}
+        self.subdirs = {}
+        self.sizes = {}
+        if scan and os.path.isdir(self.root):
+            self.scan(self.root)
+
+    def _add_dir(self, directory):
+        while directory not in self.files:
+            self.files.setdefault(directory, set())
+            self.subdirs.setdefault(directory, set())
+            parent = os.path.dirname(directory)
+            if directory == self.root or parent == directory:
+                break
+            self.subdirs.setdefault(parent, set()).add(directory)
+            directory = parent
+
+    def scan(self, directory):
+        """
+        Adds the files in a directory and its subdirectories from disk
+
+        Parameters
+        ----------
+        directory: str
+            The directory to scan
+
+        Returns
+        -------
+        files: list
+            The files found
+        """
+        sizes = {}
+        found = []
+        dirs = []
+        for root, names, files in walk(os.path.normpath(directory), sizes):
+            dirs.append(root)
+            found.extend(os.path.join(root, name) for name in files)
+        with self.lock:
+            for root in dirs:
+                self._add_dir(root)
+            for path in found:
+                self.files[os.path.dirname(path)].add(path)
+            self.sizes.update(sizes)
+        return found
+
+    def add(self, path, size=None):
+        """
+        Adds a new or changed file
+
+        Parameters
+        ----------
+        path: str
+            The path to the file
+        size: int
+            The size of the file, default is None to get it from disk
+        """
+        path = os.path.normpath(path)
+        if size is None:
+            size = os.path.getsize(path)
+        with self.lock:
+            self._add_dir(os.path.dirname(path))
+            self.files[os.path.dirname(path)].add(path)
+            self.sizes[path] = size
+
+    def remove(self, path):
+        """
+        Removes a file that is removed or moved out of the output directory
+        """
+        path = os.path.normpath(path)
+        with self.lock:
+            self.files.get(os.path.dirname(path), set()).discard(path)
+            self.sizes.pop(path, None)
+
+    def exists(self, path):
+        return os.path.normpath(path) in self.sizes
+
+    def size(self, path):
+        """
+        Returns the size of a file, raises KeyError when the file is not in the inventory
+        """
+        return self.sizes[os.path.normpath(path)]
+
+    def files_under(self, directory):
+        """
+        Returns the files in a directory and its subdirectories, sorted
+        """
+        found = []
+        with self.lock:
+            stack = [os.path.normpath(directory)]
+            while stack:
+                root = stack.pop()
+                found.extend(self.files.get(root, ()))
+                stack.extend(self.subdirs.get(root, ()))
+        return sorted(found)
+
+    def all_files(self):
+        with self.lock:
+            return list(self.sizes)
+
+    def remove_empty_dirs(self):
+        """
+        Deletes the directories without files, also when they only have empty directories in them
+        """
+        with self.lock:
+            for directory in sorted(self.files, key=len, reverse=True):
+                if self.files[directory] or self.subdirs[directory]:
+                    continue
+                try:
+                    os.rmdir(directory)
+                    logging.debug(f'Removing {directory}')
+                except OSError:
+                    logging.error(f'Failed to remove {directory}')
+                    continue
+                del self.files[directory]
+                del self.subdirs[directory]
+                parent = os.path.dirname(directory)
+                if parent in self.subdirs:
+                    self.subdirs[parent].discard(directory)
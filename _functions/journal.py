@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+
+"""
+This file is a python file that writes the log table to disk while the run is going, so the log table does not have to
+be kept in memory and is not lost when the run crashes. This file is called from the file _functions.pipeline.
+
+The journal is a json lines file: one record of the log table per line, written as soon as a file is finished. The
+results files are made from the journal at the end of the run, see _functions.report.
+
+Author: Joana Cardoso
+"""
+
+
+class Journal:
+    """
+    The log table of one run, written to a json lines file
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path: str
+            The path to the journal, an existing journal is replaced
+        """
+        self.path = path
+        self.count = 0
+        self.file = open(path, 'w', encoding='utf-8')
+        logging.info(f'Journal: {path}')
+
+    def write(self, records):
+        """
+        Adds records to the journal, they are on disk when this returns (also after a crash of the computer)
+
+        Parameters
+        ----------
+        records: list
+            Records of the log table, see _functions.log_table
+        """
+        for record in records:
+            self.file.write(json.dumps(dict(record)) + '\n')
+            self.count += 1
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def records(self):
+        """
+        Yields the records in the journal as dictionaries, one at a time
+        """
+        if not self.file.closed:
+            self.file.flush()
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
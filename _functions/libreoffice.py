@@ -0,0 +1,346 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+"""
+This file is a python file that converts files to pdf with LibreOffice. This file is called from the file _functions.print.
+
+Two converters are available, both with the method convert(file) that returns True if the pdf was made and the method
+convert_batch(files) that does the same for several files of one directory. The attribute settings describes how the
+pdf is made, see _functions.cache:
+- SofficeConverter starts soffice for every file
+- LibreOfficePool keeps headless LibreOffice instances running and sends them the files through a pipe, see
+  _functions.libreoffice_worker. With fake=True the workers write a one page pdf without LibreOffice.
+
+Author: Joana Cardoso
+"""
+
+OFFICE_DIR = r'C:\Program Files\LibreOffice\program'
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libreoffice_worker.py')
+
+
+def soffice_path():
+    """
+    Returns the path to soffice, the Windows installation directory is tried first
+    """
+    app = os.path.join(OFFICE_DIR, 'soffice.exe')
+    if os.path.isfile(app):
+        return app
+    return shutil.which('soffice') or shutil.which('libreoffice') or app
+
+
+def office_python():
+    """
+    Returns the python that comes with LibreOffice (it provides the uno module), or the current python if it has uno
+    """
+    for name in ('python.exe', 'python'):
+        app = os.path.join(os.path.dirname(soffice_path()), name)
+        if os.path.isfile(app):
+            return app
+    return sys.executable
+
+
+def out_pdf(file):
+    """
+    Returns the path of the pdf that is made of file
+    """
+    return os.path.splitext(file)[0] + '.pdf'
+
+
+class SofficeConverter:
+    """
+    Converts files to pdf by starting soffice for every file. Several files can be converted at the same time from
+    different threads, every running soffice gets its own user profile so they do not lock each other out.
+    """
+
+    def __init__(self, app_path=None, size=1, profile_dir=None):
+        """
+        Parameters
+        ----------
+        app_path: str
+            The path to soffice, default is found with soffice_path()
+        size: int
+            The number of files that can be converted at the same time. Default is 1
+        profile_dir: str
+            The directory for the user profiles, default is a new temporary directory
+        """
+        self.app_path = app_path or soffice_path()
+        self.settings = 'libreoffice writer_pdf_Export'
+        self.own_profile_dir = profile_dir is None
+        self.profile_dir = profile_dir or tempfile.mkdtemp(prefix='pdf_conversion_profiles_')
+        self.profiles = queue.Queue()
+        for number in range(max(1, size)):
+            self.profiles.put(os.path.abspath(os.path.join(self.profile_dir, f'soffice_{number}')))
+
+    def convert(self, file):
+        """
+        Converts a file to a pdf in the same directory
+
+        Parameters
+        ----------
+        file: str
+            The path to the file
+
+        Returns
+        -------
+        converted: bool
+            True if the pdf was made
+        """
+        profile = self.profiles.get()
+        try:
+            commandLine = [os.path.basename(self.app_path), "--headless", "--convert-to",
+                           "pdf", "--outdir", os.path.dirname(file), file,
+                           "-env:UserInstallation=" + Path(profile).as_uri()]
+            try:
+                subprocess.run(commandLine, executable=self.app_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               stdin=subprocess.PIPE)
+            except:
+                logging.error(f'Failed to start soffice for file: {file}')
+                return False
+        finally:
+            self.profiles.put(profile)
+        return os.path.isfile(out_pdf(file))
+
+    def convert_batch(self, files):
+        """
+        Converts several files of one directory to pdf with one start of soffice
+
+        Parameters
+        ----------
+        files: list
+            The paths to the files, all in the same directory and with different names
+
+        Returns
+        -------
+        converted: dict
+            For every file True if the pdf was made
+        """
+        profile = self.profiles.get()
+        try:
+            commandLine = [os.path.basename(self.app_path), "--headless", "--convert-to",
+                           "pdf", "--outdir", os.path.dirname(files[0])] + files + [
+                "-env:UserInstallation=" + Path(profile).as_uri()]
+            try:
+                subprocess.run(commandLine, executable=self.app_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               stdin=subprocess.PIPE)
+            except:
+                logging.error(f'Failed to start soffice for batch: {files}')
+        finally:
+            self.profiles.put(profile)
+        return {file: os.path.isfile(out_pdf(file)) for file in files}
+
+    def close(self):
+        """
+        Removes the user profiles
+        """
+        if self.own_profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class _Worker:
+    """
+    One worker process of the pool with its own LibreOffice instance and user profile
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.process = None
+        self.answers = None
+
+    def start(self, timeout):
+        """
+        Starts the worker and waits until it answers a ping, raises IOError if it does not
+        """
+        logging.info(f'Starting LibreOffice worker: {self.command}')
+        # on Linux and macOS the worker gets a process group of its own, so it can be killed with its soffice
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, universal_newlines=True, bufsize=1,
+                                        start_new_session=os.name != 'nt')
+        self.answers = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process, self.answers), daemon=True).start()
+        try:
+            self.process.stdin.write(json.dumps({'ping': True}) + '\n')
+            self.process.stdin.flush()
+            line = self.answers.get(timeout=timeout)
+            answered = line is not None and json.loads(line).get('ping')
+        except (queue.Empty, OSError, ValueError):
+            answered = False
+        if not answered:
+            self.kill()
+            raise IOError('LibreOffice worker did not answer the ping')
+
+    @staticmethod
+    def _read(process, answers):
+        # the answers are read on a separate thread so a hanging office can be timed out
+        for line in process.stdout:
+            answers.put(line)
+        answers.put(None)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def convert(self, file, timeout):
+        self.process.stdin.write(json.dumps({'file': file, 'outdir': os.path.dirname(file)}) + '\n')
+        self.process.stdin.flush()
+        line = self.answers.get(timeout=timeout)
+        if line is None:
+            raise IOError('LibreOffice worker stopped')
+        answer = json.loads(line)
+        if not answer['ok']:
+            logging.error(f'LibreOffice failed to convert {file}: {answer["error"]}')
+        return answer['ok']
+
+    def kill(self):
+        """
+        Kills the worker and the soffice it started, which would otherwise keep running with the user profile
+        """
+        if self.process is None:
+            return
+        try:
+            if os.name == 'nt':
+                subprocess.run(['taskkill', '/F', '/T', '/PID', str(self.process.pid)], stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+            else:
+                os.killpg(self.process.pid, signal.SIGKILL)
+        except:
+            logging.error(f'Failed to kill the processes of LibreOffice worker: {self.process.pid}')
+        try:
+            self.process.kill()
+            self.process.wait(timeout=30)
+        except:
+            logging.error(f'Failed to kill LibreOffice worker: {self.process.pid}')
+        self.process = None
+
+    def stop(self):
+        if self.alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=30)
+            except:
+                self.kill()
+        self.process = None
+
+
+class LibreOfficePool:
+    """
+    Keeps headless LibreOffice instances running and converts files with them. Instances are started when they are
+    first needed and started again when they die or hang.
+    """
+
+    def __init__(self, size=1, app_path=None, python=None, profile_dir=None, timeout=300, fake=False):
+        """
+        Parameters
+        ----------
+        size: int
+            The number of LibreOffice instances, every instance has its own user profile and converts one file at
+            a time. Default is 1
+        app_path: str
+            The path to soffice, default is found with soffice_path()
+        python: str
+            The python that runs the workers, default is found with office_python()
+        profile_dir: str
+            The directory for the user profiles of the instances, default is a new temporary directory
+        timeout: int
+            Seconds to wait for one conversion before the instance is restarted. Default is 300
+        fake: bool
+            Write a one page pdf instead of starting LibreOffice. Default is False
+        """
+        self.app_path = app_path or soffice_path()
+        self.python = python or office_python()
+        self.settings = 'fake' if fake else 'libreoffice writer_pdf_Export'
+        self.own_profile_dir = profile_dir is None
+        self.profile_dir = profile_dir or tempfile.mkdtemp(prefix='pdf_conversion_profiles_')
+        self.timeout = timeout
+        self.fallback = SofficeConverter(self.app_path, size=size, profile_dir=self.profile_dir)
+        self.broken = False
+        self.idle = queue.Queue()
+        for number in range(size):
+            if fake:
+                command = [sys.executable, WORKER, '--fake']
+            else:
+                command = [self.python, WORKER, self.app_path,
+                           os.path.join(self.profile_dir, f'worker_{number}')]
+            self.idle.put(_Worker(command))
+        self.workers = list(self.idle.queue)
+
+    def convert(self, file):
+        """
+        Converts a file to a pdf in the same directory. If the instance dies on the file it is restarted and the file
+        is tried once more, then soffice is started for this file. An instance that hangs is killed and started again
+        for the next file. If a worker cannot be started or does not answer a ping, soffice is used for all files.
+
+        Parameters
+        ----------
+        file: str
+            The path to the file
+
+        Returns
+        -------
+        converted: bool
+            True if the pdf was made
+        """
+        if self.broken:
+            return self.fallback.convert(file)
+        worker = self.idle.get()
+        try:
+            for attempt in range(2):
+                if not worker.alive():
+                    try:
+                        worker.start(self.timeout)
+                    except Exception as e:
+                        # LibreOffice cannot be used this way on this computer, not only for this file
+                        logging.error(f'LibreOffice worker cannot be started: {e}')
+                        self.broken = True
+                        break
+                try:
+                    return worker.convert(file, self.timeout) and os.path.isfile(out_pdf(file))
+                except queue.Empty:
+                    logging.error(f'LibreOffice worker timed out on file: {file}')
+                    worker.kill()
+                    return False
+                except Exception as e:
+                    logging.error(f'LibreOffice worker failed on file {file}: {e}')
+                    worker.stop()
+            logging.error(f'Falling back to soffice for file: {file}')
+            return self.fallback.convert(file)
+        finally:
+            self.idle.put(worker)
+
+    def convert_batch(self, files):
+        """
+        Converts several files to pdf, a running instance does not gain from batches so they are converted one by one
+
+        Parameters
+        ----------
+        files: list
+            The paths to the files
+
+        Returns
+        -------
+        converted: dict
+            For every file True if the pdf was made
+        """
+        return {file: self.convert(file) for file in files}
+
+    def close(self):
+        """
+        Stops the LibreOffice instances
+        """
+        for worker in self.workers:
+            worker.stop()
+        if self.own_profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
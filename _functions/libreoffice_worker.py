@@ -0,0 +1,171 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+"""
+This file is a python file that keeps one headless LibreOffice instance running and converts files to pdf on request.
+It is started by _functions.libreoffice.LibreOfficePool with the python of LibreOffice (which provides the uno module)
+and must not import other files of the tool.
+
+Requests are read from stdin and answers written to stdout, one json object per line:
+
+    {"file": "C:/out/1.docx", "outdir": "C:/out"}  ->  {"file": "C:/out/1.docx", "ok": true, "error": ""}
+
+The pool sends {"ping": true} after starting the worker, which is answered with {"ping": true, "ok": true} once the
+office has started.
+
+With --fake no LibreOffice is started and a one page pdf is written for every request, so the pool can be used
+without LibreOffice (e.g. in tests).
+
+Author: Joana Cardoso
+"""
+
+FAKE_PDF = (b'%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n'
+            b'2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n'
+            b'3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n'
+            b'trailer<</Root 1 0 R>>\n%%EOF\n')
+
+# export filter per document type, the first service the document supports is used
+EXPORT_FILTERS = [
+    ('com.sun.star.text.WebDocument', 'writer_web_pdf_Export'),
+    ('com.sun.star.text.GenericTextDocument', 'writer_pdf_Export'),
+    ('com.sun.star.sheet.SpreadsheetDocument', 'calc_pdf_Export'),
+    ('com.sun.star.presentation.PresentationDocument', 'impress_pdf_Export'),
+    ('com.sun.star.drawing.DrawingDocument', 'draw_pdf_Export'),
+]
+
+
+def out_pdf(file, outdir):
+    """
+    Returns the path of the pdf, the same name soffice --convert-to pdf gives it
+    """
+    return os.path.join(outdir, os.path.splitext(os.path.basename(file))[0] + '.pdf')
+
+
+class FakeOffice:
+    """
+    Stands in for LibreOffice, writes a one page pdf for every file
+    """
+
+    def start(self):
+        pass
+
+    def convert(self, file, outdir):
+        if not os.path.isfile(file):
+            raise IOError(f'File not found: {file}')
+        with open(out_pdf(file, outdir), 'wb') as f:
+            f.write(FAKE_PDF)
+
+    def stop(self):
+        pass
+
+
+class Office:
+    """
+    One headless LibreOffice instance, connected through a named pipe
+    """
+
+    def __init__(self, soffice, profile_dir, timeout=60):
+        import uno
+        self.uno = uno
+        self.soffice = soffice
+        self.profile_url = uno.systemPathToFileUrl(os.path.abspath(profile_dir))
+        self.pipe_name = f'pdf_conversion_{os.getpid()}'
+        self.timeout = timeout
+        self.process = None
+        self.desktop = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.soffice, '--headless', '--invisible', '--nologo', '--norestore', '--nodefault',
+             '--nolockcheck', f'--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext',
+             f'-env:UserInstallation={self.profile_url}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL)
+        local_context = self.uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context)
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                context = resolver.resolve(
+                    f'uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext')
+                break
+            except Exception:
+                if time.time() > deadline or self.process.poll() is not None:
+                    raise
+                time.sleep(0.25)
+        self.desktop = context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.frame.Desktop', context)
+
+    def property(self, name, value):
+        prop = self.uno.createUnoStruct('com.sun.star.beans.PropertyValue')
+        prop.Name = name
+        prop.Value = value
+        return prop
+
+    def convert(self, file, outdir):
+        doc = self.desktop.loadComponentFromURL(
+            self.uno.systemPathToFileUrl(os.path.abspath(file)), '_blank', 0,
+            (self.property('Hidden', True), self.property('ReadOnly', True)))
+        if doc is None:
+            raise IOError(f'LibreOffice cannot open: {file}')
+        try:
+            filter_name = next((name for service, name in EXPORT_FILTERS if doc.supportsService(service)),
+                               'writer_pdf_Export')
+            doc.storeToURL(self.uno.systemPathToFileUrl(os.path.abspath(out_pdf(file, outdir))),
+                           (self.property('FilterName', filter_name),))
+        finally:
+            doc.close(True)
+
+    def stop(self):
+        try:
+            self.desktop.terminate()
+        except Exception:
+            pass
+        try:
+            self.process.wait(timeout=self.timeout)
+        except Exception:
+            self.process.kill()
+
+
+def main(argv):
+    """
+    Starts the office and answers requests until stdin is closed
+
+    Parameters
+    ----------
+    argv: list
+        --fake or the path to soffice and the path to the user profile of this instance
+    """
+    if argv[0] == '--fake':
+        office = FakeOffice()
+    else:
+        office = Office(soffice=argv[0], profile_dir=argv[1])
+    office.start()
+    try:
+        for line in sys.stdin:
+            request = json.loads(line)
+            if request.get('ping'):
+                sys.stdout.write(json.dumps({'ping': True, 'ok': True}) + '\n')
+                sys.stdout.flush()
+                continue
+            answer = {'file': request['file'], 'ok': True, 'error': ''}
+            try:
+                office.convert(request['file'], request['outdir'])
+            except Exception as e:
+                answer['ok'] = False
+                answer['error'] = str(e)
+            sys.stdout.write(json.dumps(answer) + '\n')
+            sys.stdout.flush()
+            # a dead office cannot convert anymore, exit so the pool starts a new instance
+            if isinstance(office, Office) and office.process.poll() is not None:
+                return 1
+    finally:
+        office.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
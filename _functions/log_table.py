@@ -1,50 +1,177 @@
 import datetime
 import os
+import time
 
 """
 This file is a python file that makes a log table to follow processes and detect errors. This file is called from files _functions.extract_msg and _functions.get_files.
 
+The log table keeps its records in compact objects and finds them by the path in the output directory or by the path in
+the original folder without going through all records. A record can be used like the dictionaries of the results
+files, e.g. record['To PDF'] = True.
+
 Author: Joana Cardoso
 """
 
+FIELDS = ("File name", "File", "Original file", "Attachment", "Attachment name", "Check", "To PDF", "Combined",
+          "Duplicate", "User", "Date/Time")
+USER = os.environ.get('USERNAME')
+
 
-def log_to_table(log_table, filename, file, sourcefile, attachment, attachment_name, review, pdf_parsed,
-                 combined, duplicated):
+class Record:
     """
-    Write action of the conversion tool pipeline to logging table for quality and audit purposes
-
-    Parameters
-    ----------
-        log_table: list 
-            An existing or empty list of dictionaries to append to
-        filename: str
-            Filename of file being processed
-        file: str
-            Full source path of the file being processed, file can be equal to filename or refer to the source email if the file is an attachment
-        sourcefile: str
-            Full source path of the file in the original folder, is attachment path refers to the main email
-        attachment: bool
-            Flag for filtering purposes whether file is an email attachment
-        attachment_name: str 
-            If attachment=True, original filename of the attachment
-        review: bool 
-            Flag whether the file requires manual inspection
-        pdf_parsed: bool 
-            Flag whether the file is printed to pdf
-        combined: bool 
-            Flag whether the file is joined with the parent email as single PDF
-        duplicated: bool 
-            Flag whether the exact same file already exists in the data seen so far
+    One row of the log table
     """
-    log_table.append({"File name": filename,
-                      "File": file,
-                      "Original file": sourcefile,
-                      "Attachment": attachment,
-                      "Attachment name": attachment_name,
-                      "Check": review,
-                      "To PDF": pdf_parsed,
-                      "Combined": combined,
-                      "Duplicate": duplicated,
-                      "User": os.environ.get('USERNAME'),
-                      "Date/Time": str(datetime.datetime.now())})
-    return log_table
+    __slots__ = ('file_name', 'file', 'original_file', 'attachment', 'attachment_name', 'check', 'to_pdf', 'combined',
+                 'duplicate', 'user', 'date_time')
+
+    # field name: attribute
+    ATTRIBUTES = dict(zip(FIELDS, __slots__))
+
+    def __init__(self, filename, file, sourcefile, attachment, attachment_name, review, pdf_parsed, combined,
+                 duplicated, user=USER, date_time=None):
+        self.file_name = filename
+        # most files are logged with the same path twice, it is only kept once
+        self.file = None if file == filename else file
+        self.original_file = sourcefile
+        self.attachment = attachment
+        self.attachment_name = attachment_name
+        self.check = review
+        self.to_pdf = pdf_parsed
+        self.combined = combined
+        self.duplicate = duplicated
+        self.user = user
+        self.date_time = time.time() if date_time is None else date_time
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Makes a record from a dictionary with the FIELDS, e.g. read from a json log table
+        """
+        return cls(d["File name"], d["File"], d["Original file"], d["Attachment"], d["Attachment name"], d["Check"],
+                   d["To PDF"], d["Combined"], d["Duplicate"], d["User"],
+                   datetime.datetime.fromisoformat(d["Date/Time"]).timestamp())
+
+    def __getitem__(self, field):
+        if field == "File":
+            return self.file_name if self.file is None else self.file
+        if field == "Date/Time":
+            return str(datetime.datetime.fromtimestamp(self.date_time))
+        return getattr(self, self.ATTRIBUTES[field])
+
+    def __setitem__(self, field, value):
+        if field in ("File name", "File", "Original file"):
+            raise KeyError(f'{field} cannot be changed, it is used to find the record')
+        setattr(self, self.ATTRIBUTES[field], value)
+
+    def keys(self):
+        return FIELDS
+
+
+class LogTable:
+    """
+    The log table, a list of records that can be found by their path in the output directory (File name) and by the
+    path of their file in the original folder (Original file)
+    """
+
+    def __init__(self, records=()):
+        """
+        Parameters
+        ----------
+        records: list
+            Records or dictionaries to start with, see extend. Default is empty
+        """
+        self.records = []
+        self.by_name = {}
+        self.by_source = {}
+        self.extend(records)
+
+    def add(self, filename, file, sourcefile, attachment, attachment_name, review, pdf_parsed, combined, duplicated):
+        """
+        Write action of the conversion tool pipeline to logging table for quality and audit purposes
+
+        Parameters
+        ----------
+            filename: str
+                Filename of file being processed
+            file: str
+                Full source path of the file being processed, file can be equal to filename or refer to the source email if the file is an attachment
+            sourcefile: str
+                Full source path of the file in the original folder, is attachment path refers to the main email
+            attachment: bool
+                Flag for filtering purposes whether file is an email attachment
+            attachment_name: str
+                If attachment=True, original filename of the attachment
+            review: bool
+                Flag whether the file requires manual inspection
+            pdf_parsed: bool
+                Flag whether the file is printed to pdf
+            combined: bool
+                Flag whether the file is joined with the parent email as single PDF
+            duplicated: bool
+                Flag whether the exact same file already exists in the data seen so far
+
+        Returns
+        -------
+        record: Record
+            The new record
+        """
+        record = Record(filename, file, sourcefile, attachment, attachment_name, review, pdf_parsed, combined,
+                        duplicated)
+        self.append(record)
+        return record
+
+    def append(self, record):
+        """
+        Adds a record or a dictionary with the FIELDS
+        """
+        if not isinstance(record, Record):
+            record = Record.from_dict(record)
+        self.records.append(record)
+        # the first record of a path is the one that is updated, like with a search from the start
+        self.by_name.setdefault(record.file_name, record)
+        self.by_source.setdefault(record.original_file, []).append(record)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __getitem__(self, filename):
+        """
+        Returns the record of a file in the output directory, raises KeyError if the file is not in the log table
+        """
+        return self.by_name[filename]
+
+    def get(self, filename):
+        """
+        Returns the record of a file in the output directory, None if the file is not in the log table
+        """
+        return self.by_name.get(filename)
+
+    def email_file(self, directory):
+        """
+        Returns the path of the email (MSG or EML file) that was extracted to directory, the MSG path if neither is in
+        the log table
+        """
+        for extension in ('.msg', '.eml', '.MSG', '.EML'):
+            if directory + extension in self.by_name:
+                return directory + extension
+        return directory + '.msg'
+
+    def source(self, sourcefile):
+        """
+        Returns the records of a file in the original folder, an email has a record for every attachment
+        """
+        return self.by_source.get(sourcefile, [])
+
+    def dicts(self):
+        """
+        Yields the records as dictionaries, e.g. to write them to json
+        """
+        for record in self.records:
+            yield dict(record)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
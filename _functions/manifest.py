@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+"""
+This file is a python file that remembers which files of the selected folder are finished, so a run that crashed or was
+stopped can be started again without doing the finished work again. This file is called from the file _functions.pipeline.
+
+For every file of the selected folder the manifest keeps a fingerprint of its content, the last finished stage and its
+records of the log table. The manifest is a sqlite database and is updated every time a file finishes a stage. The
+manifest also keeps the output directory of the run, a run to another output directory starts with an empty manifest.
+
+Author: Joana Cardoso
+"""
+
+# the stages of a file, in order
+EXTRACTED = 'extracted'
+PRINTED = 'printed'
+DONE = 'done'
+FAILED = 'failed'
+
+CHUNK = 64 * 1024
+
+
+def fingerprint(file):
+    """
+    Returns a fingerprint of the content of a file: the size, the modification time and a hash of the first and last
+    64 KiB, so large files do not have to be read completely
+
+    Parameters
+    ----------
+    file: str
+        The path to the file
+    """
+    stat = os.stat(file)
+    md5 = hashlib.md5()
+    with open(file, 'rb') as f:
+        md5.update(f.read(CHUNK))
+        if stat.st_size > 2 * CHUNK:
+            f.seek(-CHUNK, os.SEEK_END)
+        md5.update(f.read(CHUNK))
+    return f'{stat.st_size}:{stat.st_mtime_ns}:{md5.hexdigest()}'
+
+
+class Manifest:
+    """
+    The stages of the files of one selected folder, saved on disk. Can be used from several threads at the same time.
+    """
+
+    def __init__(self, path, resume=True, out_dir=None):
+        """
+        Parameters
+        ----------
+        path: str
+            The path to the manifest database
+        resume: bool
+            Keep what is in the manifest from a previous run, if False the manifest is emptied. Default is True
+        out_dir: str
+            The output directory of the run, the manifest is emptied when the previous run had another one. Default is
+            None
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS files (source TEXT PRIMARY KEY, fingerprint TEXT, stage TEXT, records TEXT)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, source TEXT, hash TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)')
+        row = self.connection.execute("SELECT value FROM settings WHERE name = 'out_dir'").fetchone()
+        if resume and out_dir is not None and row is not None and row[0] != out_dir:
+            logging.info(f'Manifest {path} is of output directory {row[0]}, not resumed')
+            resume = False
+        if not resume:
+            self.connection.execute('DELETE FROM files')
+            self.connection.execute('DELETE FROM hashes')
+        if out_dir is not None:
+            self.connection.execute("INSERT OR REPLACE INTO settings VALUES ('out_dir', ?)", (out_dir,))
+        self.connection.commit()
+        self.previous = {source: (source_fingerprint, stage) for source, source_fingerprint, stage in
+                         self.connection.execute('SELECT source, fingerprint, stage FROM files')}
+        logging.info(f'Manifest {path} has {len(self.previous)} files of a previous run')
+
+    def stage(self, source, fingerprint):
+        """
+        Returns the stage a file finished in a previous run, None if the file is new, changed or failed since then
+
+        Parameters
+        ----------
+        source: str
+            The path to the file in the selected folder
+        fingerprint: str
+            The current fingerprint of the file
+        """
+        previous = self.previous.get(source)
+        if previous is None or previous[0] != fingerprint or previous[1] == FAILED:
+            return None
+        return previous[1]
+
+    def records(self, source):
+        """
+        Returns the records of the log table of a file saved in a previous run
+
+        Parameters
+        ----------
+        source: str
+            The path to the file in the selected folder
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT records FROM files WHERE source = ?', (source,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def hashes(self):
+        """
+        Returns the hashes of the files checked for duplicates in previous runs, only of files that did not fail
+        """
+        with self.lock:
+            return self.connection.execute(
+                'SELECT hashes.hash, hashes.path FROM hashes JOIN files ON files.source = hashes.source '
+                'WHERE files.stage != ?', (FAILED,)).fetchall()
+
+    def update(self, sources, stage, fingerprints, file_log, hashes=()):
+        """
+        Saves the stage of the files and their records of the log table
+
+        Parameters
+        ----------
+        sources: list
+            The paths to the files in the selected folder
+        stage: str
+            The stage the files finished
+        fingerprints: dict
+            The fingerprint per file
+        file_log: LogTable
+            The records of the log table of the files
+        hashes: list
+            (path, source, key) of the files that are checked for duplicates, see _functions.duplicates. Default is
+            empty
+        """
+        rows = [(source, fingerprints.get(source), stage,
+                 json.dumps([dict(record) for record in file_log.source(source)])) for source in sources]
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', rows)
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?)', hashes)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,405 @@
+import datetime
+import html
+import logging
+import re
+import struct
+import threading
+from html.parser import HTMLParser
+
+"""
+This file is a python file that reads outlook MSG files without Outlook. This file is called from the file
+_functions.extract_msg.
+
+A MSG file is a compound file (a small file system in one file: storages with streams in them). The properties of the
+email (sender, subject, body) and its attachments are streams, an attached email is a storage in the storage of its
+attachment and is read from the same file. The email gets the names Outlook uses (SenderName, Subject, Body,
+Attachments.Item(i).SaveAsFile(path), ...), so _functions.extract_msg can use either.
+
+Author: Joana Cardoso
+"""
+
+SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+# special sector numbers
+FREE_SECTOR = 0xFFFFFFFF
+END_OF_CHAIN = 0xFFFFFFFE
+NO_STREAM = 0xFFFFFFFF
+# directory entry types
+STORAGE = 1
+STREAM = 2
+ROOT = 5
+
+# property ids and types of MSG files
+PT_STRING8 = 0x001E
+PT_UNICODE = 0x001F
+PT_BINARY = 0x0102
+PT_OBJECT = 0x000D
+PT_SYSTIME = 0x0040
+PT_LONG = 0x0003
+PR_SUBJECT = 0x0037
+PR_CLIENT_SUBMIT_TIME = 0x0039
+PR_SENDER_NAME = 0x0C1A
+PR_DISPLAY_CC = 0x0E03
+PR_DISPLAY_TO = 0x0E04
+PR_BODY = 0x1000
+PR_HTML = 0x1013
+PR_DISPLAY_NAME = 0x3001
+PR_ATTACH_DATA = 0x3701
+PR_ATTACH_FILENAME = 0x3704
+PR_ATTACH_METHOD = 0x3705
+PR_ATTACH_LONG_FILENAME = 0x3707
+PR_INTERNET_CPID = 0x3FDE
+PR_MESSAGE_CODEPAGE = 0x3FFD
+ATTACH_EMBEDDED_MSG = 5
+
+
+class CompoundFile:
+    """
+    A compound file opened for reading. Streams are read sector by sector, so large streams are not read into memory
+    at once. Can be used from several threads at the same time.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path: str
+            The path to the compound file
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.lock = threading.Lock()
+        try:
+            self._read_header()
+        except:
+            self.file.close()
+            raise
+
+    def _read_header(self):
+        header = self.file.read(512)
+        if len(header) < 512 or header[:8] != SIGNATURE:
+            raise ValueError(f'Not a compound file: {self.path}')
+        self.sector_size = 1 << struct.unpack_from('<H', header, 0x1E)[0]
+        self.mini_sector_size = 1 << struct.unpack_from('<H', header, 0x20)[0]
+        first_dir, = struct.unpack_from('<I', header, 0x30)
+        self.mini_cutoff, first_mini_fat, mini_fat_count, first_difat, difat_count = \
+            struct.unpack_from('<IIIII', header, 0x38)
+
+        # the sectors of the FAT: 109 in the header, more in a chain of DIFAT sectors
+        fat_sectors = list(struct.unpack_from('<109I', header, 0x4C))
+        per_sector = self.sector_size // 4
+        sector = first_difat
+        for _ in range(difat_count):
+            if sector >= END_OF_CHAIN:
+                break
+            values = struct.unpack('<%dI' % per_sector, self._read_sector(sector))
+            fat_sectors.extend(values[:-1])
+            sector = values[-1]
+        self.fat = []
+        for sector in fat_sectors:
+            if sector >= END_OF_CHAIN:
+                continue
+            self.fat.extend(struct.unpack('<%dI' % per_sector, self._read_sector(sector)))
+
+        directory = b''.join(self._read_chain(first_dir))
+        self.entries = [self._entry(directory[offset:offset + 128]) for offset in range(0, len(directory), 128)]
+        if self.sector_size == 512:
+            # version 3 files only use the low 32 bits of the size
+            for entry in self.entries:
+                entry['size'] &= 0xFFFFFFFF
+        self.mini_fat = []
+        if mini_fat_count and first_mini_fat < END_OF_CHAIN:
+            for data in self._read_chain(first_mini_fat):
+                self.mini_fat.extend(struct.unpack('<%dI' % (len(data) // 4), data))
+        root = self.entries[0]
+        self.mini_stream = list(self._chain(root['start'])) if root['size'] else []
+
+    @staticmethod
+    def _entry(data):
+        name_length, kind = struct.unpack_from('<HB', data, 0x40)
+        left, right, child = struct.unpack_from('<III', data, 0x44)
+        start, size = struct.unpack_from('<IQ', data, 0x74)
+        return {'name': data[:max(0, name_length - 2)].decode('utf-16-le', 'replace'), 'type': kind, 'left': left,
+                'right': right, 'child': child, 'start': start, 'size': size}
+
+    def _read_sector(self, sector, count=1):
+        with self.lock:
+            self.file.seek((sector + 1) * self.sector_size)
+            return self.file.read(self.sector_size * count)
+
+    def _chain(self, start, fat=None):
+        fat = self.fat if fat is None else fat
+        sector = start
+        seen = 0
+        while sector < len(fat) and sector < END_OF_CHAIN:
+            yield sector
+            sector = fat[sector]
+            seen += 1
+            if seen > len(fat):
+                raise ValueError(f'Loop in the sectors of compound file: {self.path}')
+
+    def _read_chain(self, start):
+        """
+        Yields the data of a chain of sectors, sectors that follow each other on disk are read at once
+        """
+        run_start = None
+        run_length = 0
+        for sector in self._chain(start):
+            if run_start is not None and sector == run_start + run_length and run_length < 256:
+                run_length += 1
+                continue
+            if run_start is not None:
+                yield self._read_sector(run_start, run_length)
+            run_start, run_length = sector, 1
+        if run_start is not None:
+            yield self._read_sector(run_start, run_length)
+
+    def _read_mini_chain(self, start):
+        for mini_sector in self._chain(start, self.mini_fat):
+            offset = mini_sector * self.mini_sector_size
+            sector = self.mini_stream[offset // self.sector_size]
+            with self.lock:
+                self.file.seek((sector + 1) * self.sector_size + offset % self.sector_size)
+                yield self.file.read(self.mini_sector_size)
+
+    def children(self, entry_id=0):
+        """
+        Returns the entries in a storage by name, the root storage is entry 0
+        """
+        found = {}
+        seen = set()
+        stack = [self.entries[entry_id]['child']]
+        while stack:
+            child = stack.pop()
+            if child == NO_STREAM or child >= len(self.entries) or child in seen:
+                continue
+            seen.add(child)
+            entry = self.entries[child]
+            found[entry['name']] = child
+            stack.extend((entry['left'], entry['right']))
+        return found
+
+    def stream_chunks(self, entry_id):
+        """
+        Yields the data of a stream in chunks
+        """
+        entry = self.entries[entry_id]
+        size = entry['size']
+        chunks = self._read_mini_chain(entry['start']) if size < self.mini_cutoff else self._read_chain(entry['start'])
+        for chunk in chunks:
+            if size <= 0:
+                break
+            yield chunk[:size]
+            size -= len(chunk)
+
+    def read_stream(self, entry_id):
+        return b''.join(self.stream_chunks(entry_id))
+
+    def close(self):
+        self.file.close()
+
+
+class _HTMLText(HTMLParser):
+    """
+    Gets the text of an html body, for emails without a plain text body
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style', 'head'):
+            self.skip += 1
+        elif tag in ('br', 'p', 'div', 'tr', 'li'):
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style', 'head'):
+            self.skip = max(0, self.skip - 1)
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.parts.append(data)
+
+
+def html_to_text(body):
+    parser = _HTMLText()
+    parser.feed(body)
+    parser.close()
+    return html.unescape(re.sub(r'\n\s*\n+', '\n\n', ''.join(parser.parts))).strip()
+
+
+class _Properties:
+    """
+    The properties of a storage of a MSG file (the email, an attachment or an attached email)
+    """
+
+    def __init__(self, compound_file, entry_id, header_size):
+        self.compound_file = compound_file
+        self.entry_id = entry_id
+        self.streams = compound_file.children(entry_id)
+        self.fixed = {}
+        if '__properties_version1.0' in self.streams:
+            data = compound_file.read_stream(self.streams['__properties_version1.0'])
+            for offset in range(header_size, len(data) - 15, 16):
+                kind, prop_id = struct.unpack_from('<HH', data, offset)
+                self.fixed[prop_id] = (kind, data[offset + 8:offset + 16])
+
+    def stream_id(self, prop_id, kind):
+        return self.streams.get('__substg1.0_%04X%04X' % (prop_id, kind))
+
+    def string(self, prop_id, codepage='cp1252'):
+        """
+        Returns a string property, an empty string if it is not there
+        """
+        entry_id = self.stream_id(prop_id, PT_UNICODE)
+        if entry_id is not None:
+            return self.compound_file.read_stream(entry_id).decode('utf-16-le', 'replace').rstrip('\x00')
+        entry_id = self.stream_id(prop_id, PT_STRING8)
+        if entry_id is not None:
+            return self.compound_file.read_stream(entry_id).decode(codepage, 'replace').rstrip('\x00')
+        return ''
+
+    def binary(self, prop_id):
+        entry_id = self.stream_id(prop_id, PT_BINARY)
+        return None if entry_id is None else self.compound_file.read_stream(entry_id)
+
+    def long(self, prop_id):
+        kind, value = self.fixed.get(prop_id, (None, None))
+        return struct.unpack('<i', value[:4])[0] if kind == PT_LONG else None
+
+    def time(self, prop_id):
+        kind, value = self.fixed.get(prop_id, (None, None))
+        if kind != PT_SYSTIME:
+            return None
+        # a FILETIME: 100 nanoseconds since 1601 in UTC, given in local time without time zone like in Outlook
+        utc = datetime.datetime(1601, 1, 1, tzinfo=datetime.timezone.utc) + \
+            datetime.timedelta(microseconds=struct.unpack('<Q', value)[0] // 10)
+        return utc.astimezone().replace(tzinfo=None)
+
+
+def _codec(codepage):
+    """
+    Returns the python codec of a windows code page, cp1252 if it is not known
+    """
+    if not codepage:
+        return 'cp1252'
+    codec = 'utf-8' if codepage == 65001 else f'cp{codepage}'
+    try:
+        ''.encode(codec)
+    except LookupError:
+        return 'cp1252'
+    return codec
+
+
+class Attachment:
+    """
+    An attachment of an email, an attached email is read from memory (message)
+    """
+
+    def __init__(self, compound_file, entry_id, codepage):
+        self.properties = _Properties(compound_file, entry_id, 8)
+        self.message = None
+        if self.properties.long(PR_ATTACH_METHOD) == ATTACH_EMBEDDED_MSG:
+            storage = self.properties.stream_id(PR_ATTACH_DATA, PT_OBJECT)
+            if storage is not None:
+                self.message = Message(compound_file, storage)
+        self.FileName = (self.properties.string(PR_ATTACH_LONG_FILENAME, codepage) or
+                         self.properties.string(PR_ATTACH_FILENAME, codepage) or
+                         self.properties.string(PR_DISPLAY_NAME, codepage))
+        if self.message is not None:
+            self.FileName = (self.FileName or self.message.Subject or 'email').rstrip('.') + \
+                ('' if self.FileName.lower().endswith('.msg') else '.msg')
+        # names can not have characters that are not allowed on windows
+        self.FileName = re.sub(r'[\\/:*?"<>|\x00-\x1f]', '_', self.FileName) or 'attachment'
+
+    def SaveAsFile(self, path):
+        """
+        Writes the attachment to path in chunks, an attached email is not written (see message)
+        """
+        if self.message is not None:
+            return
+        entry_id = self.properties.stream_id(PR_ATTACH_DATA, PT_BINARY)
+        with open(path, 'wb') as f:
+            if entry_id is not None:
+                for chunk in self.properties.compound_file.stream_chunks(entry_id):
+                    f.write(chunk)
+
+
+class Attachments:
+    """
+    The attachments of an email, Item counts from 1 like in Outlook
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.Count = len(items)
+
+    def Item(self, number):
+        return self.items[number - 1]
+
+
+class Message:
+    """
+    An email read from a MSG file, with the names Outlook uses
+    """
+
+    def __init__(self, compound_file, entry_id=0):
+        """
+        Parameters
+        ----------
+        compound_file: CompoundFile
+            The opened MSG file
+        entry_id: int
+            The storage of the email, default is 0 for the email of the MSG file, other for attached emails
+        """
+        self.compound_file = compound_file
+        self.properties = _Properties(compound_file, entry_id, 32 if entry_id == 0 else 24)
+        # 8 bit strings have the code page of the message, the html body the code page of the internet message
+        codepage = _codec(self.properties.long(PR_MESSAGE_CODEPAGE) or self.properties.long(PR_INTERNET_CPID))
+        html_codepage = _codec(self.properties.long(PR_INTERNET_CPID) or self.properties.long(PR_MESSAGE_CODEPAGE))
+        self.SenderName = self.properties.string(PR_SENDER_NAME, codepage)
+        self.SentOn = self.properties.time(PR_CLIENT_SUBMIT_TIME) or ''
+        self.To = self.properties.string(PR_DISPLAY_TO, codepage)
+        self.CC = self.properties.string(PR_DISPLAY_CC, codepage)
+        self.Subject = self.properties.string(PR_SUBJECT, codepage)
+        self.Body = self.properties.string(PR_BODY, codepage)
+        if not self.Body:
+            body = self.properties.binary(PR_HTML)
+            body = body.decode(html_codepage, 'replace') if body is not None else self.properties.string(PR_HTML, codepage)
+            if body:
+                self.Body = html_to_text(body)
+        attachments = sorted(name for name in self.properties.streams if name.startswith('__attach_version1.0_'))
+        self.Attachments = Attachments([Attachment(compound_file, self.properties.streams[name], codepage)
+                                        for name in attachments])
+
+    def Close(self, save_mode=1):
+        """
+        Closes the MSG file, attached emails are closed with the email they are attached to
+        """
+        if self.properties.entry_id == 0:
+            self.compound_file.close()
+
+
+def open_message(path):
+    """
+    Opens a MSG file
+
+    Parameters
+    ----------
+    path: str
+        The path to the MSG file
+
+    Returns
+    -------
+    message: Message
+        The email
+    """
+    compound_file = CompoundFile(path)
+    try:
+        return Message(compound_file)
+    except:
+        compound_file.close()
+        logging.error(f'Failed to read MSG file: {path}')
+        raise
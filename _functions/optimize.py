@@ -0,0 +1,282 @@
+import hashlib
+import io
+import logging
+import math
+import os
+import tempfile
+import zlib
+import pikepdf
+from PIL import Image
+
+"""
+This file is a python file that makes converted and combined pdf files smaller. This file is called from the file
+_functions.pipeline when optimize is set.
+
+A pdf is saved with object streams and compressed streams. Fonts and images that are the same in several parts of a
+combined email (e.g. the logo and font of every attachment) are saved once. Scans that are placed on the page with a
+higher resolution than target_dpi can be downsampled. The smaller pdf replaces the pdf only when it is smaller.
+
+Author: Joana Cardoso
+"""
+
+FONT_FILES = ('/FontFile', '/FontFile2', '/FontFile3')
+# images are only downsampled when they are this much larger than needed
+DOWNSAMPLE_MARGIN = 1.25
+
+
+def _key(obj, memo, depth=0):
+    """
+    Returns a key of the content of a pdf object, the same for objects that are the same in different parts
+    """
+    if isinstance(obj, pikepdf.Stream):
+        if obj.objgen in memo:
+            return memo[obj.objgen]
+        digest = hashlib.sha256(obj.read_raw_bytes())
+        for name in sorted(obj.keys()):
+            if name != '/Length':
+                digest.update(name.encode() + _key(obj[name], memo, depth + 1))
+        memo[obj.objgen] = digest.hexdigest().encode()
+        return memo[obj.objgen]
+    if not isinstance(obj, pikepdf.Object):
+        # numbers and booleans are python objects
+        return repr(obj).encode()
+    if depth > 8:
+        # deep references (e.g. to a page) are not part of an image or font file
+        return obj.unparse()
+    if isinstance(obj, pikepdf.Dictionary):
+        return b'<<' + b''.join(name.encode() + _key(obj[name], memo, depth + 1) for name in sorted(obj.keys())) + b'>>'
+    if isinstance(obj, pikepdf.Array):
+        return b'[' + b' '.join(_key(item, memo, depth + 1) for item in obj) + b']'
+    return obj.unparse()
+
+
+def _font_descriptors(font):
+    if '/FontDescriptor' in font:
+        yield font.FontDescriptor
+    for descendant in font.get('/DescendantFonts', ()):
+        if '/FontDescriptor' in descendant:
+            yield descendant.FontDescriptor
+
+
+def remove_identical(pdf):
+    """
+    Makes the images and embedded fonts that are the same point to one object, the copies are not saved
+
+    Parameters
+    ----------
+    pdf: Pdf
+        The pdf opened with pikepdf
+
+    Returns
+    -------
+    removed: int
+        The number of images and fonts that were the same as another one
+    """
+    memo = {}
+    seen = {}
+    visited = set()
+    removed = 0
+
+    def same(stream):
+        key = _key(stream, memo)
+        first = seen.setdefault(key, stream)
+        return None if first.objgen == stream.objgen else first
+
+    resources = [page.obj.get('/Resources') for page in pdf.pages]
+    while resources:
+        resource = resources.pop()
+        if not isinstance(resource, pikepdf.Dictionary):
+            continue
+        if resource.is_indirect:
+            if resource.objgen in visited:
+                continue
+            visited.add(resource.objgen)
+        xobjects = resource.get('/XObject', {})
+        for name in list(xobjects.keys()):
+            xobject = xobjects[name]
+            if not isinstance(xobject, pikepdf.Stream):
+                continue
+            if xobject.get('/Subtype') == pikepdf.Name.Image:
+                first = same(xobject)
+                if first is not None:
+                    xobjects[name] = first
+                    removed += 1
+            elif xobject.get('/Subtype') == pikepdf.Name.Form:
+                resources.append(xobject.get('/Resources'))
+        fonts = resource.get('/Font', {})
+        for name in list(fonts.keys()):
+            for descriptor in _font_descriptors(fonts[name]):
+                for font_file in FONT_FILES:
+                    if font_file in descriptor:
+                        first = same(descriptor[font_file])
+                        if first is not None:
+                            descriptor[font_file] = first
+                            removed += 1
+    return removed
+
+
+def _multiply(m, ctm):
+    a, b, c, d, e, f = m
+    A, B, C, D, E, F = ctm
+    return [a * A + b * C, a * B + b * D, c * A + d * C, c * B + d * D, e * A + f * C + E, e * B + f * D + F]
+
+
+def drawn_sizes(pdf):
+    """
+    Returns the largest size (in points) every image is drawn with on the pages, by object number. Images in forms
+    are not included
+
+    Parameters
+    ----------
+    pdf: Pdf
+        The pdf opened with pikepdf
+    """
+    sizes = {}
+    for page in pdf.pages:
+        xobjects = page.obj.get('/Resources', {}).get('/XObject', {})
+        ctm = [1, 0, 0, 1, 0, 0]
+        stack = []
+        for operands, operator in pikepdf.parse_content_stream(page):
+            operator = str(operator)
+            if operator == 'q':
+                stack.append(ctm)
+            elif operator == 'Q':
+                ctm = stack.pop() if stack else [1, 0, 0, 1, 0, 0]
+            elif operator == 'cm' and len(operands) == 6:
+                ctm = _multiply([float(value) for value in operands], ctm)
+            elif operator == 'Do' and str(operands[0]) in xobjects:
+                image = xobjects[str(operands[0])]
+                if image.get('/Subtype') != pikepdf.Name.Image:
+                    continue
+                size = (math.hypot(ctm[0], ctm[1]), math.hypot(ctm[2], ctm[3]))
+                known = sizes.get(image.objgen, (0, 0))
+                sizes[image.objgen] = (max(known[0], size[0]), max(known[1], size[1]))
+    return sizes
+
+
+def downsample(image, size, target_dpi):
+    """
+    Lowers the resolution of an image to target_dpi for the size it is drawn with. Only 8 bit gray and rgb images
+    without masks are changed
+
+    Parameters
+    ----------
+    image: Stream
+        The image
+    size: tuple
+        The width and height the image is drawn with, in points
+    target_dpi: int
+        The resolution to downsample to
+
+    Returns
+    -------
+    changed: bool
+        Whether the image was downsampled
+    """
+    width, height = int(image.Width), int(image.Height)
+    if not size[0] or not size[1]:
+        return False
+    scale = max(target_dpi * size[0] / 72 / width, target_dpi * size[1] / 72 / height)
+    if scale * DOWNSAMPLE_MARGIN >= 1:
+        return False
+    if any(name in image for name in ('/SMask', '/Mask', '/ImageMask', '/Decode')) or \
+            image.get('/BitsPerComponent') != 8:
+        return False
+    pil_image = pikepdf.PdfImage(image).as_pil_image()
+    if pil_image.mode not in ('RGB', 'L'):
+        return False
+    pil_image = pil_image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+    if image.get('/Filter') == pikepdf.Name.DCTDecode:
+        data = io.BytesIO()
+        pil_image.save(data, 'JPEG', quality=85)
+        image.write(data.getvalue(), filter=pikepdf.Name.DCTDecode)
+    else:
+        image.write(zlib.compress(pil_image.tobytes()), filter=pikepdf.Name.FlateDecode)
+    image.Width = pil_image.width
+    image.Height = pil_image.height
+    return True
+
+
+def optimize_pdf(file, target_dpi=None, index=None):
+    """
+    Makes a pdf smaller, the pdf is only replaced when the result is smaller
+
+    Parameters
+    ----------
+    file: str
+        The path to the pdf
+    target_dpi: int
+        Downsample images drawn with a higher resolution to this resolution. Default is None to keep the images
+    index: DuplicateIndex
+        The files checked for duplicates, the hash of a file is made before it is replaced, see
+        _functions.duplicates. Default is None
+
+    Returns
+    -------
+    saved: int
+        The number of bytes saved
+    """
+    temp_file = None
+    try:
+        with pikepdf.open(file) as pdf:
+            removed = remove_identical(pdf)
+            downsampled = 0
+            if target_dpi:
+                sizes = drawn_sizes(pdf)
+                for image in pdf.objects:
+                    if isinstance(image, pikepdf.Stream) and image.objgen in sizes:
+                        try:
+                            downsampled += downsample(image, sizes[image.objgen], target_dpi)
+                        except:
+                            logging.error(f'Failed to downsample image {image.objgen} in file: {file}')
+            handle, temp_file = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(file))
+            os.close(handle)
+            pdf.save(temp_file, object_stream_mode=pikepdf.ObjectStreamMode.generate, compress_streams=True)
+        saved = os.path.getsize(file) - os.path.getsize(temp_file)
+        if saved <= 0:
+            os.remove(temp_file)
+            logging.debug(f'PDF file is not smaller after optimizing: {file}')
+            return 0
+        if index is not None:
+            index.seal(file)
+        os.replace(temp_file, file)
+        logging.debug(f'Optimized PDF file: {file}, {removed} identical images and fonts, {downsampled} images '
+                      f'downsampled, {saved} bytes saved')
+        return saved
+    except:
+        logging.error(f'Failed to optimize PDF file: {file}')
+        if temp_file is not None and os.path.exists(temp_file):
+            os.remove(temp_file)
+        return 0
+
+
+def optimize_files(files, target_dpi=None, inventory=None, index=None):
+    """
+    Makes the pdfs of printed or combined files smaller, see optimize_pdf
+
+    Parameters
+    ----------
+    files: list
+        The pdfs, pdfs that do not exist (e.g. because printing failed) are skipped
+    target_dpi: int
+        Downsample images drawn with a higher resolution to this resolution. Default is None to keep the images
+    inventory: Inventory
+        The files in the output directory, updated with the new sizes, see _functions.inventory. Default is None
+    index: DuplicateIndex
+        The files checked for duplicates, the hash of a file is made before it is replaced, see
+        _functions.duplicates. Default is None
+
+    Returns
+    -------
+    saved: int
+        The number of bytes saved
+    """
+    saved = 0
+    for file in files:
+        if not (inventory.exists(file) if inventory is not None else os.path.isfile(file)):
+            continue
+        done = optimize_pdf(file, target_dpi, index)
+        if done and inventory is not None:
+            inventory.add(file)
+        saved += done
+    return saved
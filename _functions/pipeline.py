@@ -0,0 +1,639 @@
+import logging
+import os
+import threading
+from collections import deque
+from pathlib import Path
+import _functions.cache as cache
+import _functions.check_length as cl
+import _functions.combine as comb
+import _functions.copy_engine as ce
+import _functions.duplicates as dup
+import _functions.extract_msg as em
+import _functions.get_files as gf
+import _functions.history as hist
+import _functions.inventory as inv
+import _functions.journal as jr
+import _functions.libreoffice as lo
+import _functions.log_table as log
+import _functions.manifest as mf
+import _functions.optimize as opt
+import _functions.print as prt
+import _functions.report as rep
+import _functions.sources as src
+import _functions.tasks as tasks
+import _functions.unzip_files as uz
+
+"""
+This file is a python file that runs the whole conversion without a graphical user interface. It is used by the main file
+PDF_conversion_tool.py and by the command line tool PDF_conversion_cli.py, but can also be imported directly:
+
+    from _functions.pipeline import convert, ConvertOptions
+
+    for record in convert('C:/Archive/Export.zip', ConvertOptions(remove_duplicates=True)):
+        print(record['Original file'], record['To PDF'])
+
+Author: Joana Cardoso
+"""
+
+STAGES = ('extract', 'print', 'combine')
+KEPT_EXTENSIONS = ('.xlsx', '.xls', '.pdf', '.htm', '.html')
+
+
+class ConvertOptions:
+    """
+    The settings of one conversion run
+
+    Attributes
+    ----------
+    remove_duplicates: bool
+        Move duplicates to a separate folder instead of only flagging them. Default is False
+    out_dir: str
+        The output directory, default is PDF_<name> next to the selected folder
+    report_dir: str
+        The directory of the excel results file, default is the directory of the selected folder
+    json_log: str
+        The path to the json log table (for debugging), default is Log_results.json in the working directory
+    report_format: str
+        The format of the results file: 'xlsx' for excel (split over several sheets when it is too large) or 'csv'
+        for very large runs. Default is 'xlsx'
+    persistent_office: bool
+        Keep LibreOffice running during the run instead of starting it for every file. Default is True
+    workers: int
+        The number of files printed to pdf at the same time, each with its own LibreOffice. Default is the number of
+        processors
+    batch_size: int
+        The maximum number of files of one directory copied and printed together, with one start of soffice when
+        persistent_office is not used. Default is 20
+    cache: bool
+        Take the pdfs of files converted before from the conversion cache, see _functions.cache. Default is True
+    cache_dir: str
+        The directory of the conversion cache, default is _functions.cache.DEFAULT_CACHE_DIR
+    cache_size: int
+        The maximum size of the conversion cache in bytes. Default is 2 GiB
+    history: bool
+        Save the delivered files in the history of earlier batches, see _functions.history. Default is True
+    history_path: str
+        The path to the history database, default is _functions.history.DEFAULT_HISTORY
+    previous_batches: str
+        What to do with files delivered in an earlier batch: 'flag' flags them as duplicate, 'skip' also moves them
+        to the duplicates folder. Default is None to do nothing
+    batch: str
+        The id of this batch in the history. Default is None to continue the batch of a stopped run on the same folder
+        or else to start a new batch named after the folder and the time, see _functions.history
+    resume: bool
+        Skip the files that were finished in a previous run on the same folder, see _functions.manifest. Default is True
+    optimize: bool
+        Make the printed and combined pdfs smaller, see _functions.optimize. Default is False
+    target_dpi: int
+        With optimize, downsample images (e.g. scans) drawn with a higher resolution to this resolution. Default is None
+        to keep the images
+    msg_backend: str
+        How MSG files are read: 'outlook' or 'python' (without Outlook, several at the same time), see
+        _functions.extract_msg. Default is None for Outlook when it can be used
+    link: bool
+        Link the pdf, excel and html files (which are not converted) into the output directory with a hardlink instead
+        of copying them, when it is on the same disk as the selected folder, see _functions.copy_engine. Default is
+        False
+    converter: object
+        Converts files to pdf instead of LibreOffice, must have the methods convert(file), convert_batch(files) and
+        close(), see _functions.libreoffice (e.g. LibreOfficePool(fake=True) in tests). Default is None
+    """
+
+    def __init__(self, remove_duplicates=False, out_dir=None, report_dir=None, json_log='Log_results.json',
+                 report_format='xlsx', persistent_office=True, workers=None, batch_size=20, cache=True, cache_dir=None,
+                 cache_size=2 * 1024 ** 3, history=True, history_path=None, previous_batches=None, batch=None,
+                 resume=True, optimize=False, target_dpi=None, msg_backend=None, link=False, converter=None):
+        self.remove_duplicates = remove_duplicates
+        self.out_dir = out_dir
+        self.report_dir = report_dir
+        self.json_log = json_log
+        self.report_format = report_format
+        self.persistent_office = persistent_office
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.cache = cache
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.history = history
+        self.history_path = history_path
+        self.previous_batches = previous_batches
+        self.batch = batch
+        self.resume = resume
+        self.optimize = optimize
+        self.target_dpi = target_dpi
+        self.msg_backend = msg_backend or em.DEFAULT_BACKEND
+        self.link = link
+        self.converter = converter
+
+
+def open_source(source):
+    """
+    Gets the files to process from the selected folder or zip file. Zip files are read in place, see
+    _functions.sources, in folders too long names are shortened and zip files are unzipped.
+
+    Parameters
+    ----------
+    source: str
+        The path to the selected folder or zip file
+
+    Returns
+    -------
+    source: FolderSource or ZipSource
+        The files of the selected folder or zip file, see _functions.sources
+    """
+    source = os.path.abspath(source)
+    if os.path.isfile(source):
+        return src.ZipSource(source)
+
+    process_dir = source
+    logging.info(f'Process directory: {process_dir}')
+    for root, dirs, files in inv.walk(process_dir):
+        for file in files:
+            des_dir = os.path.join(root, os.path.dirname(file))
+            file_path = os.path.join(root, file)
+            logging.info(f'File: {file}')
+            logging.info(f'Destination directory: {des_dir}')
+            file_name, long_name = cl.check_length(
+                des_dir=des_dir, file=file)
+
+            if long_name == True:
+                logging.info(f'Long name')
+                try:
+                    os.rename(file_path, file_name)
+                    logging.debug(
+                        f'Changing name: {file} into {file_name}')
+                except:
+                    logging.error(
+                        f'Failed to change name: {file} into {file_name}')
+            name_lower = file.lower()
+            if name_lower.endswith('.zip'):
+                zip_dir = os.path.join(root, file)
+                proc_zip = os.path.abspath(
+                    os.path.splitext(zip_dir)[0])
+                logging.info(f'Zip_dir: {zip_dir}')
+                logging.info(f'Proc dir: {proc_zip}')
+                uz.unzip_files(zip_dir, proc_zip)
+                try:
+                    os.remove(zip_dir)
+                    logging.debug(f'Removed zip: {zip_dir}')
+                except:
+                    logging.error(f'Failed to remove zip: {zip_dir}')
+    return src.FolderSource(process_dir)
+
+
+def find_files(source):
+    """
+    Gets the files found in the selected folder
+
+    Parameters
+    ----------
+    source: FolderSource or ZipSource
+        The files of the selected folder, see open_source. The path to a folder is also accepted
+
+    Returns
+    -------
+    all_files: list
+        All files to convert
+    email_files: list
+        The emails
+    pdf_files: int
+        The number of pdf files
+    other_files: int
+        The number of other files
+    empty_dir: list
+        The empty directories
+    """
+    logging.info('Find files')
+    all_files = []
+    email_files = []
+    pdf_files = 0
+    other_files = 0
+    empty_dir = []
+
+    if isinstance(source, str):
+        source = src.FolderSource(source)
+    for root, dirs, files in source.walk():
+        if not len(dirs) and not len(files):
+            # Adding the empty directory to list
+            empty_dir.append(root)
+        for name in files:
+            name_lower = name.lower()
+            if not name_lower.endswith(".zip"):
+                if name_lower.endswith((".msg", ".eml")):
+                    email_files.append(os.path.join(root, name))
+                elif name_lower.endswith(".pdf"):
+                    pdf_files += 1
+                else:
+                    other_files += 1
+                all_files.append(os.path.join(root, name))
+
+    return all_files, email_files, pdf_files, other_files, empty_dir
+
+
+class _Unit:
+    """
+    Files that are finished together: individual files of one directory or one email with its attachments
+    """
+
+    def __init__(self, sources, email=False):
+        self.sources = sources
+        self.email = email
+        # the place of the unit in the selected folder, see Conversion._extracted
+        self.number = None
+        # the copied or extracted files and whether they still have to be checked for duplicates
+        self.parts = []
+        self.check = True
+        self.out_email = None
+        self.file_log = log.LogTable()
+        self.fingerprints = {}
+        self.skipped = []
+        self.hashes = []
+        self.failed = False
+
+
+class Conversion:
+    """
+    One conversion run of a prepared directory. Iterating over the run processes the files and yields one record of
+    the log table per file as soon as the file is finished. The summary attributes are set when the iteration is done.
+
+    Every file moves on to its next step as soon as it is ready: individual files are copied, checked for duplicates
+    and printed to pdf, emails are extracted, their parts checked and printed and then combined, see _functions.tasks.
+    The files are registered for the duplicate check in the order of the selected folder, so the first of several files
+    with the same content is the original, however fast the files are copied.
+
+    Attributes
+    ----------
+    source: FolderSource or ZipSource
+        The files of the selected folder or zip file, see _functions.sources
+    process_dir: str
+        The directory of the selected folder
+    options: ConvertOptions
+        The settings of the run
+    out_dir: str
+        The output directory where converted files will be placed
+    log_table_path: str
+        The path to the excel or csv results file
+    manifest_path: str
+        The path to the manifest that records the finished files, see _functions.manifest
+    journal_path: str
+        The path to the journal with the log table of the run, see _functions.journal
+    out_duplicates: str
+        The path to the duplicates directory
+    duplicates: set
+        The duplicate files
+    total_pdf: int
+        The number of pdf files in the output directory
+    not_converted: list
+        The files in the output directory that were not converted
+    """
+
+    def __init__(self, source, options=None, on_progress=None):
+        """
+        Parameters
+        ----------
+        source: FolderSource or ZipSource
+            The files of the selected folder, see open_source. The path to a prepared folder is also accepted
+        options: ConvertOptions
+            The settings of the run. Default is ConvertOptions()
+        on_progress: callable
+            Called with (stage, done, total) when a file finished a stage, stage is one of STAGES, done and total
+            count the files of the selected folder. Default is None
+        """
+        self.source = src.FolderSource(source) if isinstance(source, str) else source
+        self.process_dir = os.path.abspath(self.source.process_dir)
+        self.options = options if options is not None else ConvertOptions()
+        self.on_progress = on_progress
+        self.out_dir = self.options.out_dir or os.path.join(os.path.dirname(
+            self.process_dir), "PDF_" + os.path.basename(self.process_dir))
+        report_dir = self.options.report_dir or os.path.dirname(self.process_dir)
+        self.log_table_path = os.path.join(
+            report_dir, 'Results_PDF_' + str(os.path.basename(self.process_dir)) + '.' + self.options.report_format)
+        self.manifest_path = os.path.join(
+            report_dir, 'Manifest_PDF_' + str(os.path.basename(self.process_dir)) + '.sqlite')
+        self.journal_path = os.path.join(
+            report_dir, 'Journal_PDF_' + str(os.path.basename(self.process_dir)) + '.jsonl')
+        self.out_duplicates = dup.duplicates_dir(self.process_dir)
+        self.duplicates = set()
+        self.total_pdf = 0
+        self.not_converted = []
+        self.done = 0
+        self.total = 0
+        self.finished = deque()
+
+    def _report(self, stage):
+        """
+        Calls on_progress for the given stage
+        """
+        if self.on_progress is not None:
+            self.on_progress(stage, self.done, self.total)
+
+    def _finish_record(self, record):
+        """
+        Flags files that are still in the output directory but were not converted and returns a copy of the record
+        """
+        file_path = record['File name']
+        if self.inventory.exists(file_path) and not file_path.lower().endswith(KEPT_EXTENSIONS):
+            logging.info(f'Not converted file: {file_path}')
+            record['Check'] = True
+            record['Combined'] = False
+            logging.debug(
+                f'Updating log table for not converted file: {file_path}')
+        return dict(record)
+
+    def _check_files(self, files, unit):
+        """
+        Checks the copied or extracted files for duplicates and returns the files to print to pdf (runs on a worker)
+        """
+        if not unit.check:
+            return files
+        kept = []
+        for file in files:
+            # files that are removed or written again later are sealed then, see _functions.duplicates
+            original = self.index.check(file, size=self.inventory.sizes.get(os.path.normpath(file)))
+            if original is None:
+                delivered = None
+                if self.options.previous_batches and self.history is not None:
+                    delivered = self.history.delivered(self.index.entries[file])
+                if delivered is None:
+                    source = unit.sources[0] if unit.email else file.replace(self.out_dir, self.process_dir)
+                    unit.hashes.append((file, source))
+                    kept.append(file)
+                    continue
+                logging.info(f'Delivered before in batch {delivered[0]} as {delivered[1]}: {file}')
+                remove = self.options.previous_batches == 'skip'
+            else:
+                remove = self.options.remove_duplicates
+            self.duplicates.add(file)
+            dup.handle_duplicate(file, self.out_dir, self.out_duplicates, unit.file_log, remove, self.inventory)
+            if not remove:
+                kept.append(file)
+        return prt.files_to_print(kept, unit.file_log, self.inventory)
+
+    def _previous_stage(self, unit, source):
+        """
+        Returns the stage the file finished in a previous run, see _functions.manifest (runs on a worker)
+        """
+        try:
+            unit.fingerprints[source] = self.source.fingerprint(source)
+        except:
+            logging.error(f'Failed to read file for the manifest: {source}')
+            return None
+        stage = self.manifest.stage(source, unit.fingerprints[source])
+        if stage == mf.DONE and not self._delivered(source):
+            logging.info(f'Output of a previous run is not in the output directory anymore: {source}')
+            return None
+        return stage
+
+    def _delivered(self, source):
+        """
+        Returns True if the files a previous run delivered for a file are still in the output directory: the pdf or the
+        kept file of every record, except duplicates and attachments that are combined with their email
+        """
+        for record in self.manifest.records(source):
+            if record['Duplicate'] or (record['Attachment'] and record['Combined']):
+                continue
+            file = record['File name']
+            if not (self.inventory.exists(file) or self.inventory.exists(os.path.splitext(file)[0] + '.pdf')):
+                return False
+        return True
+
+    def _copy(self, unit):
+        for source in unit.sources:
+            if self._previous_stage(unit, source) == mf.DONE:
+                logging.info(f'Finished in a previous run: {source}')
+                unit.skipped.append(source)
+        return gf.copy_files([source for source in unit.sources if source not in unit.skipped],
+                             self.process_dir, self.out_dir, unit.file_log, self.source, self.inventory, self.copier)
+
+    def _extract(self, unit):
+        source = unit.sources[0]
+        stage = self._previous_stage(unit, source)
+        out_email = os.path.splitext(source.replace(self.process_dir, self.out_dir))[0]
+        if stage == mf.DONE:
+            logging.info(f'Finished in a previous run: {source}')
+            unit.skipped.append(source)
+            return []
+        if stage in (mf.EXTRACTED, mf.PRINTED) and os.path.isdir(out_email):
+            # continue with the parts extracted in the previous run
+            logging.info(f'Extracted in a previous run: {source}')
+            unit.out_email = out_email
+            unit.file_log = log.LogTable(self.manifest.records(source))
+            # the parts were checked for duplicates in the previous run
+            unit.check = False
+            if stage == mf.PRINTED:
+                return []
+            return prt.files_to_print(self.inventory.files_under(out_email), unit.file_log, self.inventory)
+        unit.out_email, parts = gf.get_email(source, self.process_dir, self.out_dir, unit.file_log,
+                                               self.source, self.inventory, self.options.msg_backend)
+        return parts
+
+    def _save_stage(self, unit, stage):
+        """
+        Saves the stage of the files of the unit that were not finished in a previous run in the manifest
+        """
+        hashes = [(file, source, self.index.key(file)) for file, source in unit.hashes]
+        self.manifest.update([source for source in unit.sources if source not in unit.skipped], stage,
+                             unit.fingerprints, unit.file_log, [row for row in hashes if row[2] is not None])
+
+    def _extracted(self, unit, task):
+        """
+        Registers the copied or extracted files for the duplicate check and adds the task that checks them, in the order
+        of the units: a unit that is ready before the units in front of it waits for them
+        """
+        self._report('extract')
+        unit.failed = task.error is not None
+        unit.parts = task.result or []
+        self.arrived[unit.number] = unit
+        while self.next_unit in self.arrived:
+            ready = self.arrived.pop(self.next_unit)
+            self.next_unit += 1
+            if ready.check:
+                for file in ready.parts:
+                    self.index.register(file, self.inventory.sizes.get(os.path.normpath(file)))
+            self.graph.add('check', 'io', self._check_files, ready.parts, ready,
+                           on_done=lambda task, unit=ready: self._checked(unit, task))
+
+    def _checked(self, unit, task):
+        """
+        Adds the print tasks of the unit and the task that combines an email or finishes the individual files
+        """
+        unit.failed = unit.failed or task.error is not None
+        if unit.email and not unit.skipped:
+            self._save_stage(unit, mf.FAILED if unit.failed else mf.EXTRACTED)
+        batches = prt.make_batches(task.result or [], self.batch_size)
+        printed = [self.graph.add('print', 'print', prt.print_batch, batch, unit.file_log, self.converter, self.lock,
+                                  self.inventory, self.index) for batch in batches]
+        if unit.email and unit.out_email is not None:
+            printed = [self.graph.add('printed', None, None, after=printed,
+                                      on_done=lambda task: self._save_stage(unit, mf.PRINTED))]
+            combined = [self.graph.add('combine', 'io', comb.combine_pdf, unit.out_email, self.inventory, self.index,
+                                       after=printed)]
+            if self.options.optimize:
+                combined = [self.graph.add('optimize', 'print', opt.optimize_files, [unit.out_email + '.pdf'],
+                                           self.options.target_dpi, self.inventory, self.index, after=combined)]
+            self.graph.add('finish', None, None, after=combined,
+                           on_done=lambda task: self._finish(unit, 'combine'))
+        else:
+            if self.options.optimize:
+                printed = [self.graph.add('optimize', 'print', opt.optimize_files, [lo.out_pdf(file) for file in batch],
+                                          self.options.target_dpi, self.inventory, self.index, after=[printing])
+                           for batch, printing in zip(batches, printed)]
+            self.graph.add('finish', None, None, after=printed,
+                           on_done=lambda task: self._finish(unit, 'print'))
+
+    def _finish(self, unit, stage):
+        """
+        Saves the finished unit in the manifest and hands out its records, also the ones of a previous run
+        """
+        if self.history is not None and not unit.failed:
+            self.history.add([self.index.entries[file] for file, source in unit.hashes if file in self.index.entries])
+        self._save_stage(unit, mf.FAILED if unit.failed else mf.DONE)
+        for source in unit.skipped:
+            unit.file_log.extend(self.manifest.records(source))
+            self.duplicates.update(record['File name'] for record in unit.file_log.source(source)
+                                   if record['Duplicate'])
+        finished = [self._finish_record(record) for record in unit.file_log]
+        self.journal.write(finished)
+        self.finished.extend(finished)
+        # the records are in the journal now, the unit does not have to keep them
+        unit.file_log = None
+        self.done += len(unit.sources)
+        self._report(stage)
+
+    def _units(self, all_files):
+        """
+        Groups the files into emails and batches of individual files of one directory
+        """
+        units = []
+        batch = None
+        for file in all_files:
+            if file.lower().endswith((".msg", ".eml")):
+                units.append(_Unit([file], email=True))
+            elif batch is not None and len(batch.sources) < self.batch_size and \
+                    os.path.dirname(batch.sources[0]) == os.path.dirname(file):
+                batch.sources.append(file)
+            else:
+                batch = _Unit([file])
+                units.append(batch)
+        return units
+
+    def __iter__(self):
+        out_dir = self.out_dir
+        logging.info(f'Output directory: {out_dir}')
+        logging.info(f'Remove duplicates is set to {self.options.remove_duplicates}')
+        all_files, email_files, pdf_files, other_files, empty_dir = find_files(self.source)
+        self.total = len(all_files)
+
+        workers = self.options.workers
+        self.batch_size = self.options.batch_size
+        self.converter = self.options.converter
+        if self.converter is None:
+            if self.options.persistent_office:
+                # a running instance does not gain from batches, one file per worker keeps all of them busy
+                self.converter = lo.LibreOfficePool(size=workers)
+                self.batch_size = 1
+            else:
+                self.converter = lo.SofficeConverter(size=workers)
+        if self.options.cache:
+            self.converter = cache.CachedConverter(self.converter, self.options.cache_dir, self.options.cache_size)
+        self.lock = threading.Lock()
+        self.copier = ce.CopyEngine(workers, link_extensions=prt.ext if self.options.link else ())
+        self.inventory = inv.Inventory(out_dir)
+        self.manifest = mf.Manifest(self.manifest_path, resume=self.options.resume, out_dir=os.path.abspath(out_dir))
+        self.journal = jr.Journal(self.journal_path)
+        self.index = dup.DuplicateIndex()
+        for key, path in self.manifest.hashes():
+            self.index.add(key, path)
+        self.history = None
+        if self.options.history or self.options.previous_batches:
+            self.history = hist.History(self.options.history_path, batch=self.options.batch,
+                                        source=self.process_dir, resume=self.options.resume)
+
+        # emails are extracted one at a time since Outlook can only do one at a time
+        outlook = self.options.msg_backend == 'outlook'
+        self.graph = tasks.TaskGraph({'io': workers, 'email': 1 if outlook else workers, 'print': workers})
+        units = self._units(all_files)
+        for number, unit in enumerate(units):
+            unit.number = number
+        # units that are copied or extracted but wait for the units in front of them, see _extracted
+        self.arrived = {}
+        self.next_unit = 0
+        logging.info('Started converting files to PDF')
+        try:
+            for unit in units:
+                if unit.email:
+                    self.graph.add('extract', 'email', self._extract, unit,
+                                   on_done=lambda task, unit=unit: self._extracted(unit, task))
+                else:
+                    self.graph.add('copy', 'io', self._copy, unit,
+                                   on_done=lambda task, unit=unit: self._extracted(unit, task))
+            for task in self.graph.run():
+                while self.finished:
+                    yield self.finished.popleft()
+            if self.history is not None:
+                # a run on the same folder after this one is a new batch
+                self.history.finish()
+        finally:
+            self.copier.close()
+            self.source.close()
+            self.manifest.close()
+            self.journal.close()
+            if self.history is not None:
+                self.history.close()
+            if self.options.converter is None:
+                self.converter.close()
+            if outlook and any(unit.email for unit in units):
+                gf.close_outlook()
+        logging.info('Finished converting files to PDF')
+
+        comb.remove_empty_dirs(out_dir, self.inventory)
+
+        # make empty directories if they exist in the original directory
+        if len(empty_dir) > 0:
+            logging.info('Started creating empty directories')
+            for emp_dir in empty_dir:
+                create_emp_dir = emp_dir.replace(self.process_dir, out_dir)
+                try:
+                    # Create empty directory in output dir
+                    Path(create_emp_dir).mkdir(parents=True, exist_ok=True)
+                    logging.debug(
+                        f'Creating empty directory: {create_emp_dir}')
+                except:
+                    logging.error(
+                        f'Failed to create empty directory: {create_emp_dir}')
+            logging.info('Finished creating empty directories')
+
+        # count converted files
+        for path in sorted(self.inventory.all_files()):
+            name_lower = path.lower()
+            if name_lower.endswith('.pdf'):
+                self.total_pdf += 1
+            if not name_lower.endswith(KEPT_EXTENSIONS):
+                self.not_converted.append(path)
+
+        rep.write_json(self.journal.records(), self.options.json_log)
+        if self.options.report_format == 'csv':
+            rep.write_csv(self.journal.records(), self.log_table_path)
+        else:
+            rep.write_excel(self.journal.records(), self.log_table_path)
+
+
+def convert(source, options=None, on_progress=None):
+    """
+    Converts a folder or zip file to pdf
+
+    Parameters
+    ----------
+    source: str
+        The path to the folder or zip file to convert
+    options: ConvertOptions
+        The settings of the run. Default is ConvertOptions()
+    on_progress: callable
+        Called with (stage, done, total) while a stage is running. Default is None
+
+    Returns
+    -------
+    conversion: Conversion
+        The run, iterate over it to process the files and get one log record per file
+    """
+    return Conversion(open_source(source), options=options, on_progress=on_progress)
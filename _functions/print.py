@@ -1,95 +1,217 @@
 import logging, os, re
-import pikepdf
-import subprocess
-import tempfile
 from pikepdf import _cpphelpers #uncomment in py file when making exe with pyinstaller
+import _functions.copy_engine as ce
+import _functions.image_pdf as ip
+import _functions.text_pdf as tp
+import _functions.unlock as ul
 
 """
-This file is a python file that converts files to pdf. This file is called from the main file PDF_conversion_tool.py, def convert_files.
+This file is a python file that converts files to pdf. This file is called from the file _functions.pipeline.
 
 Author: Joana Cardoso
 """
 
+# Excel and html files are kept for manual conversion/check
+ext = ['.xlsx', '.xls', '.pdf', ".htm", ".html"]
+supported_formats = [
+    ".pdf", ".doc", ".docx", ".docx-bestand", ".htm", ".html", ".png", ".jpg", ".jpeg", ".gif", ".tiff",
+    ".csv", ".uos", ".xls", ".xlsx", ".xml", ".xlt", ".dif", ".dbf", ".slk", ".xlsm",
+    ".ppt", ".pptx", ".dotx", ".fodp", ".fods", ".fodt", ".odt", ".jfif",
+    ".odb", ".odf", ".odg", ".odm", ".odp", ".ods", ".otg", ".otp", ".ots", ".ott",
+    ".oxt", ".psw", ".sda", ".sdc", ".sdd", ".sdp", ".sdw", ".slk", ".smf", ".stc",
+    ".std", ".stw", ".sxc", ".sxg", ".sxi", ".sxm", ".sxw", ".uof", ".uop",
+    ".uos", ".uot", ".vsd", ".vsdx", ".wdb", ".wps", ".wri", ".tsv", ".txt"
+]
+# files that are written to pdf without LibreOffice, see _functions.text_pdf and _functions.image_pdf
+in_process = dict([(extension, tp.text_to_pdf) for extension in tp.TEXT_EXTENSIONS] +
+                  [(extension, ip.image_to_pdf) for extension in ip.IMAGE_EXTENSIONS])
 
-def print_to_pdf(out_dir, file_log, progress, style):
+
+def files_to_print(files, file_log, inventory=None):
     """
-    Converts different file types to pdf
+    Selects the files that can be printed to pdf and flags the files that need a manual check in the log table
 
     Parameters
     ----------
-    out_dir: str
-        The output directory where converted files will be placed
-    file_log: list 
+    files: list
+        The files in the output directory
+    file_log: LogTable
         The logging table
-    progress: Progressbar
-        The progress bar that is updated while running this method
-    style: Style 
-        The progress bar style
+    inventory: Inventory
+        The files in the output directory with their sizes, see _functions.inventory. Default is None to get the sizes
+        from disk
+
+    Returns
+    -------
+    libreoffice_convert: list
+        The files to print to pdf, see print_batch
     """
     libreoffice_convert = []
-    ext = ['.xlsx', '.xls', '.pdf', ".htm", ".html"]
-    supported_formats = [
-        ".pdf", ".doc", ".docx", ".docx-bestand", ".htm", ".html", ".png", ".jpg", ".jpeg", ".gif", ".tiff",
-        ".csv", ".uos", ".xls", ".xlsx", ".xml", ".xlt", ".dif", ".dbf", ".slk", ".xlsm",
-        ".ppt", ".pptx", ".dotx", ".fodp", ".fods", ".fodt", ".odt", ".jfif"
-        ".odb", ".odf", ".odg", ".odm", ".odp", ".ods", ".otg", ".otp", ".ots", ".ott",
-        ".oxt", ".psw", ".sda", ".sdc", ".sdd", ".sdp", ".sdw", ".slk", ".smf", ".stc",
-        ".std", ".stw", ".sxc", ".sxg", ".sxi", ".sxm", ".sxw", ".uof", ".uop",
-        ".uos", ".uot", ".vsd", ".vsdx", ".wdb", ".wps", ".wri", ".tsv", ".txt"
-    ]
-    for root, dirs, files in os.walk(os.path.join(out_dir)):
-        for name in files:
-            name_lower = name.lower()
-            file_path = os.path.join(root, name)
-            if name_lower.endswith(tuple(supported_formats)):
-                if os.path.getsize(file_path) > 1:
-                    libreoffice_convert.append(file_path)
-                else:
-                    logging.error(f'Document is empty: {file_path}')
-                    # print(f'Document is empty: {file_path}')
-
-            # update log table
-            if name_lower.endswith(".xlsx") or name_lower.endswith(".xls") or name_lower.endswith(
-                    ".htm") or name_lower.endswith(".html") or not name_lower.endswith(tuple(supported_formats)):
-                try:
-                    d = next(
-                        item for item in file_log if item['File name'] == file_path)
-                    d['Check'] = True
-                    logging.debug(f'Updating log table for file: {file_path}')
-                except:
-                    logging.error(
-                        f'Failed to update log table for file: {file_path}')
-
-    for file in libreoffice_convert:
-        app = 'soffice.exe'
-        appPath = os.path.join("C:\Program Files\LibreOffice\program", app)
-        commandLine = [app, "--headless", "--convert-to",
-                        "pdf", "--outdir", os.path.dirname(file), file]
-        # Print to pdf
-        if not file.endswith((".pdf",".PDF")):
+    for file_path in files:
+        name_lower = os.path.basename(file_path).lower()
+        if name_lower.endswith(tuple(supported_formats)):
+            if (inventory.size(file_path) if inventory is not None else os.path.getsize(file_path)) > 1:
+                libreoffice_convert.append(file_path)
+            else:
+                logging.error(f'Document is empty: {file_path}')
+                # print(f'Document is empty: {file_path}')
+
+        # update log table
+        if name_lower.endswith(".xlsx") or name_lower.endswith(".xls") or name_lower.endswith(
+                ".htm") or name_lower.endswith(".html") or not name_lower.endswith(tuple(supported_formats)):
             try:
-                subprocess.run(commandLine, executable=appPath, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                stdin=subprocess.PIPE)
-                logging.debug(f'Printing file to PDF: {file}')
+                d = file_log[file_path]
+                d['Check'] = True
+                logging.debug(f'Updating log table for file: {file_path}')
             except:
-                logging.error(f'Failed to print file to PDF: {file}')
+                logging.error(
+                    f'Failed to update log table for file: {file_path}')
+    return libreoffice_convert
 
-            # Update log table
-            if re.search('\d+.txt$', file):
-                file_msg= os.path.dirname(file) + '.msg'      
+
+def make_batches(files, batch_size):
+    """
+    Groups the files that have to be printed by directory into batches of at most batch_size files. Files with the same
+    name but another extension end up in different batches since they are printed to the same pdf. PDF files are not
+    printed and get a batch of their own.
+
+    Parameters
+    ----------
+    files: list
+        The files to print
+    batch_size: int
+        The maximum number of files in a batch
+
+    Returns
+    -------
+    batches: list
+        Lists of files
+    """
+    batches = []
+    open_batches = {}
+    for file in files:
+        if file.endswith((".pdf", ".PDF")) or batch_size <= 1:
+            batches.append([file])
+            continue
+        directory = os.path.dirname(file)
+        stem = os.path.splitext(os.path.basename(file))[0].lower()
+        for batch, stems in open_batches.setdefault(directory, []):
+            if len(batch) < batch_size and stem not in stems:
+                batch.append(file)
+                stems.add(stem)
+                break
+        else:
+            batch = [file]
+            batches.append(batch)
+            open_batches[directory].append((batch, {stem}))
+    return batches
+
+
+def print_batch(files, file_log, converter, lock, inventory=None, index=None):
+    """
+    Prints a batch of files of one directory to pdf with one start of LibreOffice. Files that are not printed in the
+    batch are printed one by one, so one bad file does not stop the others.
+
+    Parameters
+    ----------
+    files: list
+        The files, all in the same directory
+    file_log: LogTable
+        The logging table
+    converter: SofficeConverter or LibreOfficePool
+        Converts the files to pdf, see _functions.libreoffice
+    lock: Lock
+        Held while the log table is updated
+    inventory: Inventory
+        The files in the output directory, updated with the pdfs and removed files, see _functions.inventory. Default
+        is None
+    index: DuplicateIndex
+        The files checked for duplicates, the hash of a file is made before it is removed or written again, see
+        _functions.duplicates. Default is None
+
+    Returns
+    -------
+    done: int
+        The number of processed files
+    """
+    for file in files:
+        # a pdf with the same name may be linked to the selected folder, see _functions.copy_engine
+        if not file.lower().endswith('.pdf'):
+            ce.unshare(os.path.splitext(file)[0] + '.pdf')
+    # text files and images are written to pdf in print_file, without LibreOffice
+    office_files = [file for file in files if os.path.splitext(file)[1].lower() not in in_process]
+    if len(office_files) > 1:
+        converted = converter.convert_batch(office_files)
+        for file in office_files:
+            if not converted[file]:
+                logging.info(f'Not printed in batch, printing file on its own: {file}')
+                converted[file] = converter.convert(file)
+    else:
+        converted = {}
+    for file in files:
+        print_file(file, file_log, converter, lock, converted=converted.get(file), inventory=inventory, index=index)
+    return len(files)
+
+
+def print_file(file, file_log, converter, lock, converted=None, inventory=None, index=None):
+    """
+    Converts one file to pdf and updates the log table
+
+    Parameters
+    ----------
+    file: str
+        The path to the file
+    file_log: LogTable
+        The logging table
+    converter: SofficeConverter or LibreOfficePool
+        Converts the file to pdf, see _functions.libreoffice
+    lock: Lock
+        Held while the log table is updated
+    converted: bool
+        Whether the file is already printed to pdf (in a batch), default is None to print the file here
+    inventory: Inventory
+        The files in the output directory, updated with the pdf and removed file, see _functions.inventory. Default is
+        None
+    index: DuplicateIndex
+        The files checked for duplicates, the hash of a file is made before it is removed or written again, see
+        _functions.duplicates. Default is None
+    """
+    # Print to pdf
+    if file.lower().endswith(".pdf"):
+        converted = True
+        # If already PDF, get rid of any write protections, see _functions.unlock
+        if ul.unlock_pdf(file, index) and inventory is not None:
+            inventory.add(file)
+    else:
+        write_pdf = in_process.get(os.path.splitext(file)[1].lower())
+        if converted is None and write_pdf is not None:
+            # LibreOffice is only started when that fails
+            converted = write_pdf(file) or converter.convert(file)
+        elif converted is None:
+            converted = converter.convert(file)
+        if converted:
+            logging.debug(f'Printing file to PDF: {file}')
+            if inventory is not None:
+                inventory.add(os.path.splitext(file)[0] + '.pdf')
+        else:
+            logging.error(f'Failed to print file to PDF: {file}')
+
+        # Update log table
+        with lock:
+            # the body of an email (from an earlier version) has no record of its own, see _functions.extract_msg
+            if converted and file_log.get(file) is None and re.search(r'\d+\.txt$', file):
+                file_msg= file_log.email_file(os.path.dirname(file))      
                 try:
-                    d = next(item for item in file_log if
-                            item['File name'] == file_msg)
+                    d = file_log[file_msg]
                     d['To PDF'] = True
                     d['Combined'] = True
                     logging.debug(f'Updating log table for supported file: {file_msg}')
                 except Exception as e:
                     logging.error(
                         f'Failed to update log table for supported file: {file_msg}')
-            else:           
+            elif converted:
                 try:
-                    d = next(item for item in file_log if
-                            item['File name'] == file)
+                    d = file_log[file]
                     d['To PDF'] = True
                     d['Combined'] = True
                     logging.debug(f'Updating log table for supported file: {file}')
@@ -97,45 +219,16 @@ def print_to_pdf(out_dir, file_log, progress, style):
                     logging.error(
                         f'Failed to update log table for supported file3: {file}')
 
-            # If already PDF, open with and save with pikepdf to get rid of any write protections
-            if file.endswith((".pdf",".PDF")):
-                # Copy to tempdir since input file cannot be overwritten
-                temp_dir = tempfile.gettempdir()
-                cmd = 'copy "%s" "%s"' % (file, temp_dir)
-                try:
-                    subprocess.call(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                    stdin=subprocess.PIPE)
-                    pdf_file = os.path.join(
-                        temp_dir, os.path.basename(file))  # path to tempfile
-                    pdf = pikepdf.open(pdf_file)  # Open tempfile
-                    if 'Metadata' in pdf.Root.keys():  # if PDF metadata is present, delete it
-                        try:
-                            del pdf.Root.Metadata
-                            logging.debug(f'Deleting metadata from file: {file}')
-                        except:
-                            logging.error(
-                                f'Failed to delete metadata from file: {file}')
-                    pdf.save(file)  # Save processed pdf
-                    logging.debug(f'Resave PDF file: {file}')
-                except:
-                    logging.error(f'Failed to resave PDF file: {file}')
-
-        # Keep Excel and html files since printing these to a suitable layout often requires manual intervention
-        if not file.endswith(tuple(ext)):
-            logging.info(f'Original file to remove: {file}')
-            # Remove input files but keep Excel and html files for manual conversion/check and PDF files
-            try:
-                os.remove(file)
-                logging.debug(f'Removing original file: {file}')
-            except:
-                logging.error(f'Failed to remove original file: {file}')
-
-        # set progress bar max value
-        progress['value'] += 99 / \
-            len(libreoffice_convert) if len(libreoffice_convert) > 0 else 99
-        progress.update()
-        progress.update_idletasks()
-        style.configure(
-            'text.Horizontal.TProgressbar',
-            text='{:.0f} %'.format(progress['value'])
-        )
+    # Keep Excel and html files since printing these to a suitable layout often requires manual intervention
+    if converted and not file.lower().endswith(tuple(ext)):
+        logging.info(f'Original file to remove: {file}')
+        # Remove input files but keep Excel and html files for manual conversion/check and PDF files
+        try:
+            if index is not None:
+                index.seal(file)
+            os.remove(file)
+            if inventory is not None:
+                inventory.remove(file)
+            logging.debug(f'Removing original file: {file}')
+        except:
+            logging.error(f'Failed to remove original file: {file}')
@@ -0,0 +1,106 @@
+import csv
+import json
+import logging
+from openpyxl import Workbook
+import _functions.log_table as log
+
+"""
+This file is a python file that writes the log table to the result files. This file is called from the file _functions.pipeline.
+
+Author: Joana Cardoso
+"""
+
+# the columns of the results file, File name and File are only in the json file
+FIELDNAMES = list(log.FIELDS[2:])
+# the maximum number of rows of an excel sheet
+MAX_ROWS = 1048576
+
+
+def write_json(file_log, json_path):
+    """
+    Writes the log table to a json file (for debugging)
+
+    Parameters
+    ----------
+    file_log: iterable
+        The records of the logging table, e.g. read from the journal
+    json_path: str
+        The path to the json file
+    """
+    try:
+        with open(json_path, 'w') as f:
+            # written one record at a time, so the records do not have to be in memory together
+            f.write('[')
+            for number, record in enumerate(file_log):
+                f.write((', ' if number else '') + json.dumps(dict(record)))
+            f.write(']')
+            logging.debug(f'Making json table {json_path}')
+    except:
+        logging.debug(f'Failed to make json table {json_path}')
+
+
+def result_rows(file_log):
+    """
+    Yields the rows of the results file: the records without the columns File name and File and with Y/N for the flags
+
+    Parameters
+    ----------
+    file_log: iterable
+        The records of the logging table
+    """
+    for record in file_log:
+        yield ["Y" if record[k] is True else "N" if record[k] is False else record[k] for k in FIELDNAMES]
+
+
+def write_excel(file_log, table_path, max_rows=MAX_ROWS):
+    """
+    Writes the log table to an excel file (for end-user), the rows are written one at a time. When a sheet is full
+    the rows go on in a next sheet (Results 2, Results 3, ...).
+
+    Parameters
+    ----------
+    file_log: iterable
+        The records of the logging table, e.g. read from the journal
+    table_path: str
+        The path to the excel file
+    max_rows: int
+        The maximum number of rows of a sheet, including the header. Default is the maximum of excel
+    """
+    try:
+        wb = Workbook(write_only=True)
+        sheet = None
+        rows = 0
+        for row in result_rows(file_log):
+            if sheet is None or rows == max_rows:
+                sheet = wb.create_sheet('Results' if sheet is None else f'Results {len(wb.worksheets) + 1}')
+                sheet.append(FIELDNAMES)
+                rows = 1
+            sheet.append(row)
+            rows += 1
+        if sheet is None:
+            wb.create_sheet('Results').append(FIELDNAMES)
+        wb.save(table_path)
+        logging.debug(f'Making log table {table_path}')
+    except:
+        logging.error(f'Failed to make log table: {table_path}')
+
+
+def write_csv(file_log, table_path):
+    """
+    Writes the log table to a csv file (for end-user), for runs that are too large for excel
+
+    Parameters
+    ----------
+    file_log: iterable
+        The records of the logging table, e.g. read from the journal
+    table_path: str
+        The path to the csv file
+    """
+    try:
+        with open(table_path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(FIELDNAMES)
+            writer.writerows(result_rows(file_log))
+        logging.debug(f'Making log table {table_path}')
+    except:
+        logging.error(f'Failed to make log table: {table_path}')
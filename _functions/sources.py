@@ -0,0 +1,204 @@
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+import _functions.check_length as cl
+import _functions.inventory as inv
+import _functions.manifest as mf
+import _functions.unzip_files as uz
+
+"""
+This file is a python file that gives the pipeline the files of the selected folder or zip file. This file is called
+from the file _functions.pipeline.
+
+The files of a zip file are not unzipped first: they get a path in process_dir (the zip file path without .zip, which
+does not exist on disk) and are read from the zip file when they are copied to the output directory, so every file is
+written once. Zip files in the zip file are kept in memory during the run, together at most NESTED_IN_MEMORY bytes
+of _functions.unzip_files, the others are written to a temporary file.
+
+Author: Joana Cardoso
+"""
+
+
+class FolderSource:
+    """
+    The files of a selected folder, on disk
+    """
+    virtual = False
+
+    def __init__(self, process_dir):
+        """
+        Parameters
+        ----------
+        process_dir: str
+            The directory of the selected folder
+        """
+        self.process_dir = process_dir
+        self.sizes = {}
+
+    def walk(self):
+        """
+        Yields (root, dirs, files) for every directory, like os.walk. The sizes of the files are kept, see size
+        """
+        return inv.walk(self.process_dir, self.sizes)
+
+    def size(self, file):
+        """
+        Returns the size of a file found by walk, None if it is not known
+        """
+        return self.sizes.get(file)
+
+    def fingerprint(self, file):
+        """
+        Returns a fingerprint of the content of a file, see _functions.manifest
+        """
+        return mf.fingerprint(file)
+
+    def close(self):
+        pass
+
+
+class ZipSource:
+    """
+    The files of a selected zip file, read from the zip file when they are needed. Can be used from several threads at
+    the same time, every thread reads with its own zip file handle.
+    """
+    virtual = True
+
+    def __init__(self, zip_dir):
+        """
+        Parameters
+        ----------
+        zip_dir: str
+            The path to the selected zip file
+        """
+        self.zip_dir = zip_dir
+        self.process_dir = os.path.abspath(os.path.splitext(zip_dir)[0])
+        self.local = threading.local()
+        self.handles = []
+        self.temp_files = []
+        # the bytes of the zip files in the zip file that are kept in memory
+        self.in_memory = 0
+        # path in process_dir: (archive, zip info), archive is the zip file or a zip file in it
+        self.members = {}
+        self.dirs = {self.process_dir: set()}
+        logging.info(f'Zip_dir: {zip_dir}')
+        logging.info(f'Process_dir: {self.process_dir}')
+        self._add_archive(lambda: zipfile.ZipFile(zip_dir, 'r'), self.process_dir)
+
+    def _add_dir(self, directory):
+        while directory not in self.dirs:
+            self.dirs[directory] = set()
+            parent = os.path.dirname(directory)
+            self.dirs.setdefault(parent, set()).add(directory)
+            directory = parent
+
+    def _add_archive(self, open_zip, proc_dir):
+        """
+        Adds the files of a zip file, zip files in it are added in a directory with the name of the zip file
+        """
+        archive = {'open': open_zip}
+        self._add_dir(proc_dir)
+        with open_zip() as zip_file:
+            for info in zip_file.infolist():
+                des_dir = os.path.join(proc_dir, os.path.dirname(info.filename))
+                self._add_dir(des_dir)
+                filename = os.path.basename(info.filename)
+                if not filename:
+                    continue
+                logging.info(f'Found file {info.filename} in zip directory')
+                file_name = cl.check_length(des_dir=des_dir, file=filename)[0]
+                stem, extension = os.path.splitext(file_name)
+                counter = 1
+                while file_name in self.members:
+                    # shortened names can be the same
+                    file_name = f'{stem}_{counter}{extension}'
+                    counter += 1
+                if filename.lower().endswith('.zip'):
+                    self._add_nested(zip_file, info, os.path.abspath(os.path.splitext(file_name)[0]))
+                    continue
+                self.members[file_name] = (archive, info)
+
+    def _add_nested(self, zip_file, info, proc_dir):
+        try:
+            if self.in_memory + info.file_size <= uz.NESTED_IN_MEMORY:
+                data = zip_file.read(info)
+                self.in_memory += len(data)
+                self._add_archive(lambda: zipfile.ZipFile(io.BytesIO(data), 'r'), proc_dir)
+                return
+            with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as temp_file:
+                self.temp_files.append(temp_file.name)
+                with zip_file.open(info) as source:
+                    shutil.copyfileobj(source, temp_file, uz.CHUNK)
+            self._add_archive(lambda: zipfile.ZipFile(temp_file.name, 'r'), proc_dir)
+        except:
+            logging.error(f'Failed to unzip: {info.filename}')
+
+    def walk(self):
+        """
+        Yields (root, dirs, files) for every directory, like os.walk
+        """
+        files = {}
+        for path in self.members:
+            files.setdefault(os.path.dirname(path), []).append(os.path.basename(path))
+        stack = [self.process_dir]
+        while stack:
+            root = stack.pop()
+            dirs = sorted(self.dirs.get(root, ()))
+            yield root, [os.path.basename(d) for d in dirs], sorted(files.get(root, []))
+            stack.extend(reversed(dirs))
+
+    def size(self, file):
+        """
+        Returns the size of a file of the zip file
+        """
+        return self.members[file][1].file_size
+
+    def fingerprint(self, file):
+        """
+        Returns a fingerprint of the content of a file from the zip file: the size, the crc and the time
+        """
+        info = self.members[file][1]
+        return f'{info.file_size}:{info.CRC}:{info.date_time}'
+
+    def extract(self, file, target):
+        """
+        Writes a file of the zip file to target in chunks
+
+        Parameters
+        ----------
+        file: str
+            The path of the file in process_dir
+        target: str
+            The path to write to
+
+        Returns
+        -------
+        size: int
+            The number of bytes written
+        """
+        archive, info = self.members[file]
+        handles = getattr(self.local, 'handles', None)
+        if handles is None:
+            handles = self.local.handles = {}
+        if id(archive) not in handles:
+            handles[id(archive)] = archive['open']()
+            self.handles.append(handles[id(archive)])
+        with handles[id(archive)].open(info) as source, open(target, 'wb') as output:
+            shutil.copyfileobj(source, output, uz.CHUNK)
+        return info.file_size
+
+    def close(self):
+        """
+        Closes the zip file handles and removes the temporary files
+        """
+        for handle in self.handles:
+            handle.close()
+        for temp_file in self.temp_files:
+            try:
+                os.remove(temp_file)
+            except OSError:
+                logging.error(f'Failed to remove temporary file: {temp_file}')
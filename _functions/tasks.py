@@ -0,0 +1,155 @@
+import collections
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+This file is a python file that runs the steps of the conversion as a graph of tasks. A task starts as soon as the tasks
+it depends on are finished, so files move on to their next step without waiting for all other files. This file is
+called from the file _functions.pipeline.
+
+Every task runs on a named pool of threads (e.g. one thread for Outlook, several for LibreOffice). A pool only gets as
+many tasks as it has threads, the other ready tasks wait in the graph, so a run that is stopped only waits for the
+running tasks. The callback on_done of a task runs on the thread that runs the graph and may add new tasks.
+
+Author: Joana Cardoso
+"""
+
+
+class Task:
+    """
+    One step of the conversion
+
+    Attributes
+    ----------
+    name: str
+        The name of the task, used in the logging
+    result: object
+        The return value of the function, None if the function failed
+    error: Exception
+        The exception raised by the function, None if the function succeeded
+    """
+
+    def __init__(self, name, pool, func, args, on_done):
+        self.name = name
+        self.pool = pool
+        self.func = func
+        self.args = args
+        self.on_done = on_done
+        self.waiting = 0
+        self.dependents = []
+        self.finished = False
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args)
+        except Exception as e:
+            logging.exception(f'Task failed: {self.name}')
+            self.error = e
+        return self
+
+
+class TaskGraph:
+    """
+    Runs tasks on pools of threads in the order of their dependencies
+    """
+
+    def __init__(self, pools):
+        """
+        Parameters
+        ----------
+        pools: dict
+            The number of threads per pool name
+        """
+        self.pools = pools
+        self.executors = {}
+        # pool name: the ready tasks that are not given to the pool yet and the number of tasks it is running
+        self.ready = {}
+        self.running = {}
+        self.finished = queue.Queue()
+        self.pending = 0
+
+    def add(self, name, pool, func, *args, after=(), on_done=None):
+        """
+        Adds a task to the graph, it is started when all tasks in after are finished
+
+        Parameters
+        ----------
+        name: str
+            The name of the task
+        pool: str
+            The pool that runs the task, None for a task without function that only joins other tasks
+        func: callable
+            The function to run, called with args
+        after: list
+            The tasks that have to be finished first
+        on_done: callable
+            Called with the task when it is finished, on the thread that runs the graph
+
+        Returns
+        -------
+        task: Task
+            The new task
+        """
+        task = Task(name, pool, func, args, on_done)
+        self.pending += 1
+        for dependency in after:
+            if not dependency.finished:
+                task.waiting += 1
+                dependency.dependents.append(task)
+        if task.waiting == 0:
+            self._start(task)
+        return task
+
+    def _start(self, task):
+        if task.func is None:
+            self.finished.put(task)
+            return
+        self.ready.setdefault(task.pool, collections.deque()).append(task)
+        self._submit(task.pool)
+
+    def _submit(self, pool):
+        """
+        Gives ready tasks to a pool until all its threads are busy
+        """
+        size = max(1, self.pools.get(pool, 1))
+        if pool not in self.executors:
+            self.executors[pool] = ThreadPoolExecutor(max_workers=size, thread_name_prefix=pool)
+        ready = self.ready[pool]
+        while ready and self.running.get(pool, 0) < size:
+            task = ready.popleft()
+            self.running[pool] = self.running.get(pool, 0) + 1
+            future = self.executors[pool].submit(task.run)
+            future.add_done_callback(lambda f, task=task: self.finished.put(task))
+
+    def run(self):
+        """
+        Runs the tasks until all tasks, also the ones added while running, are finished
+
+        Yields
+        ------
+        task: Task
+            Every task when it is finished
+        """
+        try:
+            while self.pending:
+                task = self.finished.get()
+                task.finished = True
+                self.pending -= 1
+                if task.func is not None:
+                    self.running[task.pool] -= 1
+                    self._submit(task.pool)
+                if task.on_done is not None:
+                    task.on_done(task)
+                for dependent in task.dependents:
+                    dependent.waiting -= 1
+                    if dependent.waiting == 0:
+                        self._start(dependent)
+                yield task
+        finally:
+            # when the run is stopped, the tasks that did not start yet are dropped
+            self.ready.clear()
+            for executor in self.executors.values():
+                executor.shutdown(wait=True)
@@ -0,0 +1,172 @@
+import csv
+import io
+import logging
+import os
+import textwrap
+import pikepdf
+
+"""
+This file is a python file that writes text to pdf without LibreOffice: email bodies and TXT, CSV and TSV files. This
+file is called from the files _functions.extract_msg, _functions.extract_eml and _functions.print.
+
+The text is written in Courier (a font every pdf reader has, so it is not embedded) on A4 pages. Every character has
+the same width, so lines are wrapped by counting characters and the columns of CSV and TSV files stay aligned. The
+pdf has no dates in it, so the same text gives the same pdf (and is found as duplicate). Courier only has the
+characters of windows-1252, text with other characters (e.g. Polish, Cyrillic or Chinese) is left to LibreOffice.
+
+Author: Joana Cardoso
+"""
+
+TEXT_EXTENSIONS = ('.txt', '.csv', '.tsv')
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 56
+FONT_SIZE = 10
+LEADING = 12
+# Courier characters are 0.6 times the font size wide
+COLUMNS = int((PAGE_WIDTH - 2 * MARGIN) / (0.6 * FONT_SIZE))
+ROWS = int((PAGE_HEIGHT - 2 * MARGIN) / LEADING)
+# the maximum width of a column of a CSV or TSV file, longer cells push the next columns to the right
+MAX_COLUMN_WIDTH = 30
+
+
+def wrap(lines, columns=COLUMNS):
+    """
+    Yields the lines wrapped to columns characters, tabs are expanded and empty lines are kept
+    """
+    for line in lines:
+        line = line.expandtabs(8).rstrip()
+        if len(line) <= columns:
+            yield line
+            continue
+        yield from textwrap.wrap(line, columns, replace_whitespace=False, break_on_hyphens=False) or ['']
+
+
+def _escape(line):
+    # raises UnicodeEncodeError for characters Courier does not have (e.g. Cyrillic or Chinese)
+    data = line.encode('cp1252')
+    data = bytes(byte if byte >= 32 else 32 for byte in data)
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _page(pdf, font, lines):
+    content = [b'BT /F1 %d Tf %d TL %d %d Td' % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN - FONT_SIZE)]
+    for line in lines:
+        content.append(b'(' + _escape(line) + b') Tj T*')
+    content.append(b'ET')
+    page = pikepdf.Dictionary(
+        Type=pikepdf.Name.Page,
+        MediaBox=[0, 0, PAGE_WIDTH, PAGE_HEIGHT],
+        Resources=pikepdf.Dictionary(Font=pikepdf.Dictionary(F1=font)),
+        Contents=pdf.make_stream(b'\n'.join(content)),
+    )
+    pdf.pages.append(pikepdf.Page(page))
+
+
+def write_pdf(lines, pdf_path):
+    """
+    Writes lines of text to a pdf, long lines are wrapped and a new page is started every ROWS lines. Raises
+    UnicodeEncodeError when the text has characters that are not in windows-1252, then nothing is written
+
+    Parameters
+    ----------
+    lines: iterable
+        The lines of text, without line breaks
+    pdf_path: str
+        The path to the pdf
+    """
+    pdf = pikepdf.new()
+    font = pdf.make_indirect(pikepdf.Dictionary(Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1,
+                                                BaseFont=pikepdf.Name.Courier,
+                                                Encoding=pikepdf.Name.WinAnsiEncoding))
+    page_lines = []
+    for line in wrap(lines):
+        page_lines.append(line)
+        if len(page_lines) == ROWS:
+            _page(pdf, font, page_lines)
+            page_lines = []
+    if page_lines or not len(pdf.pages):
+        _page(pdf, font, page_lines)
+    pdf.save(pdf_path, deterministic_id=True)
+
+
+def email_lines(msg):
+    """
+    Yields the lines of an email: the sender, date, receivers and subject and then the body
+
+    Parameters
+    ----------
+    msg: object
+        The email, with the attributes SenderName, SentOn, To, CC, Subject and Body like in Outlook
+    """
+    yield 'From:          ' + msg.SenderName
+    yield 'Date:    ' + str(msg.SentOn)
+    yield 'To:          ' + msg.To
+    yield 'CC:           ' + msg.CC
+    yield 'Subject:    ' + msg.Subject
+    yield ''
+    yield from msg.Body.splitlines()
+
+
+def table_lines(text, delimiter):
+    """
+    Yields the rows of a CSV or TSV file with the columns aligned
+    """
+    rows = list(csv.reader(io.StringIO(text), delimiter=delimiter))
+    widths = {}
+    for row in rows:
+        for number, cell in enumerate(row):
+            widths[number] = min(MAX_COLUMN_WIDTH, max(widths.get(number, 0), len(cell)))
+    for row in rows:
+        yield '  '.join(cell.ljust(widths[number]) for number, cell in enumerate(row))
+
+
+def read_text(file):
+    """
+    Returns the text of a file, read as utf-8 or else as windows-1252
+    """
+    with open(file, 'rb') as f:
+        data = f.read()
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return data.decode('cp1252', 'replace')
+
+
+def text_to_pdf(file):
+    """
+    Writes a TXT, CSV or TSV file to a pdf with the same name, files with characters that are not in windows-1252 are
+    not written (they are printed by LibreOffice)
+
+    Parameters
+    ----------
+    file: str
+        The path to the file
+
+    Returns
+    -------
+    converted: bool
+        Whether the pdf was written
+    """
+    try:
+        text = read_text(file)
+        extension = os.path.splitext(file)[1].lower()
+        if extension == '.tsv':
+            lines = table_lines(text, '\t')
+        elif extension == '.csv':
+            try:
+                delimiter = csv.Sniffer().sniff(text[:4096], delimiters=',;\t|').delimiter
+            except csv.Error:
+                delimiter = ','
+            lines = table_lines(text, delimiter)
+        else:
+            lines = text.splitlines()
+        write_pdf(lines, os.path.splitext(file)[0] + '.pdf')
+        logging.debug(f'Writing text file to PDF: {file}')
+        return True
+    except UnicodeEncodeError:
+        logging.info(f'Text file has characters that are not in Courier, printed by LibreOffice: {file}')
+        return False
+    except:
+        logging.error(f'Failed to write text file to PDF: {file}')
+        return False
@@ -0,0 +1,75 @@
+import logging
+import os
+import tempfile
+import pikepdf
+
+"""
+This file is a python file that removes write protections and metadata from pdf files. This file is called from the
+file _functions.print.
+
+A pdf is only written again when it has to change: when it is encrypted (e.g. with permissions that forbid editing or
+printing) or has XMP metadata. It is written to a temporary file next to it which then replaces it, so the pdf is never
+half written and a pdf linked to the selected folder (see _functions.copy_engine) is not changed.
+
+Author: Joana Cardoso
+"""
+
+
+def changes(pdf):
+    """
+    Returns what has to change in an open pdf, an empty list when it can be left as it is
+
+    Parameters
+    ----------
+    pdf: Pdf
+        The pdf opened with pikepdf
+    """
+    found = []
+    if pdf.is_encrypted:
+        found.append('encryption')
+    if '/Metadata' in pdf.Root:
+        found.append('metadata')
+    return found
+
+
+def unlock_pdf(file, index=None):
+    """
+    Removes the encryption (write protections) and XMP metadata of a pdf, pdfs without them are not written
+
+    Parameters
+    ----------
+    file: str
+        The path to the pdf
+    index: DuplicateIndex
+        The files checked for duplicates, the hash of a file is made before it is written again, see
+        _functions.duplicates. Default is None
+
+    Returns
+    -------
+    changed: bool
+        Whether the pdf was written again
+    """
+    temp_file = None
+    try:
+        with pikepdf.open(file) as pdf:
+            found = changes(pdf)
+            if not found:
+                logging.debug(f'PDF file has no write protections or metadata: {file}')
+                return False
+            if 'metadata' in found:
+                del pdf.Root.Metadata
+                logging.debug(f'Deleting metadata from file: {file}')
+            # a temporary file of its own next to the pdf, pdfs with the same name in other folders do not collide
+            handle, temp_file = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(file))
+            os.close(handle)
+            pdf.save(temp_file, encryption=False)
+        if index is not None:
+            index.seal(file)
+        os.replace(temp_file, file)
+        logging.debug(f'Resave PDF file: {file}')
+        return True
+    except:
+        logging.error(f'Failed to resave PDF file: {file}')
+        if temp_file is not None and os.path.exists(temp_file):
+            os.remove(temp_file)
+        return False
@@ -1,6 +1,11 @@
+import io
 import logging
 import os
+import shutil
+import tempfile
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import _functions.check_length as cl
 
@@ -10,10 +15,31 @@ import _functions.check_length as cl
     Author: Joana Cardoso
 """
 
+CHUNK = 1024 * 1024
+# sub-zips up to this size are unzipped from memory
+NESTED_IN_MEMORY = 64 * 1024 * 1024
 
-def unzip_files(zip_dir, proc_dir):
+
+def _extract_member(open_zip, handles, local, info, file_name):
+    """
+    Streams one member of the zip file to disk in chunks, with a zip file handle of its own per thread
     """
-    Unzips files and saves the unzipped files in a new directory
+    if not hasattr(local, 'zip_file'):
+        local.zip_file = open_zip()
+        handles.append(local.zip_file)
+    try:
+        with local.zip_file.open(info) as source, open(file_name, 'wb') as output:
+            shutil.copyfileobj(source, output, CHUNK)
+        logging.debug(f'Unzipping file: {info.filename}')
+    except:
+        logging.error(f'Failed to unzip: {info.filename}')
+
+
+def unzip_files(zip_dir, proc_dir, workers=None):
+    """
+    Unzips files and saves the unzipped files in a new directory. The files are written in chunks, so large files do
+    not have to fit in memory, and several files are unzipped at the same time. Zip files in the zip file are unzipped
+    too, without writing them to the new directory first.
 
     Parameters
     ----------
@@ -21,14 +47,26 @@ def unzip_files(zip_dir, proc_dir):
         The path to the selected zip file
     proc_dir: str 
         The directory of the unzipped folder
+    workers: int
+        The number of files unzipped at the same time, default is the number of processors
     """
     
     logging.info(f'Started unzipping folder: {zip_dir}')
     logging.info(f'Zip directory: {zip_dir}')
     logging.info(f'Process directory: {proc_dir}')
+    _unzip(lambda: zipfile.ZipFile(zip_dir, 'r'), proc_dir, workers)
+
 
-    with zipfile.ZipFile(zip_dir, 'r') as zip_file:
-        for file in zip_file.namelist():
+def _unzip(open_zip, proc_dir, workers):
+    """
+    Unzips the zip file opened by open_zip, which returns a new handle every time it is called
+    """
+    # the names are chosen one by one first, so shortened names that are the same get a number
+    members = []
+    nested = []
+    with open_zip() as zip_file:
+        for info in zip_file.infolist():
+            file = info.filename
             filename = os.path.basename(file)
             logging.info(f'Found file {file} in zip directory')
             des_dir = os.path.join(proc_dir, os.path.dirname(file))
@@ -41,32 +79,45 @@ def unzip_files(zip_dir, proc_dir):
                 logging.error(f'Failed to create unzip directory: {des_dir}')
             if not filename:
                 continue
-            else:
-                file_name = cl.check_length(des_dir=des_dir, file=filename)[0]
-                try:
-                    data = zip_file.read(file)
-                    # exporting to given location one by one
-                    output = open(file_name, 'wb')
-                    output.write(data)
-                    output.close()
-                    logging.debug(f'Unzipping file: {filename}')
-                except:
-                    logging.error(f'Failed to unzip: {filename}')
+            file_name = cl.check_length(des_dir=des_dir, file=filename)[0]
+            if filename.lower().endswith('.zip'):
+                nested.append((info, os.path.abspath(os.path.splitext(file_name)[0])))
+                continue
+            try:
+                # reserve the name
+                open(file_name, 'wb').close()
+            except:
+                logging.error(f'Failed to unzip: {filename}')
+                continue
+            members.append((info, file_name))
 
-                # Call function recursively untill all zip files are extracted
-                if filename.endswith('.zip'):
-                    logging.info(f'Sub-zip filename: {filename}')
-                    new_zip_dir = os.path.join(des_dir, filename)
-                    new_proc_dir = os.path.abspath(
-                        os.path.splitext(new_zip_dir)[0])
-                    logging.info(f'new_zip_dir: {new_zip_dir}')
-                    logging.info(f'new_proc_dir: {new_proc_dir}')
+    handles = []
+    local = threading.local()
+    with ThreadPoolExecutor(max_workers=max(1, workers or os.cpu_count() or 1)) as executor:
+        for info, file_name in members:
+            executor.submit(_extract_member, open_zip, handles, local, info, file_name)
+    for handle in handles:
+        handle.close()
 
-                    logging.info('Recursive')
-                    unzip_files(zip_dir=new_zip_dir, proc_dir=new_proc_dir)
-                    try:
-                        os.remove(new_zip_dir)
-                        logging.debug(f'Removed zip: {new_zip_dir}')
-                    except:
-                        logging.debug(f'Failed to remove zip: {new_zip_dir}')
-    zip_file.close()
+    # Call function recursively untill all zip files are extracted
+    for info, new_proc_dir in nested:
+        logging.info(f'Sub-zip filename: {info.filename}')
+        logging.info(f'new_proc_dir: {new_proc_dir}')
+        logging.info('Recursive')
+        try:
+            with open_zip() as zip_file:
+                if info.file_size <= NESTED_IN_MEMORY:
+                    data = zip_file.read(info)
+                    logging.debug(f'Unzipping sub-zip in memory: {info.filename}')
+                    _unzip(lambda: zipfile.ZipFile(io.BytesIO(data), 'r'), new_proc_dir, workers)
+                    continue
+                # too large for memory, the sub-zip is written to a temporary file instead of the new directory
+                with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as temp_file:
+                    with zip_file.open(info) as source:
+                        shutil.copyfileobj(source, temp_file, CHUNK)
+            try:
+                _unzip(lambda: zipfile.ZipFile(temp_file.name, 'r'), new_proc_dir, workers)
+            finally:
+                os.remove(temp_file.name)
+        except:
+            logging.error(f'Failed to unzip: {info.filename}')
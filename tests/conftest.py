@@ -0,0 +1,49 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import _functions.libreoffice as lo
+import _functions.pipeline as pl
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+@pytest.fixture
+def make_options(tmp_path):
+    """
+    Returns a function that makes the options of a run that uses the fake LibreOffice pool and keeps the cache, the
+    history and the logs in tmp_path
+    """
+    pools = []
+
+    def make(**settings):
+        if 'converter' not in settings:
+            settings['converter'] = lo.LibreOfficePool(size=2, fake=True)
+            pools.append(settings['converter'])
+        settings.setdefault('workers', 2)
+        settings.setdefault('json_log', str(tmp_path / 'log.json'))
+        settings.setdefault('cache_dir', str(tmp_path / 'cache'))
+        settings.setdefault('history_path', str(tmp_path / 'history.sqlite'))
+        settings.setdefault('msg_backend', 'python')
+        return pl.ConvertOptions(**settings)
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def run(source, options):
+    """
+    Runs a conversion and returns it with its records by file name
+    """
+    conversion = pl.convert(str(source), options)
+    records = {record['File name']: record for record in conversion}
+    return conversion, records
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
@@ -0,0 +1,188 @@
+import datetime
+import os
+import struct
+
+"""
+This file is a python file that writes the MSG files in this folder, which are used by tests/test_msg_file.py. Run it
+with `python tests/fixtures/make_msg.py` when the files have to change.
+
+The compound files are written as simply as possible: all sectors are 512 bytes, streams smaller than 4096 bytes are
+in the mini stream and the entries of a storage are a chain of right siblings.
+
+- unicode.msg: unicode properties, an attachment in the mini stream, a large attachment and an attached email with an
+  attachment of its own
+- ansi.msg: 8 bit properties in code page 1251 (with internet code page 65001) and a html body without plain body
+
+Author: Joana Cardoso
+"""
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+SECTOR = 512
+MINI_SECTOR = 64
+MINI_CUTOFF = 4096
+END_OF_CHAIN = 0xFFFFFFFE
+FREE_SECTOR = 0xFFFFFFFF
+FAT_SECTOR = 0xFFFFFFFD
+NO_STREAM = 0xFFFFFFFF
+SENT = datetime.datetime(2023, 5, 4, 10, 20, 30, tzinfo=datetime.timezone.utc)
+LARGE = bytes(range(256)) * 40
+
+
+def _sectors(size):
+    return (size + SECTOR - 1) // SECTOR
+
+
+def write_compound_file(path, tree):
+    """
+    Writes a compound file, tree is a dict of names with bytes (streams) or dicts (storages)
+    """
+    entries = []
+
+    def add(name, node):
+        number = len(entries)
+        if isinstance(node, dict):
+            entries.append([name, 1, [], None])
+            entries[number][2] = [add(key, value) for key, value in node.items()]
+        else:
+            entries.append([name, 2, [], node])
+        return number
+
+    add('Root Entry', tree)
+    entries[0][1] = 5
+    mini, mini_fat, starts = bytearray(), [], {}
+    for number, (name, kind, children, data) in enumerate(entries):
+        if kind == 2 and len(data) < MINI_CUTOFF:
+            count = (len(data) + MINI_SECTOR - 1) // MINI_SECTOR
+            starts[number] = len(mini_fat) if count else END_OF_CHAIN
+            mini_fat += [len(mini_fat) + k + 1 if k < count - 1 else END_OF_CHAIN for k in range(count)]
+            mini += data + b'\0' * (count * MINI_SECTOR - len(data))
+    large = [number for number, entry in enumerate(entries) if entry[1] == 2 and len(entry[3]) >= MINI_CUTOFF]
+    directory_sectors = _sectors(len(entries) * 128)
+    mini_fat_sectors = _sectors(len(mini_fat) * 4)
+    mini_sectors = _sectors(len(mini))
+    data_sectors = directory_sectors + mini_fat_sectors + mini_sectors + \
+        sum(_sectors(len(entries[number][3])) for number in large)
+    fat_sectors = 1
+    while (data_sectors + fat_sectors + 127) // 128 > fat_sectors:
+        fat_sectors += 1
+    fat = [FREE_SECTOR] * (fat_sectors * 128)
+    fat[:fat_sectors] = [FAT_SECTOR] * fat_sectors
+    position = fat_sectors
+
+    def chain(count):
+        nonlocal position
+        if not count:
+            return END_OF_CHAIN
+        first = position
+        for k in range(count):
+            fat[position + k] = position + k + 1 if k < count - 1 else END_OF_CHAIN
+        position += count
+        return first
+
+    directory_start = chain(directory_sectors)
+    mini_fat_start = chain(mini_fat_sectors)
+    mini_start = chain(mini_sectors)
+    for number in large:
+        starts[number] = chain(_sectors(len(entries[number][3])))
+
+    directory = bytearray(directory_sectors * SECTOR)
+    for number, (name, kind, children, data) in enumerate(entries):
+        offset = number * 128
+        encoded = name.encode('utf-16-le') + b'\0\0'
+        directory[offset:offset + len(encoded)] = encoded
+        struct.pack_into('<HBB', directory, offset + 0x40, len(encoded), kind, 1)
+        struct.pack_into('<III', directory, offset + 0x44, NO_STREAM, NO_STREAM,
+                         children[0] if children else NO_STREAM)
+        if number == 0:
+            start, size = (mini_start if mini else END_OF_CHAIN), len(mini)
+        elif kind == 2:
+            start, size = starts[number], len(data)
+        else:
+            start, size = 0, 0
+        struct.pack_into('<IQ', directory, offset + 0x74, start, size)
+    for name, kind, children, data in entries:
+        for child, sibling in zip(children, children[1:]):
+            struct.pack_into('<I', directory, child * 128 + 0x48, sibling)
+    for number in range(len(entries), directory_sectors * 4):
+        struct.pack_into('<III', directory, number * 128 + 0x44, NO_STREAM, NO_STREAM, NO_STREAM)
+
+    header = bytearray(SECTOR)
+    header[:8] = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+    struct.pack_into('<HHHHH', header, 0x18, 0x3E, 3, 0xFFFE, 9, 6)
+    struct.pack_into('<IIII', header, 0x2C, fat_sectors, directory_start, 0, MINI_CUTOFF)
+    struct.pack_into('<IIII', header, 0x3C, mini_fat_start, mini_fat_sectors, END_OF_CHAIN, 0)
+    struct.pack_into('<109I', header, 0x4C, *(list(range(fat_sectors)) + [FREE_SECTOR] * (109 - fat_sectors)))
+    packed_mini_fat = struct.pack('<%dI' % len(mini_fat), *mini_fat)
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(struct.pack('<%dI' % len(fat), *fat))
+        f.write(directory)
+        f.write(packed_mini_fat + b'\xff' * (mini_fat_sectors * SECTOR - len(packed_mini_fat)))
+        f.write(mini + b'\0' * (mini_sectors * SECTOR - len(mini)))
+        for number in large:
+            data = entries[number][3]
+            f.write(data + b'\0' * (_sectors(len(data)) * SECTOR - len(data)))
+
+
+def properties(header_size, items):
+    """
+    Returns a properties stream, items are (type, property id, 8 bytes value)
+    """
+    data = bytearray(header_size)
+    for kind, prop_id, value in items:
+        data += struct.pack('<HHI', kind, prop_id, 6) + value
+    return bytes(data)
+
+
+def filetime(moment):
+    return struct.pack('<Q', int((moment - datetime.datetime(1601, 1, 1, tzinfo=datetime.timezone.utc))
+                                 .total_seconds() * 10 ** 7))
+
+
+def long(value):
+    return struct.pack('<Q', value)
+
+
+def string(prop_id, value, codepage=None):
+    """
+    Returns the stream name and data of a unicode string property, or a 8 bit one in codepage
+    """
+    if codepage is None:
+        return '__substg1.0_%04X001F' % prop_id, value.encode('utf-16-le')
+    return '__substg1.0_%04X001E' % prop_id, value.encode(codepage)
+
+
+def message(header_size, strings, attachments=(), fixed=(), codepage=None):
+    """
+    Returns the storage of an email, attachments are (name, bytes) or (name, storage of an attached email)
+    """
+    storage = {'__properties_version1.0': properties(header_size, [(0x40, 0x39, filetime(SENT))] + list(fixed))}
+    storage.update(string(prop_id, value, codepage) for prop_id, value in strings)
+    for number, (name, data) in enumerate(attachments):
+        if isinstance(data, dict):
+            attachment = {'__properties_version1.0': properties(8, [(3, 0x3705, long(5))]),
+                          '__substg1.0_3701000D': data}
+            attachment.update([string(0x3001, name, codepage)])
+        else:
+            attachment = {'__properties_version1.0': properties(8, [(3, 0x3705, long(1))]),
+                          '__substg1.0_37010102': data}
+            attachment.update([string(0x3707, name, codepage)])
+        storage['__attach_version1.0_#%08X' % number] = attachment
+    return storage
+
+
+def main():
+    nested = message(24, [(0x37, 'Forwarded'), (0x0C1A, 'Dennis'), (0x0E04, 'Joana'), (0x1000, 'Inner body')],
+                     [('notes.txt', b'inner attachment')])
+    write_compound_file(os.path.join(FIXTURES, 'unicode.msg'), message(
+        32, [(0x37, 'Łódź report'), (0x0C1A, 'Joana Cardoso'), (0x0E04, 'Dennis; Yilong'), (0x0E03, 'Zoë'),
+             (0x1000, 'Dear all,\r\n\r\nSee the report from Łódź.')],
+        [('report.docx', b'small attachment'), ('large.bin', LARGE), ('Forwarded', nested)]))
+    ansi = message(32, [(0x37, 'Привет'), (0x0C1A, 'Иван'), (0x0E04, 'Joana')], [('отчёт.docx', b'attachment')],
+                   fixed=[(3, 0x3FFD, long(1251)), (3, 0x3FDE, long(65001))], codepage='cp1251')
+    ansi['__substg1.0_10130102'] = '<p>Hello <b>wörld</b></p>'.encode('utf-8')
+    write_compound_file(os.path.join(FIXTURES, 'ansi.msg'), ansi)
+
+
+if __name__ == '__main__':
+    main()
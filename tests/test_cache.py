@@ -0,0 +1,47 @@
+import threading
+import _functions.cache as cache
+from conftest import write
+
+
+class PdfWriter:
+    """
+    Writes an empty pdf for every file
+    """
+
+    def convert(self, file):
+        write_pdf(file)
+        return True
+
+    def convert_batch(self, files):
+        return {file: self.convert(file) for file in files}
+
+    def close(self):
+        pass
+
+
+def write_pdf(file):
+    with open(file.rsplit('.', 1)[0] + '.pdf', 'wb') as f:
+        f.write(b'%PDF-1.4\n%%EOF\n')
+
+
+def test_counts_from_threads(tmp_path):
+    converter = cache.CachedConverter(PdfWriter(), str(tmp_path / 'cache'))
+    files = [str(write(tmp_path / str(thread) / f'{number}.docx', b'same document %d' % (number % 5)))
+             for thread in range(8) for number in range(20)]
+
+    def convert(thread):
+        for number in range(20):
+            if number % 2:
+                converter.convert(files[thread * 20 + number])
+            else:
+                converter.convert_batch([files[thread * 20 + number]])
+
+    threads = [threading.Thread(target=convert, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    converter.close()
+    assert converter.hits + converter.misses == len(files)
+    # 5 different documents, the same document can be converted by several threads at the same time
+    assert converter.hits >= len(files) - 5 * 8
@@ -0,0 +1,34 @@
+import os
+import stat
+import pytest
+import _functions.copy_engine as ce
+from conftest import write
+
+
+def test_copy_file(tmp_path):
+    data = os.urandom(3 * ce.CHUNK + 5)
+    src = write(tmp_path / 'a.docx', data)
+    assert ce.copy_file(str(src), str(tmp_path / 'b.docx')) == len(data)
+    assert (tmp_path / 'b.docx').read_bytes() == data
+
+
+def test_copy_over_link(tmp_path):
+    src = write(tmp_path / 'a.pdf', b'original')
+    other = write(tmp_path / 'b.pdf', b'other')
+    os.link(str(src), str(tmp_path / 'c.pdf'))
+    # the link is replaced, the file it is linked to stays the same
+    ce.copy_file(str(other), str(tmp_path / 'c.pdf'))
+    assert (tmp_path / 'c.pdf').read_bytes() == b'other'
+    assert src.read_bytes() == b'original'
+
+
+@pytest.mark.skipif(os.name != 'nt', reason='read-only attributes are only copied on windows')
+def test_read_only_file(tmp_path):
+    src = write(tmp_path / 'a.docx', b'read-only')
+    os.chmod(str(src), stat.S_IREAD)
+    try:
+        ce.copy_file(str(src), str(tmp_path / 'b.docx'))
+        # the copy can be removed after printing
+        os.remove(str(tmp_path / 'b.docx'))
+    finally:
+        os.chmod(str(src), stat.S_IREAD | stat.S_IWRITE)
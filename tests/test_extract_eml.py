@@ -0,0 +1,102 @@
+import base64
+import os
+import shutil
+import pikepdf
+import _functions.extract_eml as eml
+import _functions.get_files as gf
+import _functions.log_table as log
+from conftest import FIXTURES, write
+
+# see fixtures/nested.eml
+DOCX = bytes(range(200))
+SCAN = b'%PDF-1.4 scan' * 10
+
+
+def extract(tmp_path, source):
+    """
+    Extracts an EML file like _functions.get_files.get_email and returns the log table and the directory of the email
+    """
+    process_dir, out_dir = tmp_path / 'source', tmp_path / 'out'
+    main_email = process_dir / os.path.basename(source)
+    write(main_email, open(source, 'rb').read())
+    file_out = out_dir / main_email.name
+    out_dir.mkdir()
+    shutil.copyfile(str(main_email), str(file_out))
+    file_log = log.LogTable()
+    gf.add_to_log(file_log, str(main_email), str(file_out))
+    eml.extract_eml(str(file_out), str(out_dir), str(main_email), file_log, str(out_dir), str(process_dir))
+    return file_log, out_dir / main_email.stem
+
+
+def text(pdf_path):
+    with pikepdf.open(str(pdf_path)) as pdf:
+        return b''.join(page.Contents.read_bytes() for page in pdf.pages).decode('cp1252')
+
+
+def attachment_names(file_log):
+    return {os.path.basename(record['File name']): record['Attachment name'] for record in file_log
+            if record['Attachment']}
+
+
+def test_nested_email(tmp_path):
+    file_log, new_dir = extract(tmp_path, os.path.join(FIXTURES, 'nested.eml'))
+    body = text(new_dir / '0.pdf')
+    # encoded word, raw utf-8 headers and quoted-printable body, the html alternative is not used
+    assert 'From:          Joãna' in body
+    assert 'Subject:    Verslag café' in body
+    assert 'To:          Dénnis; Yilong' in body
+    assert 'Het verslag van het café zit erbij.' in body
+    assert 'html body' not in body
+    # encoded word and RFC 2231 file names
+    assert attachment_names(file_log) == {'1.docx': 'résumé.docx', '2.txt': 'été.txt', '3.eml': 'Doorgestuurd.eml',
+                                          '6.pdf': 'scan.pdf'}
+    assert (new_dir / '1.docx').read_bytes() == DOCX
+    # a soft line break is joined, the line break before the boundary is not part of the attachment
+    assert (new_dir / '2.txt').read_bytes() == 'été notes with a soft break'.encode('utf-8')
+    # the attached email gets a directory of its own, numbered like an attached outlook email
+    assert 'Inner body' in text(new_dir / '3' / '5.pdf')
+    assert (new_dir / '3' / '6.pdf').read_bytes() == SCAN
+    record = file_log[str(tmp_path / 'out' / 'nested.eml')]
+    assert record['To PDF'] and record['Combined']
+
+
+def test_large_base64_attachment(tmp_path):
+    # more than BASE64_CHUNK characters, so the attachment is decoded in several chunks
+    data = os.urandom(3 * eml.BASE64_CHUNK + 5)
+    encoded = base64.encodebytes(data).replace(b'\n', b'\r\n')
+    source = write(tmp_path / 'large.eml', b'\r\n'.join([
+        b'From: Joana <joana@example.com>',
+        b'Subject: Large',
+        b'Content-Type: multipart/mixed; boundary="b"',
+        b'',
+        b'--b',
+        b'Content-Type: text/plain',
+        b'',
+        b'See attachment',
+        b'--b',
+        b'Content-Type: application/octet-stream; name="data.bin"',
+        b'Content-Transfer-Encoding: base64',
+        b'',
+        encoded + b'--b--',
+        b'',
+    ]))
+    file_log, new_dir = extract(tmp_path, str(source))
+    assert attachment_names(file_log) == {'1.bin': 'data.bin'}
+    assert (new_dir / '1.bin').read_bytes() == data
+
+
+def test_html_only_email(tmp_path):
+    source = write(tmp_path / 'html.eml', b'\r\n'.join([
+        b'From: Joana <joana@example.com>',
+        b'Subject: =?iso-8859-1?b?Q2Fm6Q==?=',
+        b'Content-Type: text/html; charset=iso-8859-1',
+        b'Content-Transfer-Encoding: quoted-printable',
+        b'',
+        b'<p>Hallo <b>w=E9reld</b></p>',
+        b'',
+    ]))
+    file_log, new_dir = extract(tmp_path, str(source))
+    body = text(new_dir / '0.pdf')
+    assert 'Subject:    Café' in body
+    assert 'Hallo wéreld' in body
+    assert attachment_names(file_log) == {}
@@ -0,0 +1,74 @@
+import _functions.duplicates as dup
+import _functions.history as hist
+from conftest import run, write
+
+
+def entry(path, data):
+    write(path, data)
+    return dup.Entry(str(path), len(data))
+
+
+def test_new_batch_after_finished_batch(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    a = entry(tmp_path / 'week1' / 'a.docx', b'same content')
+    history = hist.History(path, source='src')
+    batch = history.batch
+    history.add([a])
+    history.finish()
+    history.close()
+
+    history = hist.History(path, source='src', resume=False)
+    try:
+        # the same folder exported again is a new batch, resume=False does not remove the earlier one
+        assert batch.startswith('src ') and history.batch.startswith('src ') and history.batch != batch
+        assert history.delivered(entry(tmp_path / 'week2' / 'a.docx', b'same content'))[1] == a.file
+    finally:
+        history.close()
+
+
+def test_stopped_batch_is_continued(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    a = entry(tmp_path / 'a.docx', b'same content')
+    history = hist.History(path, source='src')
+    batch = history.batch
+    history.add([a])
+    history.close()
+
+    history = hist.History(path, source='src')
+    try:
+        # the files of the stopped run are not delivered in an earlier batch
+        assert history.batch == batch
+        assert history.delivered(entry(tmp_path / 'b.docx', b'same content')) is None
+    finally:
+        history.close()
+
+
+def test_explicit_batch(tmp_path):
+    path = str(tmp_path / 'history.sqlite')
+    history = hist.History(path, batch='week 1', source='src')
+    history.add([entry(tmp_path / 'a.docx', b'first week')])
+    history.finish()
+    history.close()
+    history = hist.History(path, batch='week 2', source='src')
+    history.add([entry(tmp_path / 'b.docx', b'second week')])
+    history.close()
+
+    # starting week 2 again only removes the files of week 2
+    history = hist.History(path, batch='week 2', source='src', resume=False)
+    try:
+        assert history.delivered(entry(tmp_path / 'c.docx', b'first week')) == ('week 1', str(tmp_path / 'a.docx'))
+        assert history.delivered(entry(tmp_path / 'd.docx', b'second week')) is None
+    finally:
+        history.close()
+
+
+def test_previous_batch_of_same_folder(tmp_path, make_options):
+    src = tmp_path / 'src'
+    write(src / 'a.docx', b'delivered last week')
+    run(src, make_options())
+
+    # a new export in the same folder, with a file delivered last week under another name
+    (src / 'a.docx').unlink()
+    write(src / 'b.docx', b'delivered last week')
+    conversion, records = run(src, make_options(previous_batches='flag', resume=False))
+    assert records[str(tmp_path / 'PDF_src' / 'b.docx')]['Duplicate']
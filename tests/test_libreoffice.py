@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import pytest
+import _functions.libreoffice as lo
+from conftest import write
+
+# a worker that starts a child (like soffice) and then hangs on every file
+HANGING_WORKER = '''
+import subprocess, sys, time
+child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+open(sys.argv[1], 'w').write(str(child.pid))
+print('{"ping": true, "ok": true}', flush=True)
+for line in sys.stdin:
+    if 'ping' not in line:
+        time.sleep(60)
+'''
+# a worker that starts and then crashes on a file that starts with 'crash'
+CRASHING_WORKER = '''
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import libreoffice_worker as worker
+for line in sys.stdin:
+    request = json.loads(line)
+    if request.get('ping'):
+        print('{"ping": true, "ok": true}', flush=True)
+    elif open(request['file'], 'rb').read().startswith(b'crash'):
+        sys.exit(1)
+    else:
+        worker.FakeOffice().convert(request['file'], request['outdir'])
+        print(json.dumps({'file': request['file'], 'ok': True, 'error': ''}), flush=True)
+'''
+
+
+def running(pid):
+    """
+    Returns True if the process runs, a zombie (not reaped in a container) does not run
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().split(')')[-1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return True
+
+
+def test_fake_pool(tmp_path):
+    document = write(tmp_path / 'a.docx', b'document')
+    with lo.LibreOfficePool(size=1, fake=True) as pool:
+        assert pool.convert(str(document))
+    assert (tmp_path / 'a.pdf').is_file()
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='the test looks for the child process in /proc')
+def test_timeout_kills_office(tmp_path):
+    script = write(tmp_path / 'worker.py', HANGING_WORKER.encode())
+    child_pid = tmp_path / 'child.pid'
+    document = write(tmp_path / 'a.docx', b'document')
+    with lo.LibreOfficePool(size=1, fake=True, timeout=1) as pool:
+        pool.workers[0].command = [sys.executable, str(script), str(child_pid)]
+        assert not pool.convert(str(document))
+        pid = int(child_pid.read_text())
+        for attempt in range(50):
+            if not running(pid):
+                break
+            time.sleep(0.1)
+        assert not running(pid)
+
+
+def test_crashing_document(tmp_path):
+    script = write(tmp_path / 'worker.py', CRASHING_WORKER.encode())
+    crash = write(tmp_path / 'crash.docx', b'crash')
+    document = write(tmp_path / 'a.docx', b'document')
+    with lo.LibreOfficePool(size=1, fake=True, app_path=str(tmp_path / 'no_soffice')) as pool:
+        pool.workers[0].command = [sys.executable, str(script), os.path.dirname(os.path.abspath(lo.__file__))]
+        # one bad document falls back to soffice (which is not there), the pool keeps its workers
+        assert not pool.convert(str(crash))
+        assert not pool.broken
+        assert pool.convert(str(document))
+    assert (tmp_path / 'a.pdf').is_file()
+
+
+def test_worker_not_starting(tmp_path):
+    document = write(tmp_path / 'a.docx', b'document')
+    with lo.LibreOfficePool(size=1, fake=True, app_path=str(tmp_path / 'no_soffice')) as pool:
+        pool.workers[0].command = [sys.executable, '-c', 'import sys; sys.exit(1)']
+        assert not pool.convert(str(document))
+        assert pool.broken
@@ -0,0 +1,95 @@
+import datetime
+import os
+import time
+import pytest
+import _functions.msg_file as mfile
+from conftest import FIXTURES, run, write
+
+# see fixtures/make_msg.py
+SENT = datetime.datetime(2023, 5, 4, 10, 20, 30, tzinfo=datetime.timezone.utc)
+LARGE = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def message():
+    msg = mfile.open_message(os.path.join(FIXTURES, 'unicode.msg'))
+    yield msg
+    msg.Close()
+
+
+def test_unicode_message(message):
+    assert message.Subject == 'Łódź report'
+    assert message.SenderName == 'Joana Cardoso'
+    assert message.To == 'Dennis; Yilong'
+    assert message.CC == 'Zoë'
+    assert message.Body == 'Dear all,\r\n\r\nSee the report from Łódź.'
+    # local time without time zone, like Outlook
+    assert message.SentOn == SENT.astimezone().replace(tzinfo=None)
+
+
+@pytest.mark.skipif(not hasattr(time, 'tzset'), reason='the time zone cannot be changed on windows')
+def test_sent_on_local_time(monkeypatch):
+    monkeypatch.setenv('TZ', 'Europe/Amsterdam')
+    time.tzset()
+    try:
+        msg = mfile.open_message(os.path.join(FIXTURES, 'unicode.msg'))
+        assert msg.SentOn == datetime.datetime(2023, 5, 4, 12, 20, 30)
+        msg.Close()
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_attachments(message, tmp_path):
+    attachments = message.Attachments
+    assert attachments.Count == 3
+    assert [attachments.Item(number).FileName for number in (1, 2, 3)] == \
+        ['report.docx', 'large.bin', 'Forwarded.msg']
+    # a stream in the mini stream and a stream in normal sectors
+    attachments.Item(1).SaveAsFile(str(tmp_path / '1.docx'))
+    attachments.Item(2).SaveAsFile(str(tmp_path / '2.bin'))
+    assert (tmp_path / '1.docx').read_bytes() == b'small attachment'
+    assert (tmp_path / '2.bin').read_bytes() == LARGE
+
+
+def test_embedded_message(message, tmp_path):
+    attachment = message.Attachments.Item(3)
+    # an attached email is read from the MSG file, not written
+    attachment.SaveAsFile(str(tmp_path / '3.msg'))
+    assert not (tmp_path / '3.msg').exists()
+    inner = attachment.message
+    assert (inner.Subject, inner.SenderName, inner.Body) == ('Forwarded', 'Dennis', 'Inner body')
+    assert inner.Attachments.Item(1).FileName == 'notes.txt'
+    inner.Attachments.Item(1).SaveAsFile(str(tmp_path / 'notes.txt'))
+    assert (tmp_path / 'notes.txt').read_bytes() == b'inner attachment'
+
+
+def test_ansi_message():
+    msg = mfile.open_message(os.path.join(FIXTURES, 'ansi.msg'))
+    # 8 bit strings in the message code page, the html body in the internet code page
+    assert msg.Subject == 'Привет'
+    assert msg.SenderName == 'Иван'
+    assert msg.Body == 'Hello wörld'
+    assert msg.Attachments.Item(1).FileName == 'отчёт.docx'
+    msg.Close()
+
+
+def test_not_a_msg_file(tmp_path):
+    with pytest.raises(Exception):
+        mfile.open_message(str(write(tmp_path / 'bad.msg', b'not a compound file' * 100)))
+
+
+@pytest.mark.parametrize('name', ['unicode', 'UNICODE', 'unicode.msg'])
+def test_msg_pipeline(tmp_path, make_options, name):
+    src = tmp_path / 'src'
+    extension = '.MSG' if name.isupper() else '.msg'
+    write(src / (name + extension), open(os.path.join(FIXTURES, 'unicode.msg'), 'rb').read())
+    conversion, records = run(src, make_options(msg_backend='python'))
+
+    out = tmp_path / 'PDF_src'
+    assert records[str(out / (name + extension))]['To PDF']
+    assert records[str(out / name / '1.docx')]['Attachment name'] == 'report.docx'
+    assert records[str(out / name / '3.msg')]['To PDF']
+    # the attachment that cannot be converted is kept for a manual check
+    assert records[str(out / name / '2.bin')]['Check']
+    assert (out / (name + '.pdf')).is_file()
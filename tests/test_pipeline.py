@@ -0,0 +1,245 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import zipfile
+import pikepdf
+import pytest
+import _functions.duplicates as dup
+from conftest import run, write
+
+
+class FailingConverter:
+    """
+    A converter that cannot convert anything, to check that finished files are not converted again
+    """
+    settings = 'failing'
+
+    def __init__(self):
+        self.files = []
+
+    def convert(self, file):
+        self.files.append(file)
+        return False
+
+    def convert_batch(self, files):
+        return {file: self.convert(file) for file in files}
+
+    def close(self):
+        pass
+
+
+EML = (b'From: Joana <joana@example.com>\r\n'
+       b'To: Dennis <dennis@example.com>\r\n'
+       b'Subject: Report\r\n'
+       b'Date: Mon, 05 Oct 2020 10:00:00 +0200\r\n'
+       b'MIME-Version: 1.0\r\n'
+       b'Content-Type: multipart/mixed; boundary="b1"\r\n'
+       b'\r\n'
+       b'--b1\r\n'
+       b'Content-Type: text/plain; charset=utf-8\r\n'
+       b'\r\n'
+       b'See the report.\r\n'
+       b'--b1\r\n'
+       b'Content-Type: application/vnd.openxmlformats-officedocument.wordprocessingml.document\r\n'
+       b'Content-Disposition: attachment; filename="report.docx"\r\n'
+       b'Content-Transfer-Encoding: base64\r\n'
+       b'\r\n'
+       b'cmVwb3J0IGNvbnRlbnQ=\r\n'
+       b'--b1--\r\n')
+
+
+def test_folder(tmp_path, make_options):
+    src = tmp_path / 'src'
+    write(src / 'a.docx', b'first document')
+    write(src / 'sub' / 'b.docx', b'second document')
+    write(src / 'c.xlsx', b'spreadsheet')
+    conversion, records = run(src, make_options())
+
+    out = tmp_path / 'PDF_src'
+    assert (out / 'a.pdf').is_file() and not (out / 'a.docx').exists()
+    assert (out / 'sub' / 'b.pdf').is_file()
+    # excel files are printed and kept for a manual check
+    assert (out / 'c.xlsx').is_file() and (out / 'c.pdf').is_file()
+    assert records[str(out / 'a.docx')]['To PDF']
+    assert records[str(out / 'c.xlsx')]['Check']
+    assert conversion.total_pdf == 3
+    assert (tmp_path / 'Results_PDF_src.xlsx').is_file()
+
+
+def test_zip(tmp_path, make_options):
+    archive = tmp_path / 'export.zip'
+    with zipfile.ZipFile(archive, 'w') as z:
+        z.writestr('a.docx', b'first document')
+        z.writestr('sub/b.docx', b'second document')
+    conversion, records = run(archive, make_options())
+
+    out = tmp_path / 'PDF_export'
+    assert (out / 'a.pdf').is_file()
+    assert (out / 'sub' / 'b.pdf').is_file()
+    assert all(record['To PDF'] for record in records.values())
+    # the zip file is read in place
+    assert archive.is_file() and not (tmp_path / 'export').exists()
+
+
+def test_duplicates(tmp_path, make_options):
+    src = tmp_path / 'src'
+    write(src / 'a.docx', b'same document')
+    write(src / 'sub' / 'b.docx', b'same document')
+    write(src / 'c.docx', b'same size document')
+    conversion, records = run(src, make_options(remove_duplicates=True))
+
+    # the first file in the selected folder is the original
+    assert conversion.duplicates == {str(tmp_path / 'PDF_src' / 'sub' / 'b.docx')}
+    duplicate = conversion.duplicates.pop()
+    assert records[duplicate]['Duplicate']
+    moved = duplicate.replace(str(tmp_path / 'PDF_src'), str(tmp_path / 'Dubbelingen_src'))
+    assert os.path.isfile(moved)
+    assert not records[str(tmp_path / 'PDF_src' / 'c.docx')]['Duplicate']
+
+
+@pytest.mark.parametrize('attempt', range(5))
+def test_duplicates_same_original(tmp_path, make_options, attempt):
+    src = tmp_path / 'src'
+    for folder in 'abcdefgh':
+        write(src / folder / 'x.docx', b'same document')
+    conversion, records = run(src, make_options(remove_duplicates=True, workers=4, batch_size=1))
+
+    # the original does not depend on which copy is copied first
+    out = tmp_path / 'PDF_src'
+    assert conversion.duplicates == {str(out / folder / 'x.docx') for folder in 'bcdefgh'}
+    assert (out / 'a' / 'x.pdf').is_file()
+    assert not records[str(out / 'a' / 'x.docx')]['Duplicate']
+
+
+def test_resume(tmp_path, make_options):
+    src = tmp_path / 'src'
+    write(src / 'a.docx', b'first document')
+    run(src, make_options())
+
+    write(src / 'b.docx', b'new document')
+    converter = FailingConverter()
+    conversion, records = run(src, make_options(converter=converter, cache=False))
+
+    out = tmp_path / 'PDF_src'
+    # the finished file keeps its record and is not converted again, the new one is
+    assert records[str(out / 'a.docx')]['To PDF']
+    assert converter.files == [str(out / 'b.docx')]
+    assert not records[str(out / 'b.docx')]['To PDF']
+    assert (out / 'a.pdf').is_file()
+
+
+def test_resume_after_output_removed(tmp_path, make_options):
+    src = tmp_path / 'src'
+    write(src / 'a.docx', b'first document')
+    write(src / 'b.xlsx', b'kept spreadsheet')
+    write(src / 'mail.eml', EML)
+    run(src, make_options())
+
+    out = tmp_path / 'PDF_src'
+    shutil.rmtree(str(out))
+    conversion, records = run(src, make_options())
+    # the files are converted again instead of being skipped
+    assert records[str(out / 'a.docx')]['To PDF']
+    assert (out / 'a.pdf').is_file()
+    assert (out / 'b.xlsx').is_file()
+    assert (out / 'mail.pdf').is_file()
+    assert not records[str(out / 'a.docx')]['Duplicate']
+
+
+def test_resume_other_out_dir(tmp_path, make_options):
+    src = tmp_path / 'src'
+    write(src / 'a.docx', b'first document')
+    run(src, make_options())
+
+    # the manifest of the first run is not used for another output directory
+    out = tmp_path / 'other'
+    conversion, records = run(src, make_options(out_dir=str(out)))
+    assert records[str(out / 'a.docx')]['To PDF']
+    assert (out / 'a.pdf').is_file()
+
+
+def test_email_combine(tmp_path, make_options):
+    src = tmp_path / 'src'
+    write(src / 'mail.eml', EML)
+    conversion, records = run(src, make_options())
+
+    out = tmp_path / 'PDF_src'
+    assert records[str(out / 'mail.eml')]['To PDF']
+    assert records[str(out / 'mail' / '1.docx')]['Combined']
+    # the parts are combined into one pdf, the body first
+    assert not (out / 'mail').exists()
+    with pikepdf.open(out / 'mail.pdf') as pdf:
+        assert len(pdf.pages) == 2
+        assert b'Subject:    Report' in pdf.pages[0].Contents.read_bytes()
+
+
+def pdf_with_metadata(path):
+    """
+    Writes a pdf with XMP metadata, which _functions.unlock removes in the output directory
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with pikepdf.new() as pdf:
+        pdf.add_blank_page()
+        pdf.Root.Metadata = pdf.make_stream(b'<x:xmpmeta xmlns:x="adobe:ns:meta/"></x:xmpmeta>')
+        pdf.save(path, deterministic_id=True)
+    return path
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4])
+def test_duplicate_pdfs_rewritten(tmp_path, make_options, workers):
+    src = tmp_path / 'src'
+    pdf_with_metadata(src / 'a' / 'scan.pdf')
+    write(src / 'b' / 'scan.pdf', (src / 'a' / 'scan.pdf').read_bytes())
+    conversion, records = run(src, make_options(workers=workers))
+
+    assert len(conversion.duplicates) == 1
+    with pikepdf.open(tmp_path / 'PDF_src' / 'a' / 'scan.pdf') as pdf:
+        assert '/Metadata' not in pdf.Root
+
+
+def test_unique_sizes_not_read(tmp_path, make_options, monkeypatch):
+    reads = []
+    for name in ('partial_hash', 'full_hash'):
+        monkeypatch.setattr(dup, name, lambda *args, read=getattr(dup, name): reads.append(args[0]) or read(*args))
+    src = tmp_path / 'src'
+    uncompressed_pdf(src / 'a.pdf', 10)
+    uncompressed_pdf(src / 'b.pdf', 20)
+    write(src / 'c.xlsx', b'kept spreadsheet')
+    conversion, records = run(src, make_options(history=False))
+
+    # pdfs that are not written again and kept files with a size of their own are never read for duplicates
+    assert reads == []
+    assert not conversion.duplicates
+
+
+def uncompressed_pdf(path, lines):
+    """
+    Writes a pdf with a content stream that is not compressed, so optimizing makes it smaller
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with pikepdf.new() as pdf:
+        pdf.add_blank_page()
+        pdf.pages[0].Contents = pdf.make_stream(b'0 0 m 100 100 l S\n' * lines)
+        pdf.save(path, compress_streams=False)
+    return path.read_bytes()
+
+
+def test_duplicate_pdfs_optimized(tmp_path, make_options):
+    src = tmp_path / 'src'
+    original = uncompressed_pdf(src / 'a' / 'scan.pdf', 2000)
+    write(src / 'b' / 'scan.pdf', original)
+    other = uncompressed_pdf(src / 'c' / 'other.pdf', 3000)
+    conversion, records = run(src, make_options(optimize=True))
+
+    out = tmp_path / 'PDF_src'
+    # the first file in the selected folder is kept
+    kept = str(out / 'a' / 'scan.pdf')
+    assert conversion.duplicates == {str(out / 'b' / 'scan.pdf')}
+    assert os.path.getsize(kept) < len(original)
+    # the history has the content that was delivered, not the optimized pdf
+    with sqlite3.connect(tmp_path / 'history.sqlite') as connection:
+        rows = dict((path, (size, full)) for size, full, path in
+                    connection.execute('SELECT size, full, path FROM delivered'))
+    assert rows[kept] == (len(original), hashlib.md5(original).hexdigest())
+    assert rows[str(out / 'c' / 'other.pdf')] == (len(other), hashlib.md5(other).hexdigest())
@@ -0,0 +1,33 @@
+import io
+import os
+import zipfile
+import _functions.sources as src
+import _functions.unzip_files as uz
+
+
+def zip_bytes(files):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w', zipfile.ZIP_STORED) as zip_file:
+        for name, content in files.items():
+            zip_file.writestr(name, content)
+    return data.getvalue()
+
+
+def test_nested_zips_in_memory_up_to_limit(tmp_path, monkeypatch):
+    nested = {f'part{number}.zip': zip_bytes({'a.docx': b'document %d' % number + b'.' * 1000})
+              for number in range(5)}
+    path = tmp_path / 'export.zip'
+    path.write_bytes(zip_bytes(nested))
+    # room for two of the zip files in memory
+    monkeypatch.setattr(uz, 'NESTED_IN_MEMORY', 2 * len(nested['part0.zip']) + 10)
+    source = src.ZipSource(str(path))
+    try:
+        assert source.in_memory <= uz.NESTED_IN_MEMORY
+        assert len(source.temp_files) == 3
+        for number in range(5):
+            file = os.path.join(source.process_dir, f'part{number}', 'a.docx')
+            source.extract(file, str(tmp_path / f'{number}.docx'))
+            assert (tmp_path / f'{number}.docx').read_bytes() == b'document %d' % number + b'.' * 1000
+    finally:
+        source.close()
+    assert not any(os.path.exists(temp_file) for temp_file in source.temp_files)
@@ -0,0 +1,31 @@
+import threading
+import time
+import _functions.tasks as tasks
+
+
+def test_dependencies():
+    graph = tasks.TaskGraph({'io': 2})
+    order = []
+    first = graph.add('first', 'io', order.append, 'first')
+    graph.add('second', 'io', order.append, 'second', after=[first])
+    assert [task.name for task in graph.run()] == ['first', 'second']
+    assert order == ['first', 'second']
+
+
+def test_stopped_run_does_not_run_waiting_tasks():
+    graph = tasks.TaskGraph({'io': 2})
+    started = []
+    lock = threading.Lock()
+
+    def work(number):
+        with lock:
+            started.append(number)
+        time.sleep(0.05)
+
+    for number in range(50):
+        graph.add('work', 'io', work, number)
+    run = graph.run()
+    next(run)
+    # e.g. the GUI is closed: only the running tasks are finished
+    run.close()
+    assert len(started) <= 4
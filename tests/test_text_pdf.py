@@ -0,0 +1,44 @@
+import pikepdf
+import _functions.text_pdf as tp
+from conftest import run, write
+
+
+def test_latin_text(tmp_path):
+    text = write(tmp_path / 'note.txt', 'Groeten uit Zuid-Holland, één € (euro)\n'.encode('utf-8'))
+    assert tp.text_to_pdf(str(text))
+    with pikepdf.open(tmp_path / 'note.pdf') as pdf:
+        content = pdf.pages[0].Contents.read_bytes()
+    assert 'Groeten uit Zuid-Holland, één € \\(euro\\)'.encode('cp1252') in content
+
+
+def test_wrapped_pages(tmp_path):
+    text = write(tmp_path / 'long.txt', ('word ' * 100 + '\n').encode('ascii') * 100)
+    assert tp.text_to_pdf(str(text))
+    with pikepdf.open(tmp_path / 'long.pdf') as pdf:
+        # every line is wrapped to 7 lines of at most COLUMNS characters
+        assert len(pdf.pages) == -(-700 // tp.ROWS)
+
+
+def test_non_latin_text(tmp_path):
+    # characters that Courier does not have are not replaced, the file is left to LibreOffice
+    for name, line in (('polish.txt', 'world ł'), ('russian.csv', 'привет;мир'), ('chinese.tsv', '你好\t世界')):
+        text = write(tmp_path / name, line.encode('utf-8'))
+        assert not tp.text_to_pdf(str(text))
+        assert not (tmp_path / name).with_suffix('.pdf').exists()
+
+
+def test_non_latin_email(tmp_path, make_options):
+    src = tmp_path / 'src'
+    write(src / 'mail.eml', 'From: =?utf-8?q?=C5=81ukasz?= <l@example.com>\r\n'
+                            'Subject: =?utf-8?b?0J/RgNC40LLQtdGC?=\r\n'
+                            'Content-Type: text/plain; charset=utf-8\r\n'
+                            '\r\n'
+                            'Dzień dobry\r\n'.encode('utf-8'))
+    conversion, records = run(src, make_options())
+
+    # the body is printed by the (fake) LibreOffice, not written with a question mark
+    out = tmp_path / 'PDF_src'
+    assert records[str(out / 'mail.eml')]['To PDF']
+    with pikepdf.open(out / 'mail.pdf') as pdf:
+        # the one page of the fake LibreOffice has no content
+        assert len(pdf.pages) == 1 and '/Contents' not in pdf.pages[0]